@@ -2,4 +2,5 @@ from diambra.engine import SpaceTypes, Roles
 from diambra.engine import model
 from .env_settings import EnvironmentSettings, EnvironmentSettingsMultiAgent, WrappersSettings, RecordingSettings, load_settings_flat_dict
 from .make_env import make
-from .utils.gym_utils import available_games, game_sha_256, check_game_sha_256, get_num_envs
\ No newline at end of file
+from .vec_env import DiambraVecEnv
+from .utils.gym_utils import available_games, games_registry, game_sha_256, check_game_sha_256, get_num_envs
\ No newline at end of file
@@ -6,10 +6,15 @@ import gymnasium as gym
 import logging
 from diambra.arena.utils.gym_utils import discrete_to_multi_discrete_action
 from diambra.arena.engine.interface import DiambraEngine
+from diambra.arena.engine.shm_frames import SharedMemoryFrameReader, is_shm_frame_reference
+from diambra.arena.utils.profiling import LatencyProfiler
 from diambra.arena.env_settings import EnvironmentSettings, EnvironmentSettingsMultiAgent
 from typing import Union, Any, Dict, List
 from diambra.engine import model, SpaceTypes
 
+# Game state index -> info key lookup table
+GAME_STATES_NAMES = {value: name for name, value in model.GameStates.items()}
+
 class DiambraGymBase(gym.Env):
     """Diambra Environment gymnasium base interface"""
     metadata = {"render_modes": ["human", "rgb_array"]}
@@ -27,7 +32,21 @@ class DiambraGymBase(gym.Env):
         self.render_mode = env_settings.render_mode
 
         # Launch DIAMBRA Engine
-        self.arena_engine = DiambraEngine(env_settings.env_address, env_settings.grpc_timeout)
+        self.arena_engine = DiambraEngine(env_settings.env_address, env_settings.grpc_timeout, env_settings.frame_transport)
+        self._shm_frames = SharedMemoryFrameReader() if env_settings.frame_transport == "shm" else None
+
+        # Latency profiling: engine round trip and response decoding (wrappers layers are added by env_wrapping),
+        # excluded from the time of the environment layer calling them
+        self.profiler = None
+        if env_settings.profile_latency is True:
+            self.profiler = LatencyProfiler()
+            self.arena_engine.step = self.profiler.timed_layer(self.arena_engine.step, "engine_step")
+            self.arena_engine.step_repeat = self.profiler.timed_layer(self.arena_engine.step_repeat, "engine_step_repeat")
+            self._get_obs = self.profiler.timed_layer(self._get_obs, "decode_obs")
+            self._get_info = self.profiler.timed_layer(self._get_info, "decode_info")
+            # Repeated steps (sticky actions, no-op reset) timed as steps of the environment layer,
+            # instrumented here as wrappers keep a reference to it
+            self.step_repeat = self.profiler.timed_layer(self.step_repeat, type(self).__name__)
 
         # Splash Screen
         if 'DISPLAY' in os.environ and env_settings.splash_screen is True:
@@ -37,12 +56,16 @@ class DiambraGymBase(gym.Env):
         # Send environment settings, retrieve environment info
         self.env_info = self.arena_engine.env_init(self.env_settings.get_pb_request(init=True))
         self.env_settings.finalize_init(self.env_info)
+        self._frame_size = self.env_info.frame_shape.h * self.env_info.frame_shape.w * self.env_info.frame_shape.c
 
         # Settings log
         self.logger.info(self.env_settings)
 
         # N actions
         self.n_actions = [self.env_info.available_actions.n_moves, self.env_info.available_actions.n_attacks]
+        # Discrete action index -> (move, attack) lookup table
+        self.discrete_actions_table = tuple(discrete_to_multi_discrete_action(action, self.n_actions[0])
+                                            for action in range(self.n_actions[0] + self.n_actions[1] - 1))
 
         # Actions tuples and dict
         move_tuple = ()
@@ -98,6 +121,41 @@ class DiambraGymBase(gym.Env):
 
         self.observation_space = gym.spaces.Dict(observation_space_dict)
 
+        # Observation decoding plan, compiled once to avoid per step enum names lookups
+        # [(category enum, category key, [(RAM state key, RAM state enum, BOX space), ...]), ...]
+        self._ram_states_plan = []
+        self._ram_states_arrays = {}
+        self._reuse_obs_arrays = self.env_settings.reuse_obs_arrays is True
+        # Frame in the observation, otherwise only decoded on demand from the last response (see exclude_frame_observation)
+        self._frame_observation = True
+        self._frame_response = None
+        # Position of each RAM state (flattened key, e.g. "P1_health") in the flat layout vector
+        self.ram_states_index = {}
+        ram_states_low = []
+        ram_states_high = []
+        for k, v in self.env_info.ram_states_categories.items():
+            category_key = None if k == model.RamStatesCategories.common else model.RamStatesCategories.Name(k)
+            category_plan = []
+            for k2, v2 in v.ram_states.items():
+                key = model.RamStates.Name(k2)
+                category_plan.append((key, k2, v2.type == SpaceTypes.BOX))
+                if v2.type == SpaceTypes.BOX and self._reuse_obs_arrays is True:
+                    self._ram_states_arrays[(k, k2)] = np.zeros((1,), dtype=np.int64)
+                self.ram_states_index[key if category_key is None else category_key + "_" + key] = len(ram_states_low)
+                ram_states_low.append(v2.min)
+                ram_states_high.append(v2.max)
+            self._ram_states_plan.append((k, category_key, category_plan))
+
+        # Flat layout: all RAM states in a single int16 vector
+        self._flat_ram_states = self.env_settings.ram_states_layout == "flat"
+        if self._flat_ram_states is True:
+            self.observation_space = gym.spaces.Dict({
+                "frame": self.observation_space["frame"],
+                "ram_states": gym.spaces.Box(low=np.array(ram_states_low, dtype=np.int16),
+                                             high=np.array(ram_states_high, dtype=np.int16), dtype=np.int16),
+            })
+            self._ram_states_vector = np.zeros((len(ram_states_low),), dtype=np.int16)
+
     # Return env action list
     def get_actions_tuples(self):
         return self.actions_tuples
@@ -124,7 +182,7 @@ class DiambraGymBase(gym.Env):
         options["seed"] = seed if seed is None else seed + self.env_settings.rank
         request = self.env_settings.update_episode_settings(options)
         response = self.arena_engine.reset(request.episode_settings)
-        return self._get_obs(response), self._get_info(response)
+        return self._get_obs(response), self._get_info(response, True)
 
     # Rendering the environment
     def render(self, wait_key=1):
@@ -137,13 +195,13 @@ class DiambraGymBase(gym.Env):
                     self.render_gui_started = True
                     wait_key = 100
 
-                cv2.imshow(self.window_name, self._frame[:, :, ::-1])
+                cv2.imshow(self.window_name, self._last_frame()[:, :, ::-1])
                 cv2.waitKey(wait_key)
                 return True
             except:
                 return False
         elif self.render_mode == "rgb_array":
-            return self._frame
+            return self._last_frame()
 
     # Print observation details to the console
     def show_obs(self, observation, wait_key=1, viz=True, string="observation", key=None, outermost=True):
@@ -177,45 +235,86 @@ class DiambraGymBase(gym.Env):
             except:
                 pass
 
+    # Remove the frame from the observation space when no wrapper consumes it (RAM states only observations),
+    # frames are then not decoded at each step but only on render
+    def exclude_frame_observation(self):
+        self._frame_observation = False
+        self.observation_space = gym.spaces.Dict({k: v for k, v in self.observation_space.spaces.items() if k != "frame"})
+
+    # Rolling latency percentiles per layer (ms), profile_latency setting must be enabled
+    def latency_percentiles(self):
+        if self.profiler is None:
+            raise Exception("Latency profiling not enabled, set \"profile_latency\" to True in environment settings")
+        return self.profiler.percentiles()
+
     # Closing the environment
     def close(self):
         # Close DIAMBRA Arena
         cv2.destroyAllWindows()
         self.arena_engine.close()
+        if self._shm_frames is not None:
+            self._shm_frames.close()
 
     # Get frame
     def _get_frame(self, response):
-        self._frame = np.frombuffer(response.observation.frame, dtype='uint8').reshape(self.env_info.frame_shape.h, \
-                                                                                       self.env_info.frame_shape.w, \
-                                                                                       self.env_info.frame_shape.c)
+        frame_shape = (self.env_info.frame_shape.h, self.env_info.frame_shape.w, self.env_info.frame_shape.c)
+        if self._shm_frames is not None and is_shm_frame_reference(response.observation.frame, self._frame_size):
+            self._frame = self._shm_frames.read(response.observation.frame, frame_shape)
+        else:
+            self._frame = np.frombuffer(response.observation.frame, dtype='uint8').reshape(frame_shape)
         return self._frame
 
-    # Get info
-    def _get_info(self, response):
-        info = {model.GameStates.Name(k): v for k, v in response.info.game_states.items()}
-        info["settings"] = self.env_settings.pb_model
+    # Last frame, decoded on demand when excluded from the observation
+    def _last_frame(self):
+        if self._frame is None and self._frame_response is not None:
+            self._get_frame(self._frame_response)
+        return self._frame
+
+    # Get info, environment settings only added at episode boundaries (reset and last step)
+    def _get_info(self, response, episode_boundary=False):
+        info = {GAME_STATES_NAMES[k]: v for k, v in response.info.game_states.items()}
+        if episode_boundary is True:
+            info["settings"] = self.env_settings.pb_model
+        if self.profiler is not None:
+            info["latency"] = self.profiler.report()
         return info
 
     def _get_obs(self, response):
         observation = {}
-        observation["frame"] = self._get_frame(response)
+        if self._frame_observation is True:
+            observation["frame"] = self._get_frame(response)
+        else:
+            self._frame = None
+            self._frame_response = response
 
         # Adding RAM states observations
-        for k, v in self.env_info.ram_states_categories.items():
-            if k == model.RamStatesCategories.common:
+        ram_states_categories = response.observation.ram_states_categories
+        if self._flat_ram_states is True:
+            ram_states = self._ram_states_vector if self._reuse_obs_arrays is True else np.empty_like(self._ram_states_vector)
+            ram_states[:] = [ram_states_categories[category].ram_states[ram_state] for category, _, category_plan in self._ram_states_plan
+                                                                                   for _, ram_state, _ in category_plan]
+            observation["ram_states"] = ram_states
+            return observation
+
+        for category, category_key, category_plan in self._ram_states_plan:
+            if category_key is None:
                 target_dict = observation
             else:
-                observation[model.RamStatesCategories.Name(k)] = {}
-                target_dict = observation[model.RamStatesCategories.Name(k)]
-
-            category_ram_states = response.observation.ram_states_categories[k]
-
-            for k2, v2 in v.ram_states.items():
-                # Box spaces
-                if v2.type == SpaceTypes.BOX:
-                    target_dict[model.RamStates.Name(k2)] = np.array([category_ram_states.ram_states[k2]])
+                target_dict = {}
+                observation[category_key] = target_dict
+
+            category_ram_states = ram_states_categories[category].ram_states
+
+            for key, ram_state, is_box in category_plan:
+                if is_box is True:  # Box spaces
+                    if self._reuse_obs_arrays is True:
+                        value = self._ram_states_arrays[(category, ram_state)]
+                        value[0] = category_ram_states[ram_state]
+                        target_dict[key] = value
+                    else:
+                        target_dict[key] = np.array([category_ram_states[ram_state]])
                 else:  # Discrete spaces (binary / categorical)
-                    target_dict[model.RamStates.Name(k2)] = category_ram_states.ram_states[k2]
+                    target_dict[key] = category_ram_states[ram_state]
 
         return observation
 
@@ -235,6 +334,7 @@ class DiambraGym1P(DiambraGymBase):
             self.action_space = gym.spaces.MultiDiscrete(self.n_actions)
         elif env_settings.action_space == SpaceTypes.DISCRETE:
             self.action_space = gym.spaces.Discrete(self.n_actions[0] + self.n_actions[1] - 1)
+        self._discrete_action_space = isinstance(self.action_space, gym.spaces.Discrete)
         self.logger.debug("Using {} action space".format(SpaceTypes.Name(env_settings.action_space)))
 
     # Return the no-op action
@@ -247,11 +347,22 @@ class DiambraGym1P(DiambraGymBase):
     # Step the environment
     def step(self, action: Union[int, List[int]]):
         # Defining move and attack actions P1/P2 as a function of action_space
-        if isinstance(self.action_space, gym.spaces.Discrete):
-            action = list(discrete_to_multi_discrete_action(action, self.n_actions[0]))
-        response = self.arena_engine.step([action])
+        if self._discrete_action_space is True:
+            action = self.discrete_actions_table[action]
+        response = self.arena_engine.step((action,))
+        terminated = response.info.game_states[model.GameStates.episode_done]
 
-        return self._get_obs(response), response.reward, response.info.game_states[model.GameStates.episode_done], False, self._get_info(response)
+        return self._get_obs(response), response.reward, terminated, False, self._get_info(response, terminated)
+
+    # Step the environment repeating the action up to n times (stopping at round end with stop_on_round_done),
+    # reward summed over the steps and only the last observation decoded
+    def step_repeat(self, action: Union[int, List[int]], n: int, stop_on_round_done: bool=True):
+        if self._discrete_action_space is True:
+            action = self.discrete_actions_table[action]
+        response, reward = self.arena_engine.step_repeat((action,), n, stop_on_round_done, model.GameStates.episode_done)
+        terminated = response.info.game_states[model.GameStates.episode_done]
+
+        return self._get_obs(response), reward, terminated, False, self._get_info(response, terminated)
 
 class DiambraGym2P(DiambraGymBase):
     """Diambra Environment gymnasium multi-agent interface"""
@@ -265,6 +376,9 @@ class DiambraGym2P(DiambraGymBase):
         action_space_dict = self._map_action_spaces_to_agents(action_spaces_values)
         self.logger.debug("Using the following action spaces: {}".format(action_space_dict))
         self.action_space = gym.spaces.Dict(action_space_dict)
+        # Agents in players order, with the lookup table of discrete action spaces (None for multi discrete)
+        self._agents_actions_tables = tuple((agent, self.discrete_actions_table if isinstance(space, gym.spaces.Discrete) else None)
+                                            for agent, space in action_space_dict.items())
 
     # Return the no-op action
     def get_no_op_action(self):
@@ -274,18 +388,21 @@ class DiambraGym2P(DiambraGymBase):
 
     # Step the environment
     def step(self, actions: Dict[str, Union[int, List[int]]]):
-        # NOTE: the assumption in current interface is that we have actions sorted as agent's order
-        actions = sorted(actions.items())
-        action_list = [[],[]]
-        for idx, action in enumerate(actions):
-            # Defining move and attack actions P1/P2 as a function of action_space
-            if isinstance(self.action_space[action[0]], gym.spaces.MultiDiscrete):
-                action_list[idx] = action[1]
-            else:
-                action_list[idx] = list(discrete_to_multi_discrete_action(action[1], self.n_actions[0]))
+        # Defining move and attack actions P1/P2 as a function of action_space, agent_<idx> controls player <idx>
+        action_list = [actions[agent] if table is None else table[actions[agent]] for agent, table in self._agents_actions_tables]
         response = self.arena_engine.step(action_list)
+        terminated = response.info.game_states[model.GameStates.game_done]
+
+        return self._get_obs(response), response.reward, terminated, False, self._get_info(response, terminated)
+
+    # Step the environment repeating the actions up to n times (stopping at round end with stop_on_round_done),
+    # reward summed over the steps and only the last observation decoded
+    def step_repeat(self, actions: Dict[str, Union[int, List[int]]], n: int, stop_on_round_done: bool=True):
+        action_list = [actions[agent] if table is None else table[actions[agent]] for agent, table in self._agents_actions_tables]
+        response, reward = self.arena_engine.step_repeat(action_list, n, stop_on_round_done, model.GameStates.game_done)
+        terminated = response.info.game_states[model.GameStates.game_done]
 
-        return self._get_obs(response), response.reward, response.info.game_states[model.GameStates.game_done], False, self._get_info(response)
+        return self._get_obs(response), reward, terminated, False, self._get_info(response, terminated)
 
     def _map_action_spaces_to_agents(self, values_dict):
         out_dict = {}
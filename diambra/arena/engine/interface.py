@@ -1,8 +1,10 @@
 import numpy as np
 import os
 import logging
+import asyncio
 
 from diambra.engine import Client, model
+from diambra.arena.engine.shm_frames import SHM_FRAME_TRANSPORT_METADATA_KEY
 import grpc
 
 CONNECTION_FAILED_ERROR_TEXT = """DIAMBRA Arena failed to connect to the Engine Server. Are you running it with DIAMBRA CLI: `diambra run python script.py`?
@@ -13,8 +15,17 @@ See the docs (https://docs.diambra.ai) for additional details, or join DIAMBRA D
 class DiambraEngine:
     """Diambra Environment gym interface"""
 
-    def __init__(self, env_address, grpc_timeout=60):
+    # Batched step, step_batch(engines, list_of_action_lists), set when the engine server exposes it: steps
+    # the emulators it hosts in a single round trip (the current engine protocol has none, see step_many fallback)
+    step_batch = None
+
+    def __init__(self, env_address, grpc_timeout=60, frame_transport="grpc"):
         self.logger = logging.getLogger(__name__)
+        # "grpc": raw frames in the Step/Reset responses, "shm": frames in a shared memory ring buffer
+        # (same host only, the engine answers with raw frames if it does not support it)
+        self.frame_transport = frame_transport
+        # Actions request reused across steps (serialized before the Step call returns)
+        self._actions = model.Actions()
 
         try:
             # Opening gRPC channel
@@ -28,7 +39,10 @@ class DiambraEngine:
     # Send env settings, retrieve env info and int variables list [pb low level]
     def env_init(self, env_settings_pb):
         try:
-            response = self.client.EnvInit(env_settings_pb)
+            metadata = None
+            if self.frame_transport != "grpc":
+                metadata = ((SHM_FRAME_TRANSPORT_METADATA_KEY, self.frame_transport),)
+            response = self.client.EnvInit(env_settings_pb, metadata=metadata)
         except:
             raise Exception(CONNECTION_FAILED_ERROR_TEXT)
 
@@ -38,16 +52,100 @@ class DiambraEngine:
     def reset(self, episode_settings):
         return self.client.Reset(episode_settings)
 
+    # Reset the environment without blocking, returns a gRPC future [pb low level]
+    def reset_async(self, episode_settings):
+        return self.client.Reset.future(episode_settings)
+
+    # Reset the environment, asyncio native [pb low level]
+    async def reset_aio(self, episode_settings):
+        return await _wrap_future(self.reset_async(episode_settings))
+
     # Step the environment [pb low level]
     def step(self, action_list):
-        actions = model.Actions()
-        for action in action_list:
-            action = model.Actions.Action(move=action[0], attack=action[1])
-            actions.actions.append(action)
-        return self.client.Step(actions)
+        return self.client.Step(self._actions_request(action_list))
+
+    # Step the environment without blocking, returns a gRPC future [pb low level]
+    def step_async(self, action_list):
+        return self.client.Step.future(self._actions_request(action_list))
+
+    # Step the environment, asyncio native [pb low level]
+    async def step_aio(self, action_list):
+        return await _wrap_future(self.step_async(action_list))
+
+    # Step the environment repeating the same actions up to n times, stopping at the terminal game state (and at
+    # round end with stop_on_round_done), returns the last response and the reward summed over the steps [pb low level]
+    # Client side loop (the current engine protocol has no multi step call), intermediate responses are not decoded
+    def step_repeat(self, action_list, n, stop_on_round_done=True, terminal_game_state=model.GameStates.episode_done):
+        reward = 0.0
+        for _ in range(n):
+            response = self.step(action_list)
+            reward += response.reward
+            game_states = response.info.game_states
+            if game_states[terminal_game_state] or (stop_on_round_done is True and game_states[model.GameStates.round_done]):
+                break
+        return response, reward
 
     # Closing DIAMBRA Arena
     def close(self):
         response = self.client.Close(model.Empty())
         self.client.channel.close()
         return response
+
+    # Build the actions request [pb low level]
+    def _actions_request(self, action_list):
+        actions = self._actions
+        if len(actions.actions) != len(action_list):
+            del actions.actions[:]
+            for _ in range(len(action_list)):
+                actions.actions.add()
+        for action_pb, action in zip(actions.actions, action_list):
+            action_pb.move = action[0]
+            action_pb.attack = action[1]
+        return actions
+
+# Step several engines at once, responses returned in the same order [pb low level]
+# Engines sharing a batched step are stepped with one round trip, the others with concurrent RPCs
+def step_many(engines, list_of_action_lists):
+    if len(engines) != len(list_of_action_lists):
+        raise Exception("step_many: {} engines but {} action lists".format(len(engines), len(list_of_action_lists)))
+
+    responses = [None] * len(engines)
+    batches = {}
+    futures = []
+    for idx, (engine, action_list) in enumerate(zip(engines, list_of_action_lists)):
+        if engine.step_batch is not None:
+            batches.setdefault(engine.step_batch, []).append(idx)
+        else:
+            futures.append((idx, engine.step_async(action_list)))
+
+    for step_batch, indices in batches.items():
+        for idx, response in zip(indices, step_batch([engines[idx] for idx in indices], [list_of_action_lists[idx] for idx in indices])):
+            responses[idx] = response
+    for idx, future in futures:
+        responses[idx] = future.result()
+
+    return responses
+
+# Bridge a gRPC (or concurrent.futures) future to the running asyncio loop
+def _wrap_future(future):
+    loop = asyncio.get_running_loop()
+    aio_future = loop.create_future()
+
+    def _transfer(done_future):
+        if aio_future.cancelled():
+            return
+        if done_future.cancelled():
+            aio_future.cancel()
+        elif done_future.exception() is not None:
+            aio_future.set_exception(done_future.exception())
+        else:
+            aio_future.set_result(done_future.result())
+
+    def _cancel(done_aio_future):
+        if done_aio_future.cancelled():
+            future.cancel()
+
+    # gRPC callbacks run on a gRPC thread, hand the result over to the loop thread
+    future.add_done_callback(lambda done_future: loop.call_soon_threadsafe(_transfer, done_future))
+    aio_future.add_done_callback(_cancel)
+    return aio_future
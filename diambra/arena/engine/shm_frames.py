@@ -0,0 +1,76 @@
+import sys
+import struct
+import numpy as np
+from multiprocessing import shared_memory, resource_tracker
+
+# Shared memory frame transport: the engine writes each frame in a slot of a
+# POSIX shared memory ring buffer and the frame field of the gRPC response only
+# carries a reference to it: magic + (slot, frame size) + segment name
+SHM_FRAME_MAGIC = b"DSHM"
+SHM_FRAME_HEADER = struct.Struct("<II")
+SHM_FRAME_SLOTS = 4
+SHM_FRAME_TRANSPORT_METADATA_KEY = "diambra-frame-transport"
+
+# Segments created by this process, owned (and unlinked) by their producer
+_owned_segments = set()
+
+# The engine protocol has no frame transport field: raw frames (engine not supporting shared memory) are exactly
+# frame_size bytes long, references never are and carry the magic and the same frame size in their header
+def is_shm_frame_reference(frame_payload, frame_size):
+    if len(frame_payload) == frame_size or len(frame_payload) < len(SHM_FRAME_MAGIC) + SHM_FRAME_HEADER.size:
+        return False
+    if frame_payload[:len(SHM_FRAME_MAGIC)] != SHM_FRAME_MAGIC:
+        return False
+    return SHM_FRAME_HEADER.unpack_from(frame_payload, len(SHM_FRAME_MAGIC))[1] == frame_size
+
+# Producer side (engine), frames are written in a circular way
+class SharedMemoryFrameRing:
+    def __init__(self, frame_size, n_slots=SHM_FRAME_SLOTS, name=None):
+        self.frame_size = frame_size
+        self.n_slots = n_slots
+        self.shm = shared_memory.SharedMemory(name=name, create=True, size=frame_size * n_slots)
+        _owned_segments.add(self.shm.name)
+        self.slots = np.ndarray((n_slots, frame_size), dtype=np.uint8, buffer=self.shm.buf)
+        self.name_bytes = self.shm.name.encode()
+        self.head = 0
+
+    # Write a frame in the next slot and return its reference
+    def write(self, frame):
+        slot = self.head
+        self.slots[slot] = np.asarray(frame).reshape(-1).view(np.uint8)
+        self.head = (self.head + 1) % self.n_slots
+        return SHM_FRAME_MAGIC + SHM_FRAME_HEADER.pack(slot, self.frame_size) + self.name_bytes
+
+    def close(self):
+        self.slots = None
+        _owned_segments.discard(self.shm.name)
+        self.shm.close()
+        self.shm.unlink()
+
+# Consumer side (client), attaches to segments on first use
+class SharedMemoryFrameReader:
+    def __init__(self):
+        self.segments = {}
+
+    # Copy the referenced frame out of the ring buffer (the slot is overwritten n_slots steps later)
+    def read(self, frame_payload, shape):
+        slot, frame_size = SHM_FRAME_HEADER.unpack_from(frame_payload, len(SHM_FRAME_MAGIC))
+        buffer = self._attach(bytes(frame_payload[len(SHM_FRAME_MAGIC) + SHM_FRAME_HEADER.size:]).decode())
+        return np.frombuffer(buffer, dtype=np.uint8, count=frame_size, offset=slot * frame_size).reshape(shape).copy()
+
+    def close(self):
+        for segment in self.segments.values():
+            segment.close()
+        self.segments = {}
+
+    def _attach(self, name):
+        if name not in self.segments:
+            if sys.version_info >= (3, 13):
+                segment = shared_memory.SharedMemory(name=name, track=False)
+            else:
+                segment = shared_memory.SharedMemory(name=name)
+                # The segment belongs to the engine, the resource tracker must not unlink it on exit
+                if name not in _owned_segments:
+                    resource_tracker.unregister(segment._name, "shared_memory")
+            self.segments[name] = segment
+        return self.segments[name].buf
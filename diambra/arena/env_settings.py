@@ -58,6 +58,10 @@ class EnvironmentSettingsBase:
     rank: int = 0
     env_address: str = None
     grpc_timeout: int = 600
+    reuse_obs_arrays: bool = False  # BOX RAM states arrays are preallocated and overwritten at every step
+    ram_states_layout: str = "dict"  # "dict": nested P1/P2 dicts, "flat": single vector indexed by env.ram_states_index
+    frame_transport: str = "grpc"  # "grpc": frames in gRPC responses, "shm": frames in shared memory (engine on the same host)
+    profile_latency: bool = False  # Rolling per-layer step latency percentiles, in env.unwrapped.latency_percentiles() and info["latency"]
 
     # Episode settings
     seed: Union[None, str] = None
@@ -189,6 +193,10 @@ class EnvironmentSettingsBase:
         check_num_in_range("rank", self.rank, [0, MAX_VAL])
         check_type("env_address", self.env_address, str)
         check_num_in_range("grpc_timeout", self.grpc_timeout, [0, 3600])
+        check_type("reuse_obs_arrays", self.reuse_obs_arrays, bool, admit_none=False)
+        check_val_in_list("ram_states_layout", self.ram_states_layout, ["dict", "flat"])
+        check_val_in_list("frame_transport", self.frame_transport, ["grpc", "shm"])
+        check_type("profile_latency", self.profile_latency, bool, admit_none=False)
 
         if self.seed is not None:
             check_num_in_range("seed", self.seed, [-1, MAX_VAL])
@@ -410,8 +418,10 @@ class WrappersSettings:
     clip_reward: bool = False
     no_attack_buttons_combinations: bool = False
     frame_shape: Tuple[int, int, int] = (0, 0, 0)
+    frame_interpolation: Union[None, str] = None  # Frame resampling method (None: "linear", same output of GrayscaleFrame + WarpFrame), see FramePreprocessing
     stack_frames: int = 1
     dilation: int = 1
+    exclude_frame: bool = False  # RAM states only observation, frames neither decoded nor processed
     add_last_action: bool = False
     stack_actions: int = 1
     scale: bool = False
@@ -420,6 +430,7 @@ class WrappersSettings:
     role_relative: bool = False
     flatten: bool = False
     filter_keys: List[str] = field(default_factory=list)
+    compiled: bool = False  # Run the wrappers above (not the additional ones) as a single fused layer
     wrappers: List[List[Any]] = field(default_factory=list)
 
     def sanity_check(self):
@@ -435,8 +446,10 @@ class WrappersSettings:
         if (min(self.frame_shape[0], self.frame_shape[1]) == 0 and
             max(self.frame_shape[0], self.frame_shape[1]) != 0):
             raise Exception("\"frame_shape[0] and frame_shape[1]\" must be both different from 0")
+        check_val_in_list("frame_interpolation", self.frame_interpolation, [None, "nearest", "linear", "area", "cubic", "lanczos"])
         check_num_in_range("stack_frames", self.stack_frames, [1, MAX_STACK_VALUE])
         check_num_in_range("dilation", self.dilation, [1, MAX_STACK_VALUE])
+        check_type("exclude_frame", self.exclude_frame, bool, admit_none=False)
         check_type("add_last_action", self.add_last_action, bool, admit_none=False)
         stack_actions_bounds = [1, 1]
         if self.add_last_action is True:
@@ -448,13 +461,20 @@ class WrappersSettings:
         check_type("role_relative", self.role_relative, bool, admit_none=False)
         check_type("flatten", self.flatten, bool, admit_none=False)
         check_type("filter_keys", self.filter_keys, list, admit_none=False)
+        check_type("compiled", self.compiled, bool, admit_none=False)
         check_type("wrappers", self.wrappers, list, admit_none=False)
 
 @dataclass
 class RecordingSettings:
     dataset_path:  Union[None, str] = None
     username: Union[None, str] = None
+    streaming: bool = False
+    chunk_size: int = 512
+    max_queued_chunks: int = 4
 
     def sanity_check(self):
         check_type("dataset_path", self.dataset_path, str)
         check_type("username", self.username, str)
+        check_type("streaming", self.streaming, bool, admit_none=False)
+        check_num_in_range("chunk_size", self.chunk_size, [1, MAX_VAL])
+        check_num_in_range("max_queued_chunks", self.max_queued_chunks, [1, MAX_VAL])
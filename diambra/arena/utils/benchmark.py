@@ -0,0 +1,311 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import logging
+import tracemalloc
+import contextlib
+import threading
+import numpy as np
+import gymnasium as gym
+from unittest import mock
+from datetime import datetime
+import diambra.arena
+from diambra.arena import EnvironmentSettings, EnvironmentSettingsMultiAgent, WrappersSettings, RecordingSettings
+from diambra.arena.utils.engine_mock import load_mocker
+from diambra.arena.utils.gym_utils import ParallelPickleWriter
+from diambra.arena.utils.diambra_data_loader import DiambraDataLoader, DiambraDataset
+
+# Benchmark suite, runs against a zero-delay in-process engine stand-in (DiambraEngineMock with fps=0)
+# Usage: python -m diambra.arena.utils.benchmark --output results.json [--cases raw wrapper_ ...] [--compare previous.json]
+
+# Each wrapper of env_wrapping in isolation, plus common stacks
+WRAPPER_CASES = {
+    "wrapper_noop_reset": {"no_op_max": 6},
+    "wrapper_sticky_actions": {"repeat_action": 4},
+    "wrapper_normalize_reward": {"normalize_reward": True},
+    "wrapper_clip_reward": {"clip_reward": True},
+    "wrapper_no_attack_buttons_combinations": {"no_attack_buttons_combinations": True},
+    "wrapper_grayscale": {"frame_shape": (0, 0, 1)},
+    "wrapper_warp_frame": {"frame_shape": (84, 84, 0)},
+    "wrapper_frame_preprocessing": {"frame_shape": (84, 84, 1)},
+    "wrapper_frame_preprocessing_area": {"frame_shape": (84, 84, 1), "frame_interpolation": "area"},
+    "wrapper_frame_stack": {"stack_frames": 4},
+    "wrapper_frame_stack_dilation": {"stack_frames": 4, "dilation": 2},
+    "wrapper_add_last_action": {"add_last_action": True},
+    "wrapper_actions_stack": {"add_last_action": True, "stack_actions": 12},
+    "wrapper_normalize_observation": {"scale": True},
+    "wrapper_role_relative": {"role_relative": True},
+    "wrapper_flatten": {"flatten": True},
+}
+
+STACK_CASES = {
+    "stack_image_agent": {"normalize_reward": True, "frame_shape": (84, 84, 1), "stack_frames": 4, "dilation": 1,
+                          "add_last_action": True, "stack_actions": 12, "scale": True, "exclude_image_scaling": True,
+                          "role_relative": True, "flatten": True},
+    "stack_filtered_ram_states": {"normalize_reward": True, "frame_shape": (128, 128, 1), "stack_frames": 4,
+                                  "add_last_action": True, "stack_actions": 12, "scale": True, "role_relative": True,
+                                  "flatten": True, "filter_keys": ["stage", "timer", "own_side", "opp_side",
+                                                                   "opp_character", "action"]},
+    "stack_ram_states_only": {"normalize_reward": True, "exclude_frame": True, "add_last_action": True, "stack_actions": 12,
+                              "scale": True, "role_relative": True, "flatten": True,
+                              "filter_keys": ["stage", "timer", "own_side", "opp_side", "opp_character", "action"]},
+}
+STACK_CASES.update({case + "_compiled": dict(kwargs, compiled=True) for case, kwargs in list(STACK_CASES.items())})
+
+# Minimal stand-in for pytest-mock "mocker", so load_mocker can be used outside of pytest
+class _Patcher:
+    def __init__(self):
+        self.patchers = []
+
+    def patch(self, target, new):
+        patcher = mock.patch(target, new)
+        patcher.start()
+        self.patchers.append(patcher)
+
+    def stop_all(self):
+        for patcher in reversed(self.patchers):
+            patcher.stop()
+        self.patchers = []
+
+@contextlib.contextmanager
+def zero_delay_engine():
+    patcher = _Patcher()
+    load_mocker(patcher, fps=0)
+    try:
+        yield
+    finally:
+        patcher.stop_all()
+
+def _settings(n_players, step_ratio=6):
+    settings = EnvironmentSettings() if n_players == 1 else EnvironmentSettingsMultiAgent()
+    settings.splash_screen = False
+    settings.step_ratio = step_ratio
+    return settings
+
+def _wrappers_settings(n_players, kwargs):
+    kwargs = dict(kwargs)
+    if n_players == 2 and "filter_keys" in kwargs:
+        kwargs["filter_keys"] = [k if k in ["stage", "timer"] else "agent_0_" + k for k in kwargs["filter_keys"]]
+    # 2P role relative observation is built on the per agent entries added by AddLastActionToObservation
+    if n_players == 2 and kwargs.get("role_relative", False) is True:
+        kwargs["add_last_action"] = True
+    return WrappersSettings(**kwargs)
+
+# Time a step function: steps/s, latency percentiles and, in a separate (slower) traced pass, allocations
+def measure(step_fn, n_steps, n_warmup, n_alloc_steps):
+    for _ in range(n_warmup):
+        step_fn()
+
+    latencies = np.zeros((n_steps,), dtype=np.float64)
+    start = time.perf_counter()
+    for idx in range(n_steps):
+        step_start = time.perf_counter()
+        step_fn()
+        latencies[idx] = time.perf_counter() - step_start
+    elapsed = time.perf_counter() - start
+
+    # Peak of the memory allocated during each step (transient allocations included) and net allocated blocks
+    alloc_peaks = np.zeros((n_alloc_steps,), dtype=np.float64)
+    tracemalloc.start()
+    blocks_start = sys.getallocatedblocks()
+    for idx in range(n_alloc_steps):
+        tracemalloc.reset_peak()
+        memory_before, _ = tracemalloc.get_traced_memory()
+        step_fn()
+        _, memory_peak = tracemalloc.get_traced_memory()
+        alloc_peaks[idx] = memory_peak - memory_before
+    blocks_end = sys.getallocatedblocks()
+    tracemalloc.stop()
+
+    latencies_ms = latencies * 1000.0
+    p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99])
+    return {
+        "steps": n_steps,
+        "steps_per_second": n_steps / elapsed,
+        "latency_ms": {"p50": p50, "p95": p95, "p99": p99, "mean": float(np.mean(latencies_ms)), "max": float(np.max(latencies_ms))},
+        "alloc_peak_kb_per_step": float(np.mean(alloc_peaks)) / 1024.0 if n_alloc_steps > 0 else None,
+        "net_blocks_per_step": (blocks_end - blocks_start) / n_alloc_steps if n_alloc_steps > 0 else None,
+    }
+
+# Step function over an environment, resetting it at episode end
+def env_step_fn(env, seed=42):
+    env.action_space.seed(seed)
+    env.reset(seed=seed)
+    actions = [env.action_space.sample() for _ in range(1000)]
+    state = {"idx": 0}
+
+    def step_fn():
+        state["idx"] += 1
+        _, _, terminated, truncated, _ = env.step(actions[state["idx"] % len(actions)])
+        if terminated or truncated:
+            env.reset()
+
+    return step_fn
+
+def bench_env(n_players, wrappers_kwargs, opts, recording_settings=None):
+    with zero_delay_engine():
+        # StickyActions requires step_ratio = 1
+        step_ratio = 1 if wrappers_kwargs.get("repeat_action", 1) > 1 else 6
+        env = diambra.arena.make("doapp", _settings(n_players, step_ratio), _wrappers_settings(n_players, wrappers_kwargs),
+                                 episode_recording_settings=recording_settings or RecordingSettings(), log_level=logging.ERROR)
+        try:
+            return measure(env_step_fn(env), opts.steps, opts.warmup, opts.alloc_steps)
+        finally:
+            env.close()
+
+def _wait_writers():
+    for thread in threading.enumerate():
+        if isinstance(thread, ParallelPickleWriter):
+            thread.join()
+
+def bench_recorder(n_players, streaming, opts):
+    dataset_path = tempfile.mkdtemp(prefix="diambra_benchmark_")
+    try:
+        recording_settings = RecordingSettings(dataset_path=dataset_path, username="benchmark", streaming=streaming)
+        result = bench_env(n_players, {}, opts, recording_settings)
+        _wait_writers()
+        return result
+    finally:
+        shutil.rmtree(dataset_path, ignore_errors=True)
+
+# Record a dataset of full episodes, then time the data loader and the dataset on it
+def bench_data_loading(opts):
+    dataset_path = tempfile.mkdtemp(prefix="diambra_benchmark_")
+    try:
+        with zero_delay_engine():
+            settings = _settings(1)
+            settings.frame_shape = (128, 128, 1)
+            recording_settings = RecordingSettings(dataset_path=dataset_path, username="benchmark")
+            env = diambra.arena.make("doapp", settings, episode_recording_settings=recording_settings, log_level=logging.ERROR)
+            env.reset(seed=42)
+            for _ in range(2):
+                terminated = truncated = False
+                while not (terminated or truncated):
+                    _, _, terminated, truncated, _ = env.step(env.action_space.sample())
+                env.reset()
+            env.close()
+        _wait_writers()
+
+        results = {}
+        data_loader = DiambraDataLoader(dataset_path, log_level=logging.ERROR)
+        data_loader.reset()
+        def loader_step_fn():
+            _, _, _, terminated, truncated, _ = data_loader.step()
+            if terminated or truncated:
+                data_loader.reset()
+        results["data_loader"] = measure(loader_step_fn, opts.steps, opts.warmup, opts.alloc_steps)
+
+        dataset = DiambraDataset(dataset_path, log_level=logging.ERROR)
+        rng = np.random.default_rng(42)
+        def dataset_batch_fn():
+            dataset.get_batch(rng.integers(0, len(dataset), size=32))
+        results["dataset_get_batch_32"] = measure(dataset_batch_fn, max(1, opts.steps // 32), 1, min(opts.alloc_steps, 5))
+        dataset.close()
+
+        return results
+    finally:
+        shutil.rmtree(dataset_path, ignore_errors=True)
+
+def available_cases():
+    cases = {}
+    for n_players in [1, 2]:
+        suffix = "_{}p".format(n_players)
+        cases["raw" + suffix] = (lambda n, opts: bench_env(n, {}, opts), n_players)
+        for name, kwargs in list(WRAPPER_CASES.items()) + list(STACK_CASES.items()):
+            cases[name + suffix] = (lambda n, opts, kwargs=kwargs: bench_env(n, kwargs, opts), n_players)
+        cases["recorder" + suffix] = (lambda n, opts: bench_recorder(n, False, opts), n_players)
+        cases["recorder_streaming" + suffix] = (lambda n, opts: bench_recorder(n, True, opts), n_players)
+    cases["data_loading"] = (lambda n, opts: bench_data_loading(opts), 1)
+    return cases
+
+def _metadata(opts):
+    try:
+        from importlib.metadata import version
+        arena_version = version("diambra-arena")
+    except Exception:
+        arena_version = None
+    return {
+        "date": datetime.now().isoformat(),
+        "diambra_arena": arena_version,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": np.__version__,
+        "gymnasium": gym.__version__,
+        "steps": opts.steps,
+        "warmup": opts.warmup,
+        "alloc_steps": opts.alloc_steps,
+    }
+
+def run(opts):
+    cases = available_cases()
+    selected = [name for name in cases if opts.cases is None or any(name.startswith(prefix) for prefix in opts.cases)]
+    if len(selected) == 0:
+        raise Exception("No benchmark case matches {}, available: {}".format(opts.cases, list(cases.keys())))
+
+    results = {}
+    for name in selected:
+        bench_fn, n_players = cases[name]
+        result = bench_fn(n_players, opts)
+        if name == "data_loading":
+            results.update(result)
+        else:
+            results[name] = result
+        if opts.verbose:
+            print("{}: done".format(name), file=sys.stderr)
+
+    return {"metadata": _metadata(opts), "results": results}
+
+# Steps/s ratio and p50 latency ratio against a previous run, per case
+def compare(report, previous_report):
+    comparison = {}
+    for name, result in report["results"].items():
+        if name in previous_report["results"]:
+            previous = previous_report["results"][name]
+            comparison[name] = {
+                "steps_per_second_ratio": result["steps_per_second"] / previous["steps_per_second"],
+                "p50_latency_ratio": result["latency_ms"]["p50"] / previous["latency_ms"]["p50"],
+            }
+    return comparison
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(description="DIAMBRA Arena benchmark suite (zero-delay engine stand-in)")
+    parser.add_argument("--steps", type=int, default=1000, help="Timed steps per case")
+    parser.add_argument("--warmup", type=int, default=50, help="Untimed steps before measuring")
+    parser.add_argument("--alloc_steps", type=int, default=100, help="Steps traced for allocations (0 to skip)")
+    parser.add_argument("--cases", type=str, nargs="+", default=None, help="Case names prefixes to run (all by default)")
+    parser.add_argument("--output", type=str, default=None, help="JSON output file (stdout by default)")
+    parser.add_argument("--compare", type=str, default=None, help="Previous JSON output to compare against")
+    parser.add_argument("--list", action="store_true", help="List available cases and exit")
+    parser.add_argument("--verbose", action="store_true", help="Print progress to stderr")
+    return parser.parse_args(args)
+
+def main(args=None):
+    opts = parse_args(args)
+    if opts.list:
+        print("\n".join(available_cases().keys()))
+        return 0
+
+    # Engine mock and wrappers prints would pollute the JSON output
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        report = run(opts)
+
+    if opts.compare is not None:
+        with open(opts.compare, "r") as previous_file:
+            report["comparison"] = compare(report, json.load(previous_file))
+
+    output = json.dumps(report, indent=2, default=float)
+    if opts.output is None:
+        print(output)
+    else:
+        with open(opts.output, "w") as output_file:
+            output_file.write(output + "\n")
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,188 @@
+import os
+import json
+import pickle
+import argparse
+import numpy as np
+import cv2
+from diambra.arena.utils.gym_utils import load_episode
+
+# Columnar episode format: one directory per episode containing
+# - meta.json: number of steps and columns description
+# - summary.pkl: episode summary (username, env settings)
+# - column_<idx>.npy: one contiguous array per step value (action, reward, dones, RAM states, game states)
+# - frames.bin + frames_index.npy: encoded frames blob and [n_steps + 1] offsets
+# - objects.pkl (optional): per step values that do not fit an array column (not numeric, ragged shapes,
+#   keys missing in some steps), stored as a list, or as a {step index: value} dict when keys are missing
+# Arrays are memory mapped, so any step can be read without loading the episode.
+COLUMNAR_EXTENSION = ".diambrac"
+COLUMNAR_VERSION = 1
+
+# Placeholder of step values whose key is missing
+_MISSING = object()
+
+# Flatten a step dict into {keys path: value}, frame and settings (stored per step by older recordings) excluded
+def _flatten_step(step_data, path=()):
+    flattened = {}
+    for k, v in step_data.items():
+        new_path = path + (k,)
+        if new_path in [("obs", "frame"), ("info", "settings")]:
+            continue
+        if isinstance(v, dict):
+            flattened.update(_flatten_step(v, new_path))
+        else:
+            flattened[new_path] = v
+    return flattened
+
+# Array column of the values of all steps, None if they can not be stacked (missing, ragged or not numeric)
+def _array_column(values):
+    if any(value is _MISSING for value in values):
+        return None
+    arrays = [np.asarray(value) for value in values]
+    if any(array.dtype == object or array.shape != arrays[0].shape for array in arrays):
+        return None
+    return np.stack(arrays)
+
+# Set a value in a nested dict given its keys path
+def _set_path(target_dict, path, value):
+    for k in path[:-1]:
+        target_dict = target_dict.setdefault(k, {})
+    target_dict[path[-1]] = value
+
+# Write an episode ({"episode_summary", "data"}) in columnar format
+def write_columnar_episode(episode, output_path):
+    os.makedirs(output_path, exist_ok=True)
+    episode_data = episode["data"]
+
+    columns = []
+    objects = {}
+    flattened_steps = [_flatten_step(step_data) for step_data in episode_data]
+    # Union of the keys of all steps, in order of appearance
+    paths = list(dict.fromkeys(path for flattened_step in flattened_steps for path in flattened_step))
+    for path in paths:
+        values = [flattened_step.get(path, _MISSING) for flattened_step in flattened_steps]
+        column = _array_column(values)
+        if column is None:
+            if any(value is _MISSING for value in values):
+                objects["/".join(path)] = {step_idx: value for step_idx, value in enumerate(values) if value is not _MISSING}
+            else:
+                objects["/".join(path)] = values
+            continue
+        file_name = "column_{}.npy".format(len(columns))
+        np.save(os.path.join(output_path, file_name), column)
+        columns.append({"path": list(path), "file": file_name})
+
+    # Encoded frames blob and offsets index
+    frames = [np.asarray(step_data["obs"]["frame"], dtype=np.uint8).reshape(-1) for step_data in episode_data]
+    frames_index = np.zeros((len(frames) + 1,), dtype=np.int64)
+    frames_index[1:] = np.cumsum([frame.shape[0] for frame in frames])
+    with open(os.path.join(output_path, "frames.bin"), "wb") as frames_file:
+        for frame in frames:
+            frames_file.write(frame.tobytes())
+    np.save(os.path.join(output_path, "frames_index.npy"), frames_index)
+
+    if len(objects) > 0:
+        with open(os.path.join(output_path, "objects.pkl"), "wb") as objects_file:
+            pickle.dump(objects, objects_file)
+
+    with open(os.path.join(output_path, "summary.pkl"), "wb") as summary_file:
+        pickle.dump(episode["episode_summary"], summary_file)
+
+    meta = {
+        "version": COLUMNAR_VERSION,
+        "steps": len(episode_data),
+        "columns": columns,
+        "objects": sorted(objects.keys()),
+    }
+    with open(os.path.join(output_path, "meta.json"), "w") as meta_file:
+        json.dump(meta, meta_file, indent=2)
+
+    return output_path
+
+# Convert a recorded ".diambra" episode file to columnar format
+def convert_episode_file(file_path, output_path=None):
+    if output_path is None:
+        output_path = os.path.splitext(file_path)[0] + COLUMNAR_EXTENSION
+    return write_columnar_episode(load_episode(file_path), output_path)
+
+# Convert all ".diambra" episode files of a dataset to columnar format, in place by default
+# (data loaders read the columnar episode instead of the recorded file with the same name)
+def convert_dataset(dataset_path, output_path=None):
+    if output_path is None:
+        output_path = dataset_path
+    os.makedirs(output_path, exist_ok=True)
+
+    converted = []
+    for file_name in sorted(os.listdir(dataset_path)):
+        if file_name.endswith(".diambra"):
+            episode_output_path = os.path.join(output_path, os.path.splitext(file_name)[0] + COLUMNAR_EXTENSION)
+            converted.append(convert_episode_file(os.path.join(dataset_path, file_name), episode_output_path))
+
+    return converted
+
+# Columnar episode meta data (number of steps, columns description)
+def load_columnar_meta(path):
+    with open(os.path.join(path, "meta.json"), "r") as meta_file:
+        meta = json.load(meta_file)
+    if meta["version"] != COLUMNAR_VERSION:
+        raise Exception("Columnar episode version {} not supported (expected {})".format(meta["version"], COLUMNAR_VERSION))
+    return meta
+
+# Columnar episode reader, memory mapped random access to steps
+class ColumnarEpisode:
+    def __init__(self, path):
+        self.path = path
+        self.meta = load_columnar_meta(path)
+
+        with open(os.path.join(path, "summary.pkl"), "rb") as summary_file:
+            self.episode_summary = pickle.load(summary_file)
+
+        self.columns = [(tuple(column["path"]), np.load(os.path.join(path, column["file"]), mmap_mode="r"))
+                        for column in self.meta["columns"]]
+        self.objects = {}
+        if len(self.meta["objects"]) > 0:
+            with open(os.path.join(path, "objects.pkl"), "rb") as objects_file:
+                self.objects = {tuple(k.split("/")): v for k, v in pickle.load(objects_file).items()}
+
+        self.frames_index = np.load(os.path.join(path, "frames_index.npy"))
+        self.frames = np.memmap(os.path.join(path, "frames.bin"), dtype=np.uint8, mode="r") \
+                      if self.frames_index[-1] > 0 else np.zeros((0,), dtype=np.uint8)
+
+    def __len__(self):
+        return self.meta["steps"]
+
+    # Step dict with the same structure of recorded ones, frame still encoded
+    def __getitem__(self, idx):
+        if idx < 0:
+            idx += len(self)
+        if idx < 0 or idx >= len(self):
+            raise IndexError("Step index {} out of range ({} steps)".format(idx, len(self)))
+
+        step_data = {"obs": {"frame": self.get_encoded_frame(idx)}, "info": {}}
+        for path, column in self.columns:
+            value = column[idx]
+            _set_path(step_data, path, value.item() if value.ndim == 0 else np.array(value))
+        for path, values in self.objects.items():
+            if isinstance(values, dict):
+                # Key not present in all steps
+                if idx in values:
+                    _set_path(step_data, path, values[idx])
+            else:
+                _set_path(step_data, path, values[idx])
+
+        return step_data
+
+    def get_encoded_frame(self, idx):
+        return np.array(self.frames[self.frames_index[idx]:self.frames_index[idx + 1]])
+
+    def get_frame(self, idx):
+        return cv2.imdecode(self.get_encoded_frame(idx), cv2.IMREAD_UNCHANGED)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dataset_path", type=str, required=True, help="Path to the \".diambra\" episode files")
+    parser.add_argument("--output_path", type=str, default=None, help="Output path (same as dataset_path by default)")
+    opt = parser.parse_args()
+    print(opt)
+
+    for converted_path in convert_dataset(opt.dataset_path, opt.output_path):
+        print("Converted episode to {}".format(converted_path))
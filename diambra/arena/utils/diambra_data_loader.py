@@ -1,10 +1,22 @@
-import pickle
-import bz2
 import cv2
 import os
 import logging
 import numpy as np
 import sys
+import random
+from threading import Lock
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, Future
+from diambra.arena.utils.gym_utils import load_episode, load_episode_summary
+from diambra.arena.utils.columnar_dataset import ColumnarEpisode, COLUMNAR_EXTENSION, load_columnar_meta
+
+# Recorded ".diambra" files and columnar episodes of a dataset, recorded files converted in place
+# (columnar episode with the same name next to them) are listed once, as columnar episodes
+def _episode_files(dataset_path):
+    file_names = os.listdir(dataset_path)
+    columnar_episodes = set(filename for filename in file_names if filename.endswith(COLUMNAR_EXTENSION))
+    return [filename for filename in file_names if filename in columnar_episodes or
+            (filename.endswith(".diambra") and os.path.splitext(filename)[0] + COLUMNAR_EXTENSION not in columnar_episodes)]
 
 # Diambra dataloader
 class DiambraDataLoader:
@@ -22,10 +34,11 @@ class DiambraDataLoader:
         if not os.path.isdir(self.dataset_path):
             raise NotADirectoryError(f"'{self.dataset_path}' is not a directory.")
 
-        episode_files = [filename for filename in os.listdir(self.dataset_path) if filename.endswith(".diambra")]
+        # Recorded episode files and columnar format episodes
+        episode_files = _episode_files(self.dataset_path)
 
         if not episode_files:
-            raise Exception("No '.diambra' files found in the specified directory.")
+            raise Exception("No '.diambra' files or '{}' episodes found in the specified directory.".format(COLUMNAR_EXTENSION))
 
         self.episode_files = episode_files
 
@@ -56,10 +69,13 @@ class DiambraDataLoader:
         self.file_idx += 1
         self.frame = np.zeros((128, 128, 1), dtype=np.uint8)
 
-        # Read compressed RL Traj file
-        in_file = bz2.BZ2File(os.path.join(self.dataset_path, episode_file), 'r')
-        self.episode = pickle.load(in_file)
-        in_file.close()
+        if episode_file.endswith(COLUMNAR_EXTENSION):
+            # Memory mapped columnar episode, steps are read on access
+            columnar_episode = ColumnarEpisode(os.path.join(self.dataset_path, episode_file))
+            self.episode = {"episode_summary": columnar_episode.episode_summary, "data": columnar_episode}
+        else:
+            # Read compressed RL Traj file
+            self.episode = load_episode(os.path.join(self.dataset_path, episode_file))
 
         self.logger.info("Episode summary = {}".format(self.episode["episode_summary"]))
         self.episode_data = self.episode["data"]
@@ -81,3 +97,163 @@ class DiambraDataLoader:
             except:
                 return False
 
+# Decode a step frame, returning a new step dict (cached episode data is left untouched)
+def _decode_step(step_data):
+    decoded_step_data = dict(step_data)
+    decoded_step_data["obs"] = dict(step_data["obs"])
+    decoded_step_data["obs"]["frame"] = cv2.imdecode(np.frombuffer(step_data["obs"]["frame"], dtype=np.uint8), cv2.IMREAD_UNCHANGED)
+    return decoded_step_data
+
+# Diambra random access dataset
+class DiambraDataset:
+    def __init__(self, dataset_path: str, num_workers: int=4, prefetch: int=2, cache_size: int=8, log_level=logging.INFO):
+        """
+        Random access over all the steps of a recorded dataset, indexed once as (episode, step).
+        Frames are decoded in a thread pool (cv2.imdecode releases the GIL).
+        :param dataset_path: (str) path to the ".diambra" files and/or columnar episodes
+        :param num_workers: (int) number of frame decoding threads
+        :param prefetch: (int) number of batches decoded ahead during iteration
+        :param cache_size: (int) number of loaded ".diambra" episodes kept in memory
+        ".diambra" episodes are decompressed as a whole to read any of their steps, shuffled iteration
+        over them is limited to windows of a few episodes (see iterate). For fully shuffled access,
+        convert the dataset to the columnar format (columnar_dataset.convert_dataset), whose steps are
+        memory mapped and read individually.
+        """
+        logging.basicConfig(level=log_level)
+        self.logger = logging.getLogger(__name__)
+
+        if not os.path.isdir(dataset_path):
+            raise NotADirectoryError(f"'{dataset_path}' is not a directory.")
+
+        self.dataset_path = dataset_path
+        self.episode_files = sorted(_episode_files(dataset_path))
+        if not self.episode_files:
+            raise Exception("No '.diambra' files or '{}' episodes found in the specified directory.".format(COLUMNAR_EXTENSION))
+
+        assert prefetch >= 1, "DiambraDataset: prefetch must be >= 1"
+        self.prefetch = prefetch
+        self.cache_size = max(1, cache_size)
+        self._cache = OrderedDict()
+        self._cache_lock = Lock()
+        # In flight episode loads, concurrent requests of the same episode wait for the same load
+        self._loading = {}
+
+        # Global index: episode_offsets[i] is the global index of the first step of the i-th episode,
+        # built from the episodes summaries / meta data (steps are loaded on access)
+        episode_lengths = [self._episode_length(file_idx) for file_idx in range(len(self.episode_files))]
+        self.episode_offsets = np.zeros((len(episode_lengths) + 1,), dtype=np.int64)
+        self.episode_offsets[1:] = np.cumsum(episode_lengths)
+
+        self._executor = ThreadPoolExecutor(max_workers=num_workers, thread_name_prefix="diambra_dataset")
+
+    def __len__(self):
+        return int(self.episode_offsets[-1])
+
+    # (episode index, step index) of a global step index
+    def locate(self, idx):
+        if idx < 0:
+            idx += len(self)
+        if idx < 0 or idx >= len(self):
+            raise IndexError("Step index {} out of range ({} steps)".format(idx, len(self)))
+        file_idx = int(np.searchsorted(self.episode_offsets, idx, side="right")) - 1
+        return file_idx, idx - int(self.episode_offsets[file_idx])
+
+    # Step dict {"obs", "action", "reward", "terminated", "truncated", "info"}, with decoded frame
+    def __getitem__(self, idx):
+        file_idx, step_idx = self.locate(idx)
+        return _decode_step(self._get_episode(file_idx)[step_idx])
+
+    def get_batch(self, indices):
+        return list(self._executor.map(self.__getitem__, indices))
+
+    # Iterate over batches of steps, decoding up to "prefetch" batches ahead
+    def iterate(self, batch_size: int=1, shuffle: bool=True, seed: int=None, drop_last: bool=False, shuffle_window: int=None):
+        """
+        :param shuffle: (bool) if to shuffle the steps order
+        :param shuffle_window: (int) number of episodes whose steps are shuffled together (episodes order is
+               shuffled too). Defaults to all of them for columnar datasets, to half the cache size otherwise,
+               so that each ".diambra" episode is loaded once per iteration
+        """
+        if shuffle is True:
+            rng = random.Random(seed)
+            if shuffle_window is None:
+                all_columnar = all(file_name.endswith(COLUMNAR_EXTENSION) for file_name in self.episode_files)
+                shuffle_window = len(self.episode_files) if all_columnar else max(1, self.cache_size // 2)
+            file_indices = list(range(len(self.episode_files)))
+            rng.shuffle(file_indices)
+            indices = []
+            for start in range(0, len(file_indices), shuffle_window):
+                window_indices = [idx for file_idx in file_indices[start:start + shuffle_window]
+                                  for idx in range(self.episode_offsets[file_idx], self.episode_offsets[file_idx + 1])]
+                rng.shuffle(window_indices)
+                indices += window_indices
+        else:
+            indices = list(range(len(self)))
+        batches = [indices[start:start + batch_size] for start in range(0, len(indices), batch_size)]
+        if drop_last is True and len(batches) > 0 and len(batches[-1]) < batch_size:
+            batches.pop()
+
+        pending = []
+        for batch in batches:
+            pending.append([self._executor.submit(self.__getitem__, idx) for idx in batch])
+            if len(pending) > self.prefetch:
+                yield [future.result() for future in pending.pop(0)]
+        while len(pending) > 0:
+            yield [future.result() for future in pending.pop(0)]
+
+    def __iter__(self):
+        for batch in self.iterate(batch_size=1, shuffle=False):
+            yield batch[0]
+
+    def close(self):
+        self._executor.shutdown()
+        with self._cache_lock:
+            self._cache.clear()
+
+    # Number of steps of an episode, from the recorded summary or the columnar meta data
+    def _episode_length(self, file_idx):
+        episode_path = os.path.join(self.dataset_path, self.episode_files[file_idx])
+        if episode_path.endswith(COLUMNAR_EXTENSION):
+            return load_columnar_meta(episode_path)["steps"]
+        episode_summary = load_episode_summary(episode_path)
+        if "steps" in episode_summary:
+            return episode_summary["steps"]
+        return len(self._get_episode(file_idx))
+
+    # Episode steps, ".diambra" episodes are loaded once and kept in a LRU cache
+    def _get_episode(self, file_idx):
+        with self._cache_lock:
+            if file_idx in self._cache:
+                self._cache.move_to_end(file_idx)
+                return self._cache[file_idx]
+            loading = self._loading.get(file_idx)
+            owner = loading is None
+            if owner is True:
+                loading = self._loading[file_idx] = Future()
+
+        # Already being loaded by another worker
+        if owner is False:
+            return loading.result()
+
+        try:
+            episode_path = os.path.join(self.dataset_path, self.episode_files[file_idx])
+            if episode_path.endswith(COLUMNAR_EXTENSION):
+                episode_data = ColumnarEpisode(episode_path)
+            else:
+                episode_data = load_episode(episode_path)["data"]
+        except Exception as e:
+            with self._cache_lock:
+                del self._loading[file_idx]
+            loading.set_exception(e)
+            raise
+
+        with self._cache_lock:
+            self._cache[file_idx] = episode_data
+            self._cache.move_to_end(file_idx)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+            del self._loading[file_idx]
+        loading.set_result(episode_data)
+
+        return episode_data
+
@@ -1,17 +1,27 @@
 import time
 import random
+from concurrent.futures import Future
 import numpy as np
 import diambra.arena
-from copy import deepcopy
 from diambra.engine import model
 from diambra.arena import Roles
+from diambra.arena.engine.shm_frames import SharedMemoryFrameRing
+
+def _completed_future(response):
+    future = Future()
+    future.set_result(response)
+    return future
 
 class DiambraEngineMock:
-    def __init__(self, fps=1000, override_perfect_probability=None):
+    def __init__(self, fps=1000, override_perfect_probability=None, max_cached_frames_bytes=64*1024*1024):
 
         # Game features
         self.game_data = None
         self.fps = fps
+        self.frame_transport = "grpc"
+        self.shm_frames = None
+        self.max_cached_frames_bytes = max_cached_frames_bytes
+        self._frames_cache = {}
 
         # Class state variables initialization
         self.timer = 0
@@ -25,7 +35,8 @@ class DiambraEngineMock:
         self.perfect = False
         self.override_perfect_probability = override_perfect_probability
 
-    def mock__init__(self, env_address, grpc_timeout=60):
+    def mock__init__(self, env_address, grpc_timeout=60, frame_transport="grpc"):
+        self.frame_transport = frame_transport
         print("Trying to connect to DIAMBRA Engine server (timeout={}s)...".format(grpc_timeout))
         print("... done (MOCKED!).")
 
@@ -57,12 +68,18 @@ class DiambraEngineMock:
         if self.override_perfect_probability is not None:
             self.perfect_probability = self.override_perfect_probability
 
-        self.frame_shape = self.game_data["frame_shape"]
+        self.frame_shape = list(self.game_data["frame_shape"])
         if (self.settings.frame_shape.h > 0 and self.settings.frame_shape.w > 0):
             self.frame_shape[0] = self.settings.frame_shape.h
             self.frame_shape[1] = self.settings.frame_shape.w
         if (self.settings.frame_shape.c == 1):
             self.frame_shape[2] = self.settings.frame_shape.c
+        self._frames_cache = {}
+
+        # Shared memory frames ring buffer
+        self._close_shm_frames()
+        if self.frame_transport == "shm":
+            self.shm_frames = SharedMemoryFrameRing(int(np.prod(self.frame_shape)))
 
         continue_game_setting = self.settings.episode_settings.continue_game
         self.continue_per_episode = - int(continue_game_setting) if continue_game_setting < 0.0 else int(continue_game_setting*10)
@@ -72,13 +89,12 @@ class DiambraEngineMock:
                                (self.game_data["ram_states"]["common"]["timer"][2] / self.settings.step_ratio)))
 
         # Generate the ram states map
+        # (game data is shared and read-only, each entry is copied to a list holding its current value)
         self.ram_states = {}
-        self.ram_states[model.RamStatesCategories.common] = self.game_data["ram_states"]["common"]
-        self.ram_states[model.RamStatesCategories.P1] = deepcopy(self.game_data["ram_states"]["Px"])
-        self.ram_states[model.RamStatesCategories.P2] = deepcopy(self.game_data["ram_states"]["Px"])
-        for k, v in self.ram_states.items():
-            for k2, v2 in v.items():
-                self.ram_states[k][k2].append(0)
+        for category, game_data_category in [(model.RamStatesCategories.common, "common"),
+                                             (model.RamStatesCategories.P1, "Px"),
+                                             (model.RamStatesCategories.P2, "Px")]:
+            self.ram_states[category] = {k: list(v) + [0] for k, v in self.game_data["ram_states"][game_data_category].items()}
 
         # Build the response
         response = model.EnvInitResponse()
@@ -160,9 +176,42 @@ class DiambraEngineMock:
 
         return self._update_step_reset_response()
 
+    # Step the environment repeating the same actions, response built for the last step only [pb low level]
+    def mock_step_repeat(self, actions, n, stop_on_round_done=True, terminal_game_state=model.GameStates.episode_done):
+        reward = 0.0
+        for idx in range(n):
+            # RAM states of the intermediate steps (same random sequence of single steps)
+            if idx > 0:
+                self._generate_ram_states()
+            self._new_game_state(actions)
+            reward += self.reward
+            game_states = {model.GameStates.round_done: self.round_done_, model.GameStates.game_done: self.game_done_,
+                           model.GameStates.episode_done: self.episode_done_}
+            if game_states[terminal_game_state] or (stop_on_round_done is True and self.round_done_):
+                break
+
+        return self._update_step_reset_response(), reward
+
+    # Step multiple environments in a single call, batched engine server [pb low level]
+    def mock_step_batch(self, engines, list_of_action_lists):
+        return [self.mock_step(action_list) for action_list in list_of_action_lists]
+
+    # Reset the environment without blocking, returns an already completed future [pb low level]
+    def mock_reset_async(self, episode_settings):
+        return _completed_future(self.mock_reset(episode_settings))
+
+    # Step the environment without blocking, returns an already completed future [pb low level]
+    def mock_step_async(self, actions):
+        return _completed_future(self.mock_step(actions))
+
     # Closing DIAMBRA Arena
     def mock_close(self):
-        pass
+        self._close_shm_frames()
+
+    def _close_shm_frames(self):
+        if self.shm_frames is not None:
+            self.shm_frames.close()
+            self.shm_frames = None
 
     def _generate_ram_states(self):
         for k, v in self.ram_states.items():
@@ -182,9 +231,17 @@ class DiambraEngineMock:
         self.ram_states[model.RamStatesCategories.common]["stage"][3] = int(self.current_stage_number)
         self.ram_states[model.RamStatesCategories.common]["timer"][3] = int(self.timer)
 
+    # Mock frames are uniform, their bytes are built once per value (as in DiambraEngineVectorizedMock)
     def _generate_frame(self):
-        frame = np.ones((self.frame_shape), dtype=np.int8) * ((self.current_stage_number * self.game_data["rounds_per_stage"] + int(self.timer)) % 255)
-        return frame.tobytes()
+        value = (self.current_stage_number * self.game_data["rounds_per_stage"] + int(self.timer)) % 255
+        frame = self._frames_cache.get(value)
+        if frame is None:
+            frame = np.full(self.frame_shape, value, dtype=np.uint8).tobytes()
+            if (len(self._frames_cache) + 1) * len(frame) <= self.max_cached_frames_bytes:
+                self._frames_cache[value] = frame
+        if self.shm_frames is not None:
+            return self.shm_frames.write(np.frombuffer(frame, dtype=np.uint8))
+        return frame
 
     # Set delta health
     def _set_perfect_chance(self):
@@ -228,8 +285,9 @@ class DiambraEngineMock:
 
     # Update game state
     def _new_game_state(self, actions):
-        # Sleep to simulate computer time elapsed
-        time.sleep(1.0/(self.settings.step_ratio * self.fps))
+        # Sleep to simulate computer time elapsed (fps=0: zero-delay engine, e.g. for benchmarks)
+        if self.fps > 0:
+            time.sleep(1.0/(self.settings.step_ratio * self.fps))
 
         # Actions
         for idx, action in enumerate(actions):
@@ -360,11 +418,304 @@ class DiambraEngineMock:
 
         return response
 
-def load_mocker(mocker, **kwargs):
+# High throughput engine mock: no artificial delay, N environments in a single object whose game
+# states are stored in arrays and evolved all together (same game dynamics of DiambraEngineMock)
+class DiambraEngineVectorizedMock:
+    def __init__(self, n_envs=1, override_perfect_probability=None, seed=0, max_cached_frames_bytes=64*1024*1024):
+        self.n_envs = n_envs
+        self.override_perfect_probability = override_perfect_probability
+        # One random generator per environment, so that resetting one of them leaves the others untouched
+        self.rngs = [np.random.default_rng([seed, idx]) for idx in range(n_envs)]
+        self.max_cached_frames_bytes = max_cached_frames_bytes
+        self.game_data = None
+        self.n_players = None
+        self.settings = [None] * n_envs
+        self.n_connected_envs = 0
+
+        # Per environment game state
+        self.timer = np.zeros((n_envs,), dtype=np.float64)
+        self.stage = np.ones((n_envs,), dtype=np.int64)
+        self.n_continue = np.zeros((n_envs,), dtype=np.int64)
+        self.health = np.zeros((n_envs, 2), dtype=np.int64)
+        self.wins = np.zeros((n_envs, 2), dtype=np.int64)
+        self.side = np.tile(np.array([0, 1], dtype=np.int64), (n_envs, 1))
+        self.char = np.zeros((n_envs, 2), dtype=np.int64)
+        self.perfect = np.zeros((n_envs,), dtype=np.bool_)
+        self.reward = np.zeros((n_envs,), dtype=np.int64)
+        self.flags = np.zeros((n_envs, 5), dtype=np.bool_)  # round, stage, game, episode, env done
+
+        # Per environment settings derived values
+        self.step_ratio = np.ones((n_envs,), dtype=np.float64)
+        self.roles = np.zeros((n_envs, 2), dtype=np.int64)  # Player index (P1: 0, P2: 1) controlled by each agent
+        self.base_round_winning_probability = np.zeros((n_envs,), dtype=np.float64)
+        self.perfect_probability = np.zeros((n_envs,), dtype=np.float64)
+        self.continue_per_episode = np.zeros((n_envs,), dtype=np.int64)
+        self.frame_shape = [None] * n_envs
+        self._frames_cache = [{} for _ in range(n_envs)]
+
+    # Assign an environment slot to each engine client
+    def mock__init__(self, engine, env_address, grpc_timeout=60, frame_transport="grpc"):
+        if self.n_connected_envs >= self.n_envs:
+            raise Exception("DiambraEngineVectorizedMock: all the {} environments are already in use".format(self.n_envs))
+        engine.mock_env_idx = self.n_connected_envs
+        self.n_connected_envs += 1
+
+    # Env info response built by the single env mock [pb low level]
+    def mock_env_init(self, engine, env_settings_pb):
+        idx = engine.mock_env_idx
+        env_mock = DiambraEngineMock(fps=0, override_perfect_probability=self.override_perfect_probability)
+        response = env_mock.mock_env_init(env_settings_pb)
+
+        if self.game_data is None:
+            self.game_data = env_mock.game_data
+            self.n_players = env_settings_pb.n_players
+            self.health_bounds = self.game_data["health"]
+            self.timer_max = self.game_data["ram_states"]["common"]["timer"][2]
+            self.base_hit = env_mock.base_hit
+            self._build_ram_states_plan(env_mock.ram_states)
+        elif env_mock.game_data["id"] != self.game_data["id"] or env_settings_pb.n_players != self.n_players:
+            raise Exception("DiambraEngineVectorizedMock: all the environments must run the same game with the same number of players")
+
+        self.settings[idx] = env_settings_pb
+        self.step_ratio[idx] = env_settings_pb.step_ratio
+        self.base_round_winning_probability[idx] = env_mock.base_round_winning_probability
+        self.perfect_probability[idx] = env_mock.perfect_probability
+        self.continue_per_episode[idx] = env_mock.continue_per_episode
+        self.frame_shape[idx] = tuple(env_mock.frame_shape)
+        self._frames_cache[idx] = {}
+
+        return response
+
+    def mock_reset(self, engine, episode_settings):
+        idx = engine.mock_env_idx
+        self.settings[idx].episode_settings.CopyFrom(episode_settings)
+        self.rngs[idx] = np.random.default_rng([episode_settings.random_seed % 2**32, idx])
+
+        self.stage[idx] = 1
+        self.n_continue[idx] = 0
+        self.flags[idx] = False
+        self.side[idx] = [0, 1]
+        self.health[idx] = self.health_bounds[1]
+        self.wins[idx] = 0
+        self.timer[idx] = self.timer_max
+        self.reward[idx] = 0
+        for player_idx in range(self.n_players):
+            player_settings = episode_settings.player_settings[player_idx]
+            self.roles[idx, player_idx] = player_settings.role - Roles.P1
+            self.char[idx, player_settings.role - Roles.P1] = self.game_data["char_list"].index(player_settings.characters[0])
+        self._set_perfect_chance(np.array([idx]))
+
+        return self._responses(np.array([idx]))[0]
+
+    def mock_step(self, engine, actions):
+        return self.step_envs([engine.mock_env_idx], [actions])[0]
+
+    # Batched step, a single vectorized state update for all the engines [pb low level]
+    def mock_step_batch(self, engines, list_of_action_lists):
+        return self.step_envs([engine.mock_env_idx for engine in engines], list_of_action_lists)
+
+    def mock_reset_async(self, engine, episode_settings):
+        return _completed_future(self.mock_reset(engine, episode_settings))
+
+    def mock_step_async(self, engine, actions):
+        return _completed_future(self.mock_step(engine, actions))
+
+    def mock_close(self, engine):
+        pass
+
+    # Step a set of environments (indices) with their actions lists, returns their responses
+    def step_envs(self, env_indices, list_of_action_lists):
+        idx = np.asarray(env_indices, dtype=np.int64)
+        actions = np.asarray(list_of_action_lists, dtype=np.int64).reshape(len(idx), -1, 2)
+        self._new_game_state(idx, actions)
+        return self._responses(idx)
+
+    # One random value per environment, each drawn from the environment own generator
+    def _random(self, idx):
+        return np.array([self.rngs[env_idx].random() for env_idx in idx], dtype=np.float64)
+
+    def _set_perfect_chance(self, idx):
+        self.perfect[idx] = self._random(idx) < self.perfect_probability[idx]
+        # Force perfect to true in case of 2P games to avoid double update for own role
+        self.perfect[idx] |= self.n_players == 2
+
+    def _new_game_state(self, idx, actions):
+        n = len(idx)
+        rows = np.arange(n)
+        health_min, health_max = self.health_bounds
+        rounds_per_stage = self.game_data["rounds_per_stage"]
+
+        self.flags[idx] = False
+        self.timer[idx] -= self.step_ratio[idx] / 60.0
+        starting_health = self.health[idx]
+        health = starting_health.copy()
+
+        # Health evolution
+        hit_prob = self.base_round_winning_probability[idx] ** self.stage[idx]
+        for player_idx in range(self.n_players):
+            role = self.roles[idx, player_idx]
+            opponent_role = 1 - role
+            hit_opponent = (actions[:, player_idx, 1] != 0) & (self._random(idx) < hit_prob)
+            health[rows, opponent_role] -= self.base_hit * hit_opponent
+            got_hit = ~self.perfect[idx] & (self._random(idx) < 1.0 - hit_prob)
+            health[rows, role] -= self.base_hit * got_hit
+        np.maximum(health, health_min, out=health)
+
+        role_0 = self.roles[idx, 0]
+        opponent_role_0 = 1 - role_0
+        wins = self.wins[idx]
+
+        round_done = (np.min(health, axis=1) == health_min) | (self.timer[idx] <= 0)
+        round_won = round_done & (health[rows, role_0] > health[rows, opponent_role_0])
+        round_lost = round_done & ~round_won
+        health[rows[round_won], opponent_role_0[round_won]] = health_min
+        wins[rows[round_won], role_0[round_won]] += 1
+        health[rows[round_lost], role_0[round_lost]] = health_min
+        wins[rows[round_lost], opponent_role_0[round_lost]] += 1
+
+        stage = self.stage[idx]
+        stage_done = wins[rows, role_0] == rounds_per_stage
+        stage[stage_done] += 1
+        wins[stage_done] = 0
+        game_done = np.zeros((n,), dtype=np.bool_)
+        episode_done = np.zeros((n,), dtype=np.bool_)
+        if self.n_players == 2:
+            game_done |= stage_done
+            episode_done |= stage_done
+        else:
+            self.char[idx[stage_done], opponent_role_0[stage_done]] = stage[stage_done]
+
+        game_lost = wins[rows, opponent_role_0] == rounds_per_stage
+        n_continue = self.n_continue[idx]
+        out_of_continues = game_lost & (n_continue >= self.continue_per_episode[idx])
+        continuing = game_lost & ~out_of_continues
+        game_done |= game_lost
+        episode_done |= out_of_continues
+        n_continue[continuing] += 1
+        wins[continuing] = 0
+
+        game_completed = stage == self.game_data["stages_per_game"]
+        game_done |= game_completed
+        episode_done |= game_completed
+
+        reward = (starting_health[rows, opponent_role_0] - health[rows, opponent_role_0]) -\
+                 (starting_health[rows, role_0] - health[rows, role_0])
+
+        # Reset round state after round/stage/game end, random sides evolution otherwise
+        any_done = round_done | stage_done | game_done
+        health[any_done] = health_max
+        side = self.side[idx]
+        side[any_done] = [0, 1]
+        running = ~any_done
+        side_p1 = (self._random(idx) < 0.7).astype(np.int64)
+        side_p2 = np.where(self._random(idx) < 0.97, (side_p1 + 1) % 2, side[:, 1])
+        side[running, 0] = side_p1[running]
+        side[running, 1] = side_p2[running]
+
+        self.health[idx] = health
+        self.wins[idx] = wins
+        self.stage[idx] = stage
+        self.n_continue[idx] = n_continue
+        self.side[idx] = side
+        self.reward[idx] = reward
+        self.timer[idx[any_done]] = self.timer_max
+        self.flags[idx] = np.stack([round_done, stage_done, game_done, episode_done, episode_done], axis=1)
+        if np.any(any_done):
+            self._set_perfect_chance(idx[any_done])
+
+    # RAM states as columns: low/high bounds for random values, and the ones mapped to the game state
+    def _build_ram_states_plan(self, ram_states):
+        self.ram_states_keys = []
+        lows = []
+        highs = []
+        self.ram_states_state_columns = []
+        state_names = {"character": "char", "health": "health", "wins": "wins", "side": "side"}
+        for category, category_ram_states in ram_states.items():
+            for key, value in category_ram_states.items():
+                column = len(self.ram_states_keys)
+                self.ram_states_keys.append((category, model.RamStates.Value(key)))
+                lows.append(value[1])
+                highs.append(value[2])
+                base_key = key.rsplit("_", 1)[0] if key[-2:] in ["_1", "_2", "_3"] else key
+                if category in [model.RamStatesCategories.P1, model.RamStatesCategories.P2] and base_key in state_names:
+                    self.ram_states_state_columns.append((column, state_names[base_key], category - Roles.P1))
+                elif category == model.RamStatesCategories.common and key in ["stage", "timer"]:
+                    self.ram_states_state_columns.append((column, key, None))
+        self.ram_states_low = np.array(lows, dtype=np.int64)
+        self.ram_states_high = np.array(highs, dtype=np.int64)
+
+    def _responses(self, idx):
+        ram_states = np.array([self.rngs[env_idx].integers(self.ram_states_low, self.ram_states_high + 1) for env_idx in idx],
+                              dtype=np.int64).reshape(len(idx), len(self.ram_states_keys))
+        for column, state_name, player_idx in self.ram_states_state_columns:
+            if state_name == "stage":
+                ram_states[:, column] = self.stage[idx]
+            elif state_name == "timer":
+                ram_states[:, column] = self.timer[idx].astype(np.int64)
+            else:
+                ram_states[:, column] = getattr(self, state_name)[idx, player_idx]
+
+        frame_values = (self.stage[idx] * self.game_data["rounds_per_stage"] + self.timer[idx].astype(np.int64)) % 255
+        responses = []
+        for row, env_idx in enumerate(idx.tolist()):
+            response = model.StepResetResponse()
+            response_ram_states_categories = response.observation.ram_states_categories
+            for (category, ram_state), value in zip(self.ram_states_keys, ram_states[row].tolist()):
+                response_ram_states_categories[category].ram_states[ram_state] = value
+            game_states = response.info.game_states
+            flags = self.flags[env_idx].tolist()
+            game_states[model.GameStates.round_done] = flags[0]
+            game_states[model.GameStates.stage_done] = flags[1]
+            game_states[model.GameStates.game_done] = flags[2]
+            game_states[model.GameStates.episode_done] = flags[3]
+            game_states[model.GameStates.env_done] = flags[4]
+            response.observation.frame = self._frame(env_idx, int(frame_values[row]))
+            response.reward = int(self.reward[env_idx])
+            responses.append(response)
+
+        return responses
+
+    # Mock frames are uniform, their bytes are built once per value
+    def _frame(self, env_idx, value):
+        frames_cache = self._frames_cache[env_idx]
+        if value not in frames_cache:
+            frame = np.full(self.frame_shape[env_idx], value, dtype=np.int8).tobytes()
+            if (len(frames_cache) + 1) * len(frame) > self.max_cached_frames_bytes:
+                return frame
+            frames_cache[value] = frame
+        return frames_cache[value]
+
+def load_mocker(mocker, batched_step=False, **kwargs):
     diambra_engine_mock = DiambraEngineMock(**kwargs)
 
     mocker.patch("diambra.arena.engine.interface.DiambraEngine.__init__", diambra_engine_mock.mock__init__)
     mocker.patch("diambra.arena.engine.interface.DiambraEngine.env_init", diambra_engine_mock.mock_env_init)
     mocker.patch("diambra.arena.engine.interface.DiambraEngine.reset", diambra_engine_mock.mock_reset)
+    mocker.patch("diambra.arena.engine.interface.DiambraEngine.reset_async", diambra_engine_mock.mock_reset_async)
     mocker.patch("diambra.arena.engine.interface.DiambraEngine.step", diambra_engine_mock.mock_step)
-    mocker.patch("diambra.arena.engine.interface.DiambraEngine.close", diambra_engine_mock.mock_close)
\ No newline at end of file
+    mocker.patch("diambra.arena.engine.interface.DiambraEngine.step_async", diambra_engine_mock.mock_step_async)
+    mocker.patch("diambra.arena.engine.interface.DiambraEngine.step_repeat", diambra_engine_mock.mock_step_repeat)
+    if batched_step is True:
+        mocker.patch("diambra.arena.engine.interface.DiambraEngine.step_batch", diambra_engine_mock.mock_step_batch)
+    mocker.patch("diambra.arena.engine.interface.DiambraEngine.close", diambra_engine_mock.mock_close)
+
+    return diambra_engine_mock
+
+# Patch DiambraEngine with a DiambraEngineVectorizedMock, engines are assigned consecutive environment slots
+def load_vectorized_mocker(mocker, n_envs=1, **kwargs):
+    diambra_engine_mock = DiambraEngineVectorizedMock(n_envs, **kwargs)
+
+    # Plain functions, bound to each engine instance, so the mock knows which environment is addressed
+    def _engine_method(mock_method):
+        return lambda engine, *args, **kwargs: mock_method(engine, *args, **kwargs)
+
+    mocker.patch("diambra.arena.engine.interface.DiambraEngine.__init__", _engine_method(diambra_engine_mock.mock__init__))
+    mocker.patch("diambra.arena.engine.interface.DiambraEngine.env_init", _engine_method(diambra_engine_mock.mock_env_init))
+    mocker.patch("diambra.arena.engine.interface.DiambraEngine.reset", _engine_method(diambra_engine_mock.mock_reset))
+    mocker.patch("diambra.arena.engine.interface.DiambraEngine.reset_async", _engine_method(diambra_engine_mock.mock_reset_async))
+    mocker.patch("diambra.arena.engine.interface.DiambraEngine.step", _engine_method(diambra_engine_mock.mock_step))
+    mocker.patch("diambra.arena.engine.interface.DiambraEngine.step_async", _engine_method(diambra_engine_mock.mock_step_async))
+    mocker.patch("diambra.arena.engine.interface.DiambraEngine.close", _engine_method(diambra_engine_mock.mock_close))
+    mocker.patch("diambra.arena.engine.interface.DiambraEngine.step_batch", diambra_engine_mock.mock_step_batch)
+
+    return diambra_engine_mock
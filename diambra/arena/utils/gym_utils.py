@@ -1,25 +1,166 @@
 import gymnasium as gym
 import os
+import atexit
 import pickle
 import bz2
 import json
-from threading import Thread
+from threading import Thread, Lock
+from queue import Queue
 import hashlib
+from collections.abc import Mapping
+from dataclasses import dataclass
+from typing import Tuple
 
 # Save compressed pickle files in parallel
 class ParallelPickleWriter(Thread):  # def class type thread
-    def __init__(self, save_path, to_save):
+    def __init__(self, save_path, to_save, summary=None):
         Thread.__init__(self)   # thread init class (don't forget this)
 
         self.save_path = save_path
         self.to_save = to_save
+        self.summary = summary
 
     def run(self):      # run is a default Thread function
         outfile = bz2.BZ2File(self.save_path, 'w')
         print("Writing RL Trajectory to {} ...".format(self.save_path))
         pickle.dump(self.to_save, outfile)
-        print("... done.")
         outfile.close()
+        if self.summary is not None:
+            # Summary in its own compressed stream, read without decompressing the data (see load_episode_summary)
+            with bz2.BZ2File(self.save_path, 'a') as outfile:
+                pickle.dump(self.summary, outfile)
+        print("... done.")
+
+# Save compressed pickle files streaming objects from a single long lived thread
+# Queued objects are flushed at interpreter exit if the writer is not stopped (unfinished files are removed)
+class StreamingPickleWriter(Thread):
+    def __init__(self, max_queued_items=4):
+        Thread.__init__(self, daemon=True)
+
+        # Bounded queue: producers block when the writer falls behind
+        self.queue = Queue(maxsize=max_queued_items)
+        self.save_path = None
+        self.outfile = None
+
+    def start(self):
+        Thread.start(self)
+        atexit.register(self._stop_at_exit)
+
+    # Start a new file, closing the previous one if still open
+    def open(self, save_path):
+        self.queue.put(("open", save_path))
+
+    # Append an object to the current file, in a new compressed stream if new_stream is True
+    def write(self, to_save, new_stream=False):
+        self.queue.put(("stream" if new_stream is True else "write", to_save))
+
+    # Close the current file, removing it if discard is True
+    def close_file(self, discard=False):
+        self.queue.put(("close", discard))
+
+    # Close the current file and terminate the thread
+    def stop(self, discard=False):
+        atexit.unregister(self._stop_at_exit)
+        self.close_file(discard)
+        self.queue.put(("stop", None))
+        self.join()
+
+    def run(self):
+        while True:
+            command, payload = self.queue.get()
+            try:
+                if command == "open":
+                    self._close_file(False)
+                    self.save_path = payload
+                    self.outfile = bz2.BZ2File(self.save_path, 'w')
+                    print("Writing RL Trajectory to {} ...".format(self.save_path))
+                elif command == "write":
+                    if self.outfile is not None:
+                        pickle.dump(payload, self.outfile)
+                elif command == "stream":
+                    if self.outfile is not None:
+                        self.outfile.close()
+                        self.outfile = bz2.BZ2File(self.save_path, 'a')
+                        pickle.dump(payload, self.outfile)
+                elif command == "close":
+                    self._close_file(payload)
+                elif command == "stop":
+                    break
+            except Exception as e:
+                # Partial file removed, the following writes of the same file are skipped
+                print("ERROR writing RL Trajectory to {}: {}".format(self.save_path, e))
+                self._discard_file()
+
+    # Queued objects written, a file still open (unfinished) removed
+    def _stop_at_exit(self):
+        if self.is_alive():
+            self.stop(discard=True)
+
+    def _close_file(self, discard):
+        if self.outfile is None:
+            return
+        self.outfile.close()
+        self.outfile = None
+        if discard is True:
+            os.remove(self.save_path)
+        else:
+            print("... done.")
+
+    def _discard_file(self):
+        outfile, self.outfile = self.outfile, None
+        try:
+            if outfile is not None:
+                outfile.close()
+        except Exception:
+            pass
+        if self.save_path is not None and os.path.exists(self.save_path):
+            os.remove(self.save_path)
+
+# Load a recorded episode, either saved in one shot ({"episode_summary", "data"}, older recordings)
+# or as data chunks followed by {"episode_summary"}
+def load_episode(file_path):
+    with bz2.BZ2File(file_path, 'r') as in_file:
+        episode = pickle.load(in_file)
+        if isinstance(episode, dict) and "data" in episode:
+            return episode
+
+        data = []
+        while not (isinstance(episode, dict) and "episode_summary" in episode):
+            data += episode
+            episode = pickle.load(in_file)
+
+    return {"episode_summary": episode["episode_summary"], "data": data}
+
+# Bytes read from the end of a recorded episode file looking for the episode summary stream
+EPISODE_SUMMARY_MAX_BYTES = 1024 * 1024
+# bz2 stream start: "BZh" + block size digit + first block magic
+BZ2_BLOCK_MAGIC = b"1AY&SY"
+
+# Episode summary of a recorded episode. When stored in its own compressed stream at the end of
+# the file (recordings written with a summary stream) only that stream is decompressed,
+# the whole episode is loaded otherwise
+def load_episode_summary(file_path):
+    with open(file_path, "rb") as in_file:
+        in_file.seek(0, os.SEEK_END)
+        in_file.seek(max(0, in_file.tell() - EPISODE_SUMMARY_MAX_BYTES))
+        tail = in_file.read()
+
+    # Last stream first, candidates not decompressing to a summary are skipped
+    start = len(tail)
+    while True:
+        start = tail.rfind(b"BZh", 0, start)
+        if start < 0:
+            break
+        if not (tail[start + 3:start + 4].isdigit() and tail[start + 4:start + 10] == BZ2_BLOCK_MAGIC):
+            continue
+        try:
+            episode = pickle.loads(bz2.decompress(tail[start:]))
+        except Exception:
+            continue
+        if isinstance(episode, dict) and "episode_summary" in episode:
+            return episode["episode_summary"]
+
+    return load_episode(file_path)["episode_summary"]
 
 # Recursive nested dict print
 def nested_dict_obs_space(space, k_list=[], level=0):
@@ -112,12 +253,99 @@ def discrete_to_multi_discrete_action(action, n_move_actions):
 
     return mov_act, att_act
 
+# Read-only nested dict, shared by all game records
+class FrozenDict(Mapping):
+    __slots__ = ("_data",)
+
+    def __init__(self, data):
+        object.__setattr__(self, "_data", dict(data))
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("FrozenDict is read-only")
+
+    def __repr__(self):
+        return "FrozenDict({})".format(self._data)
+
+    def __reduce__(self):
+        return (FrozenDict, (self._data,))
+
+    # Immutable, no need to copy
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return FrozenDict({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+# Game data as defined in integratedGames.json, typed fields for the most used ones,
+# every original key is accessible as a (read-only) mapping: record["rounds_per_stage"]
+@dataclass(frozen=True, eq=False)
+class GameRecord(Mapping):
+    id: str
+    name: str
+    char_list: Tuple[str, ...]
+    frame_shape: Tuple[int, int, int]
+    ram_states: FrozenDict
+    difficulty: Tuple[int, int]
+    outfits: Tuple[int, int]
+    sha256: str
+    data: FrozenDict
+
+    @classmethod
+    def from_json(cls, game_data):
+        data = _freeze(game_data)
+        return cls(id=data["id"], name=data["name"], char_list=data["char_list"], frame_shape=data["frame_shape"],
+                   ram_states=data["ram_states"], difficulty=data["difficulty"], outfits=data["outfits"],
+                   sha256=data["sha256"], data=data)
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def __iter__(self):
+        return iter(self.data)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+_games_registry = None
+_games_registry_lock = Lock()
+
+# Process-wide games registry {game_id: GameRecord}, integratedGames.json is parsed once, on first use
+def games_registry():
+    global _games_registry
+    if _games_registry is None:
+        with _games_registry_lock:
+            if _games_registry is None:
+                base_path = os.path.dirname(os.path.abspath(__file__))
+                with open(os.path.join(base_path, 'integratedGames.json')) as games_file:
+                    games_dict = json.load(games_file)
+                _games_registry = FrozenDict({k: GameRecord.from_json(v) for k, v in games_dict.items()})
+    return _games_registry
+
 # List all available games
 def available_games(print_out=True, details=False):
-    base_path = os.path.dirname(os.path.abspath(__file__))
-    games_file_path = os.path.join(base_path, 'integratedGames.json')
-    games_file = open(games_file_path)
-    games_dict = json.load(games_file)
+    games_dict = games_registry()
 
     if print_out:
         for k, v in games_dict.items():
@@ -138,11 +366,7 @@ def available_games(print_out=True, details=False):
 
 # List sha256 per game
 def game_sha_256(game_id=None):
-
-    base_path = os.path.dirname(os.path.abspath(__file__))
-    games_file_path = os.path.join(base_path, 'integratedGames.json')
-    games_file = open(games_file_path)
-    games_dict = json.load(games_file)
+    games_dict = games_registry()
 
     if game_id is None:
         for k, v in games_dict.items():
@@ -164,11 +388,7 @@ def sha256_checksum(filename, block_size=65536):
 
 
 def check_game_sha_256(path, game_id=None):
-
-    base_path = os.path.dirname(os.path.abspath(__file__))
-    games_file_path = os.path.join(base_path, 'integratedGames.json')
-    games_file = open(games_file_path)
-    games_dict = json.load(games_file)
+    games_dict = games_registry()
 
     file_checksum = sha256_checksum(path)
 
@@ -0,0 +1,88 @@
+import sys
+import os
+import argparse
+import contextlib
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor
+import grpc
+from diambra.engine import model, service
+from diambra.arena.engine.shm_frames import SHM_FRAME_TRANSPORT_METADATA_KEY
+from diambra.arena.utils.engine_mock import DiambraEngineMock
+
+# Local gRPC engine stand-in server, serving DiambraEngineMock game logic over the real engine protocol
+# Usage: python -m diambra.arena.utils.mock_server --port 50051 [--n_servers 4]
+#        DIAMBRA_ENVS="localhost:50051 localhost:50052 ..." python script.py
+class MockEnvServer(service.EnvServerServicer):
+    def __init__(self, fps=0, override_perfect_probability=None):
+        self.engine_mock = DiambraEngineMock(fps=fps, override_perfect_probability=override_perfect_probability)
+        self.lock = Lock()
+        self.server = None
+
+    def EnvInit(self, request, context):
+        metadata = dict(context.invocation_metadata())
+        with self.lock:
+            self.engine_mock.frame_transport = metadata.get(SHM_FRAME_TRANSPORT_METADATA_KEY, "grpc")
+            return self.engine_mock.mock_env_init(request)
+
+    def Reset(self, request, context):
+        with self.lock:
+            return self.engine_mock.mock_reset(request)
+
+    def Step(self, request, context):
+        with self.lock:
+            return self.engine_mock.mock_step([[action.move, action.attack] for action in request.actions])
+
+    def Close(self, request, context):
+        with self.lock:
+            self.engine_mock.mock_close()
+        return model.Empty()
+
+    def Shutdown(self, request, context):
+        with self.lock:
+            self.engine_mock.mock_close()
+        if self.server is not None:
+            self.server.stop(grace=1)
+        return model.Empty()
+
+# Start a mock engine server, port 0 picks a free one; returns the server and its port
+def serve(port=50051, host="localhost", fps=0, override_perfect_probability=None, max_workers=4):
+    server = grpc.server(ThreadPoolExecutor(max_workers=max_workers))
+    servicer = MockEnvServer(fps, override_perfect_probability)
+    servicer.server = server
+    service.add_EnvServerServicer_to_server(servicer, server)
+    bound_port = server.add_insecure_port("{}:{}".format(host, port))
+    if bound_port == 0:
+        raise Exception("Mock engine server failed to bind {}:{}".format(host, port))
+    server.start()
+    return server, bound_port
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="DIAMBRA Arena local mock engine server")
+    parser.add_argument("--port", type=int, default=50051, help="Port of the first server (0 for a free one)")
+    parser.add_argument("--host", type=str, default="localhost", help="Host to bind")
+    parser.add_argument("--n_servers", type=int, default=1, help="Number of servers, on consecutive ports")
+    parser.add_argument("--fps", type=float, default=0, help="Simulated emulator speed (0: no delay)")
+    parser.add_argument("--verbose", action="store_true", help="Print the mock game events")
+    opt = parser.parse_args(args)
+
+    servers = []
+    for idx in range(opt.n_servers):
+        servers.append(serve(opt.port + idx if opt.port != 0 else 0, opt.host, opt.fps))
+
+    # Addresses ready to be exported as DIAMBRA_ENVS
+    print(" ".join(["{}:{}".format(opt.host, port) for _, port in servers]), flush=True)
+
+    with contextlib.ExitStack() as stack:
+        if opt.verbose is False:
+            stack.enter_context(contextlib.redirect_stdout(stack.enter_context(open(os.devnull, "w"))))
+        try:
+            for server, _ in servers:
+                server.wait_for_termination()
+        except KeyboardInterrupt:
+            for server, _ in servers:
+                server.stop(grace=None)
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+import time
+import numpy as np
+import gymnasium as gym
+
+# Rolling per-layer latency statistics
+class LatencyProfiler:
+    def __init__(self, window=1000, report_interval=100):
+        """
+        :param window: (int) number of most recent samples per layer used for percentiles
+        :param report_interval: (int) number of calls between refreshes of the report added to info
+        """
+        self.window = window
+        self.report_interval = report_interval
+        self.samples = {}
+        self.counts = {}
+        self._inner_time = 0.0
+        self._report = {}
+        self._report_calls = 0
+
+    def record(self, layer, seconds):
+        if layer not in self.samples:
+            self.samples[layer] = np.zeros((self.window,), dtype=np.float64)
+            self.counts[layer] = 0
+        self.samples[layer][self.counts[layer] % self.window] = seconds
+        self.counts[layer] += 1
+
+    # {layer: {"p50", "p95", "p99", "mean" (ms), "count"}} over the rolling window
+    def percentiles(self, layer=None):
+        layers = list(self.samples.keys()) if layer is None else [layer]
+        stats = {}
+        for name in layers:
+            samples = self.samples[name][:min(self.counts[name], self.window)] * 1000.0
+            p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+            stats[name] = {"p50": p50, "p95": p95, "p99": p99, "mean": np.mean(samples), "count": self.counts[name]}
+        return stats if layer is None else stats[layer]
+
+    # Percentiles refreshed every report_interval calls, cheap enough to be added to every step info
+    def report(self):
+        if self._report_calls % self.report_interval == 0 or len(self._report) != len(self.samples):
+            self._report = self.percentiles()
+        self._report_calls += 1
+        return self._report
+
+    def reset(self):
+        self.samples = {}
+        self.counts = {}
+        self._report = {}
+        self._report_calls = 0
+
+    # Time every call of func, excluding the time spent in the (timed) inner layers it calls
+    def timed_layer(self, func, layer):
+        def timed_func(*args, **kwargs):
+            outer_inner_time = self._inner_time
+            self._inner_time = 0.0
+            start = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                self.record(layer, elapsed - self._inner_time)
+                self._inner_time = outer_inner_time + elapsed
+            return result
+        return timed_func
+
+# Time the step of every layer of a wrapped environment, without changing the wrappers stack
+def instrument_env_layers(env, profiler):
+    layers = []
+    while True:
+        layers.append(env)
+        if not isinstance(env, gym.Wrapper):
+            break
+        env = env.env
+
+    names = []
+    for layer in reversed(layers):
+        name = type(layer).__name__
+        if name in names:
+            name = "{}_{}".format(name, names.count(name) + 1)
+        names.append(type(layer).__name__)
+        # Instance attribute shadows the class method, instrumented once
+        if "step" not in vars(layer):
+            layer.step = profiler.timed_layer(layer.step, name)
@@ -0,0 +1,159 @@
+import os
+import logging
+import numpy as np
+import gymnasium as gym
+from copy import deepcopy
+from concurrent.futures import ThreadPoolExecutor
+from gymnasium.vector.utils import create_empty_array, iterate
+from diambra.arena.make_env import make
+from diambra.arena import EnvironmentSettings, EnvironmentSettingsMultiAgent, WrappersSettings, RecordingSettings
+from typing import Union, Any, Dict, List
+
+# Recursively write a (nested dict) observation in the idx-th slot of the batched buffer
+def _write_obs(buffer, observation, idx):
+    if isinstance(buffer, dict):
+        for k, v in buffer.items():
+            _write_obs(v, observation[k], idx)
+    else:
+        buffer[idx] = observation
+
+class DiambraVecEnv(gym.vector.VectorEnv):
+    """Diambra batched vectorized environment, steps N engines concurrently in a single process.
+    Follows the gymnasium VectorEnv API (same as gymnasium SyncVectorEnv / AsyncVectorEnv):
+    - reset(seed, options) -> (observations, infos), seed is an int or a list with one seed per env,
+      an int seed is passed to all envs, each one offsetting it by its rank as single environments do
+    - step(actions) -> (observations, rewards, terminations, truncations, infos)
+    - infos is a dict of per env arrays, with a "_<key>" boolean mask telling which envs provided <key>
+    - terminated / truncated envs are automatically reset, the returned observation is the reset one,
+      the last ones are in infos["final_observation"] and infos["final_info"]
+    """
+
+    def __init__(self, game_id: str, env_settings: Union[EnvironmentSettings, EnvironmentSettingsMultiAgent]=EnvironmentSettings(),
+                 wrappers_settings: WrappersSettings=WrappersSettings(), episode_recording_settings: RecordingSettings=RecordingSettings(),
+                 render_mode: str=None, num_envs: int=None, start_index: int=0, env_addresses=["localhost:50051"],
+                 copy: bool=True, log_level=logging.INFO):
+        """
+        Create N environments, one per engine, stepped concurrently from a thread pool.
+        gRPC releases the GIL while waiting for the engine, so the N Step RPCs overlap.
+        :param game_id: (str) the game environment ID
+        :param env_settings: (EnvironmentSettings) parameters for DIAMBRA Arena environments
+        :param wrappers_settings: (WrappersSettings) parameters for environment wrapping function
+        :param episode_recording_settings: (RecordingSettings) parameters for environment recording wrapping function
+        :param num_envs: (int) number of environments, defaults to the number of available addresses
+               (DIAMBRA_ENVS ones if set, env_addresses otherwise) from start_index
+        :param start_index: (int) start rank index
+        :param env_addresses: (list) engines addresses, used when DIAMBRA_ENVS is not set
+        :param copy: (bool) if to return a copy of the batched observation buffer instead of the buffer itself
+        """
+        self.logger = logging.getLogger(__name__)
+
+        # Environment i connects to the address of rank start_index + i (see make)
+        env_addresses_cli = os.getenv("DIAMBRA_ENVS", "").split()
+        available_addresses = env_addresses_cli if len(env_addresses_cli) >= 1 else env_addresses
+        if num_envs is None:
+            num_envs = len(available_addresses) - start_index
+        if num_envs < 1 or start_index < 0 or start_index + num_envs > len(available_addresses):
+            raise Exception("DiambraVecEnv: {} environments from rank {} need {} engine addresses, {} available ({})".format(
+                            num_envs, start_index, start_index + num_envs, len(available_addresses),
+                            "DIAMBRA_ENVS" if len(env_addresses_cli) >= 1 else "env_addresses"))
+        self.copy = copy
+
+        self.envs = []
+        for idx in range(num_envs):
+            self.envs.append(make(game_id, deepcopy(env_settings), deepcopy(wrappers_settings),
+                                  deepcopy(episode_recording_settings), render_mode,
+                                  rank=start_index + idx, env_addresses=env_addresses, log_level=log_level))
+
+        super().__init__(num_envs, self.envs[0].observation_space, self.envs[0].action_space)
+
+        # Preallocated batched buffers
+        self._observations = create_empty_array(self.single_observation_space, n=num_envs, fn=np.zeros)
+        self._rewards = np.zeros((num_envs,), dtype=np.float64)
+        self._terminations = np.zeros((num_envs,), dtype=np.bool_)
+        self._truncations = np.zeros((num_envs,), dtype=np.bool_)
+
+        self._executor = ThreadPoolExecutor(max_workers=num_envs, thread_name_prefix="diambra_vec_env")
+        self._futures = None
+
+    # Reset all environments, without waiting for the results
+    def reset_async(self, seed: Union[int, List[int]] = None, options: Dict[str, Any] = None):
+        if self._futures is not None:
+            raise Exception("DiambraVecEnv: reset_async called while a reset or step is already pending")
+        if seed is None:
+            seed = [None] * self.num_envs
+        elif isinstance(seed, int):
+            seed = [seed] * self.num_envs
+        if len(seed) != self.num_envs:
+            raise Exception("DiambraVecEnv: {} seeds provided for {} environments".format(len(seed), self.num_envs))
+        self._futures = [self._executor.submit(self._reset_env, idx, seed[idx], options) for idx in range(self.num_envs)]
+
+    # Wait for the pending reset of all environments
+    def reset_wait(self, seed: Union[int, List[int]] = None, options: Dict[str, Any] = None):
+        if self._futures is None:
+            raise Exception("DiambraVecEnv: reset_wait called without a pending reset_async")
+        infos = self._collect_infos()
+        self._terminations[:] = False
+        self._truncations[:] = False
+        return self._get_observations(), infos
+
+    # Send actions to all environments, without waiting for the results
+    def step_async(self, actions):
+        if self._futures is not None:
+            raise Exception("DiambraVecEnv: step_async called while a reset or step is already pending")
+        self._futures = [self._executor.submit(self._step_env, idx, action)
+                         for idx, action in enumerate(iterate(self.action_space, actions))]
+
+    # Wait for the pending step of all environments
+    def step_wait(self):
+        if self._futures is None:
+            raise Exception("DiambraVecEnv: step_wait called without a pending step_async")
+        infos = self._collect_infos()
+        return self._get_observations(), np.copy(self._rewards), np.copy(self._terminations), \
+               np.copy(self._truncations), infos
+
+    # Closing all environments
+    def close_extras(self, **kwargs):
+        if self._futures is not None:
+            for future in self._futures:
+                future.result()
+            self._futures = None
+        for env in self.envs:
+            env.close()
+        self._executor.shutdown()
+
+    def _get_observations(self):
+        return deepcopy(self._observations) if self.copy else self._observations
+
+    # Per env infos of the pending futures merged in a dict of arrays
+    def _collect_infos(self):
+        infos = {}
+        for idx, future in enumerate(self._futures):
+            infos = self._add_info(infos, future.result(), idx)
+        self._futures = None
+        return infos
+
+    def _reset_env(self, idx, seed, options):
+        kwargs = {}
+        if seed is not None:
+            kwargs["seed"] = seed
+        if options is not None:
+            kwargs["options"] = dict(options)
+        observation, info = self.envs[idx].reset(**kwargs)
+        _write_obs(self._observations, observation, idx)
+        return info
+
+    def _step_env(self, idx, action):
+        observation, reward, terminated, truncated, info = self.envs[idx].step(action)
+        self._rewards[idx] = reward
+        self._terminations[idx] = terminated
+        self._truncations[idx] = truncated
+
+        # Automatically reset terminated environments, keeping the last observation and info
+        if terminated or truncated:
+            final_observation, final_info = observation, info
+            observation, info = self.envs[idx].reset()
+            info["final_observation"] = final_observation
+            info["final_info"] = final_info
+
+        _write_obs(self._observations, observation, idx)
+        return info
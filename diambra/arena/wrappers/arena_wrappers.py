@@ -3,9 +3,10 @@ import numpy as np
 import gymnasium as gym
 import logging
 from diambra.arena import SpaceTypes, WrappersSettings
-from diambra.arena.wrappers.observation import WarpFrame, GrayscaleFrame, FrameStack, ActionsStack, \
-                                               NormalizeObservation, FlattenFilterDictObs, \
-                                               AddLastActionToObservation, RoleRelativeObservation
+from diambra.arena.utils.profiling import instrument_env_layers
+from diambra.arena.wrappers.observation import WarpFrame, GrayscaleFrame, FramePreprocessing, FrameStack, \
+                                               NormalizeObservation, FlattenFilterDictObs, AddLastActionToObservation, \
+                                               LastActionsStack, RoleRelativeObservation
 
 # Remove attack buttons combinations
 class NoAttackButtonsCombinations(gym.Wrapper):
@@ -53,24 +54,41 @@ class NoopReset(gym.Wrapper):
         gym.Wrapper.__init__(self, env)
         self.no_op_max = no_op_max
         self.override_num_no_ops = None
+        self._step_repeat = _base_step_repeat(env)
 
     def reset(self, **kwargs):
-        self.env.reset(**kwargs)
+        obs, reset_info = self.env.reset(**kwargs)
         if self.override_num_no_ops is not None:
             no_ops = self.override_num_no_ops
         else:
             no_ops = random.randint(1, self.no_op_max + 1)
         assert no_ops > 0
-        obs = None
-        for _ in range(no_ops):
-            obs, _, done, _ = self.env.step(self.unwrapped.get_no_op_action())
-            if done:
-                obs = self.env.reset(**kwargs)
-        return obs
+        if self._step_repeat is not None:
+            obs, _, terminated, truncated, info = self._step_repeat(self.unwrapped.get_no_op_action(), no_ops, stop_on_round_done=False)
+            if terminated or truncated:
+                obs, reset_info = self.env.reset(**kwargs)
+                info = reset_info
+        else:
+            for _ in range(no_ops):
+                obs, _, terminated, truncated, info = self.env.step(self.unwrapped.get_no_op_action())
+                if terminated or truncated:
+                    obs, reset_info = self.env.reset(**kwargs)
+                    info = reset_info
+
+        # Episode settings are only in the reset info
+        if "settings" in reset_info:
+            info["settings"] = reset_info["settings"]
+        return obs, info
 
     def step(self, action):
         return self.env.step(action)
 
+# Repeated steps of the base environment (single decode), when the wrappers in between do not alter its steps
+def _base_step_repeat(env):
+    while isinstance(env, NoopReset):
+        env = env.env
+    return getattr(env, "step_repeat", None) if env is env.unwrapped else None
+
 class StickyActions(gym.Wrapper):
     def __init__(self, env, sticky_actions):
         """
@@ -83,16 +101,20 @@ class StickyActions(gym.Wrapper):
         self.sticky_actions = sticky_actions
         assert self.unwrapped.env_settings.step_ratio == 1, "StickyActions wrapper can be activated only "\
                                                             "when step_ratio is set equal to 1"
+        self._step_repeat = _base_step_repeat(env)
 
     def step(self, action):
+        if self._step_repeat is not None:
+            return self._step_repeat(action, self.sticky_actions)
+
         rew = 0.0
         for _ in range(self.sticky_actions):
-            obs, rew_step, done, info = self.env.step(action)
+            obs, rew_step, terminated, truncated, info = self.env.step(action)
             rew += rew_step
-            if info["round_done"] is True:
+            if info["round_done"] is True or terminated or truncated:
                 break
 
-        return obs, rew, done, info
+        return obs, rew, terminated, truncated, info
 
 class ClipReward(gym.RewardWrapper):
     def __init__(self, env):
@@ -138,6 +160,15 @@ def env_wrapping(env, wrappers_settings: WrappersSettings):
     """
     logger = logging.getLogger(__name__)
 
+    # Frame excluded from the observation: neither decoded by the environment nor processed by the frame wrappers
+    if wrappers_settings.exclude_frame is True:
+        if env is not env.unwrapped:
+            raise Exception("\"exclude_frame\" can be activated only when no other layer consumes the frame (e.g. episode recording)")
+        env.exclude_frame_observation()
+        if wrappers_settings.frame_shape[2] == 1 or wrappers_settings.frame_shape[0] != 0 or wrappers_settings.stack_frames > 1:
+            env.unwrapped.logger.warning("Warning: skipping frame wrappers as the frame is excluded from the observation.")
+    frame_wrappers = wrappers_settings.exclude_frame is False
+
     ### Generic wrappers(s)
     if wrappers_settings.no_op_max > 0:
         env = NoopReset(env, no_op_max=wrappers_settings.no_op_max)
@@ -145,6 +176,9 @@ def env_wrapping(env, wrappers_settings: WrappersSettings):
     if wrappers_settings.repeat_action > 1:
         env = StickyActions(env, sticky_actions=wrappers_settings.repeat_action)
 
+    # Stack fused by the compiled wrappers built on top of it
+    layers_base_env = env
+
     ### Reward wrappers(s)
     if wrappers_settings.normalize_reward is True:
         env = NormalizeReward(env, wrappers_settings.normalization_factor)
@@ -157,16 +191,13 @@ def env_wrapping(env, wrappers_settings: WrappersSettings):
         env = NoAttackButtonsCombinations(env)
 
     ### Observation space wrappers(s)
-    if wrappers_settings.frame_shape[2] == 1:
-        if env.observation_space["frame"].shape[2] == 1:
-            env.unwrapped.logger.warning("Warning: skipping grayscaling as the frame is already single channel.")
-        else:
-            # Greyscaling frame to h x w x 1
-            env = GrayscaleFrame(env)
+    grayscale = frame_wrappers is True and wrappers_settings.frame_shape[2] == 1
+    if grayscale is True and env.observation_space["frame"].shape[2] == 1:
+        env.unwrapped.logger.warning("Warning: skipping grayscaling as the frame is already single channel.")
+        grayscale = False
+    resize = frame_wrappers is True and wrappers_settings.frame_shape[0] != 0 and wrappers_settings.frame_shape[1] != 0
 
-    if wrappers_settings.frame_shape[0] != 0 and wrappers_settings.frame_shape[1] != 0:
-        # Resizing observation from H x W x C to
-        # frame_shape[0] x frame_shape[1] x C
+    if resize is True:
         # Check if frame shape is bigger than native shape
         native_frame_size = env.observation_space["frame"].shape
         if wrappers_settings.frame_shape[0] > native_frame_size[0] or wrappers_settings.frame_shape[1] > native_frame_size[1]:
@@ -177,19 +208,36 @@ def env_wrapping(env, wrappers_settings: WrappersSettings):
             warning_message += " X " + str(wrappers_settings.frame_shape[1]) + "]"
             env.unwrapped.logger.warning(warning_message)
 
-        env = WarpFrame(env, wrappers_settings.frame_shape[:2])
+    if grayscale is True and resize is True:
+        # Greyscaling and resizing observation from H x W x C to frame_shape[0] x frame_shape[1] x 1 in one go,
+        # the output buffer is reused when frames are copied in the frame stack right after
+        # Default: same output of GrayscaleFrame + WarpFrame, an explicit interpolation lets sampling ones resize first
+        interpolation = "linear" if wrappers_settings.frame_interpolation is None else wrappers_settings.frame_interpolation
+        env = FramePreprocessing(env, wrappers_settings.frame_shape, interpolation, reuse_output=wrappers_settings.stack_frames > 1,
+                                 resize_first=wrappers_settings.frame_interpolation is not None)
+    elif grayscale is True:
+        # Greyscaling frame to h x w x 1
+        env = GrayscaleFrame(env)
+    elif resize is True:
+        # Resizing observation from H x W x C to
+        # frame_shape[0] x frame_shape[1] x C
+        if wrappers_settings.frame_interpolation is None:
+            env = WarpFrame(env, wrappers_settings.frame_shape[:2])
+        else:
+            env = FramePreprocessing(env, wrappers_settings.frame_shape, wrappers_settings.frame_interpolation,
+                                     reuse_output=wrappers_settings.stack_frames > 1)
 
     # Stack #frameStack frames together
-    if wrappers_settings.stack_frames > 1:
+    if frame_wrappers is True and wrappers_settings.stack_frames > 1:
         env = FrameStack(env, wrappers_settings.stack_frames, wrappers_settings.dilation)
 
     # Add last action to observation
     if wrappers_settings.add_last_action:
-        env = AddLastActionToObservation(env)
-
-        # Stack #actionsStack actions together
         if wrappers_settings.stack_actions > 1:
-            env = ActionsStack(env, wrappers_settings.stack_actions)
+            # Stack #actionsStack last actions together
+            env = LastActionsStack(env, wrappers_settings.stack_actions)
+        else:
+            env = AddLastActionToObservation(env)
 
     # Scales observations normalizing them between 0.0 and 1.0
     if wrappers_settings.scale is True:
@@ -202,8 +250,18 @@ def env_wrapping(env, wrappers_settings: WrappersSettings):
     if wrappers_settings.flatten is True:
         env = FlattenFilterDictObs(env, wrappers_settings.filter_keys)
 
+    # Single layer running the whole stack step
+    if wrappers_settings.compiled is True:
+        from diambra.arena.wrappers.compiled import CompiledWrappers
+        env = CompiledWrappers(layers_base_env, env)
+
     # Apply all additional wrappers in sequence:
     for wrapper in wrappers_settings.wrappers:
         env = wrapper[0](env, **wrapper[1])
 
+    # Time the step of every layer when latency profiling is enabled
+    profiler = getattr(env.unwrapped, "profiler", None)
+    if profiler is not None:
+        instrument_env_layers(env, profiler)
+
     return env
@@ -0,0 +1,168 @@
+import gymnasium as gym
+from diambra.arena.wrappers.arena_wrappers import NoAttackButtonsCombinations
+from diambra.arena.wrappers.observation import GrayscaleFrame, WarpFrame, FramePreprocessing, FrameStack, \
+                                               AddLastActionToObservation, LastActionsStack, NormalizeObservation, \
+                                               RoleRelativeObservation, FlattenFilterDictObs
+
+# Layers only transforming the frame
+FRAME_LAYERS = (GrayscaleFrame, WarpFrame, FramePreprocessing)
+# Layers producing the final observation from the frame / actions processed one
+OUTPUT_LAYERS = (NormalizeObservation, RoleRelativeObservation, FlattenFilterDictObs)
+
+# Single layer running the step of a stack of wrappers built by env_wrapping
+class CompiledWrappers(gym.Wrapper):
+    def __init__(self, env, layered_env):
+        """
+        Fuse the wrappers between env and layered_env: reward transforms, frame preprocessing and stacking,
+        actions stacking, then normalization, role relative remap and flattening in a single pass.
+        The layered stack provides spaces and per layer buffers, its step chain is never called.
+        :param env: (Gym Environment) the environment the wrappers stack is built on
+        :param layered_env: (Gym Environment) the outermost wrapper of the stack
+        """
+        gym.Wrapper.__init__(self, env)
+        self.layered_env = layered_env
+        self.observation_space = layered_env.observation_space
+        self.action_space = layered_env.action_space
+
+        layers = []
+        layer = layered_env
+        while layer is not env:
+            if not isinstance(layer, gym.Wrapper):
+                raise Exception("Compiled wrappers: {} is not wrapping the given environment".format(type(layered_env).__name__))
+            layers.insert(0, layer)
+            layer = layer.env
+
+        self.reward_funcs = []
+        self.reset_ops = []
+        self.step_ops = []
+        self.output_layers = {}
+        for layer in layers:
+            if isinstance(layer, gym.RewardWrapper):
+                self.reward_funcs.append(layer.reward)
+            elif isinstance(layer, NoAttackButtonsCombinations):
+                continue
+            elif isinstance(layer, OUTPUT_LAYERS):
+                self.output_layers[type(layer)] = layer
+            elif len(self.output_layers) == 0 and isinstance(layer, FRAME_LAYERS + (FrameStack, AddLastActionToObservation, LastActionsStack)):
+                reset_op, step_op = _layer_ops(layer)
+                self.reset_ops.append(reset_op)
+                self.step_ops.append(step_op)
+            else:
+                raise Exception("Compiled wrappers: \"{}\" layer not supported".format(type(layer).__name__))
+
+        # Normalization functions by keys path of the observation before the output layers
+        self.normalization_funcs = {}
+        if NormalizeObservation in self.output_layers:
+            for path, leaves in self.output_layers[NormalizeObservation]._normalization_plan:
+                for k, normalization_func in leaves:
+                    self.normalization_funcs[path + (k,)] = normalization_func
+        self.output_plan = None
+
+    def reset(self, **kwargs):
+        obs, info = self.env.reset(**kwargs)
+        for reset_op in self.reset_ops:
+            obs = reset_op(obs)
+
+        # Role relative keys resolved once per episode
+        if len(self.output_layers) > 0:
+            self.output_plan = self._compile_output_plan(info)
+        return self._get_output(obs), info
+
+    def step(self, action):
+        obs, reward, terminated, truncated, info = self.env.step(action)
+        for reward_func in self.reward_funcs:
+            reward = reward_func(reward)
+
+        new_round = (info["round_done"] or info["stage_done"] or info["game_done"]) and not (terminated or truncated)
+        for step_op in self.step_ops:
+            obs = step_op(obs, action, new_round)
+
+        return self._get_output(obs), reward, terminated, truncated, info
+
+    # Build the output observation, [(output keys path, processed observation keys path, normalization function), ...]
+    def _get_output(self, obs):
+        if self.output_plan is None:
+            return obs
+
+        output = {}
+        for output_path, source_path, normalization_func in self.output_plan:
+            value = obs
+            for k in source_path:
+                value = value[k]
+            if normalization_func is not None:
+                value = normalization_func(value)
+            target_dict = output
+            for k in output_path[:-1]:
+                if k not in target_dict:
+                    target_dict[k] = {}
+                target_dict = target_dict[k]
+            target_dict[output_path[-1]] = value
+
+        return output
+
+    def _compile_output_plan(self, info):
+        # Role relative observation keys path -> processed observation keys path
+        role_paths = {}
+        if RoleRelativeObservation in self.output_layers:
+            for target, role_name, opponent_role_name in self.output_layers[RoleRelativeObservation]._compile_remap_table(info):
+                target_path = () if target is None else (target,)
+                role_paths[target_path + ("own",)] = (role_name,)
+                role_paths[target_path + ("opp",)] = (opponent_role_name,)
+
+        def source_path(path):
+            for length in range(1, len(path)):
+                if path[:length] in role_paths:
+                    return role_paths[path[:length]] + path[length:]
+            return path
+
+        # Output keys path -> role relative observation keys path
+        if FlattenFilterDictObs in self.output_layers:
+            key_paths = [((key,), path) for key, path in self.output_layers[FlattenFilterDictObs].key_paths]
+        else:
+            key_paths = [(path, path) for path in _leaf_paths(self.observation_space)]
+
+        output_plan = []
+        for output_path, path in key_paths:
+            path = source_path(path)
+            output_plan.append((output_path, path, self.normalization_funcs.get(path)))
+
+        return output_plan
+
+# Reset and step operations of a frame / actions processing layer, without its step chain
+def _layer_ops(layer):
+    if isinstance(layer, FRAME_LAYERS):
+        def reset_op(obs):
+            return layer.observation(obs)
+        def step_op(obs, action, new_round):
+            return layer.observation(obs)
+    elif isinstance(layer, FrameStack):
+        def reset_op(obs):
+            layer._fill(obs["frame"])
+            obs["frame"] = layer.get_ob()
+            return obs
+        def step_op(obs, action, new_round):
+            layer._add_frame(obs["frame"], new_round)
+            obs["frame"] = layer.get_ob()
+            return obs
+    elif isinstance(layer, AddLastActionToObservation):
+        def reset_op(obs):
+            return layer._add_last_action_to_obs(obs, layer.unwrapped.get_no_op_action())
+        def step_op(obs, action, new_round):
+            return layer._add_last_action_to_obs(obs, action)
+    else:
+        def reset_op(obs):
+            layer._fill_stack()
+            return layer._process_obs(obs)
+        def step_op(obs, action, new_round):
+            layer._add_to_stack(action, new_round)
+            return layer._process_obs(obs)
+    return reset_op, step_op
+
+def _leaf_paths(observation_space, path=()):
+    paths = []
+    for k, v in observation_space.spaces.items():
+        if isinstance(v, gym.spaces.Dict):
+            paths += _leaf_paths(v, path + (k,))
+        else:
+            paths.append(path + (k,))
+    return paths
@@ -2,7 +2,7 @@ import os
 import numpy as np
 import datetime
 import gymnasium as gym
-from diambra.arena.utils.gym_utils import ParallelPickleWriter
+from diambra.arena.utils.gym_utils import ParallelPickleWriter, StreamingPickleWriter
 from diambra.arena.env_settings import RecordingSettings
 import copy
 import cv2
@@ -23,6 +23,17 @@ class EpisodeRecorder(gym.Wrapper):
 
         self.compression_parameters = [int(cv2.IMWRITE_JPEG_QUALITY), 80]
 
+        # Streaming mode: fixed size chunks are appended to the episode file
+        # by a single long lived writer while the episode runs
+        self.streaming = recording_settings.streaming
+        self.chunk_size = recording_settings.chunk_size
+        self.streaming_writer = None
+        self.n_steps = 0
+        if self.streaming is True:
+            self.streaming_writer = StreamingPickleWriter(recording_settings.max_queued_chunks)
+            self.streaming_writer.start()
+        self._episode_open = False
+
         self.unwrapped.logger.info("Recording trajectories in \"{}\"".format(self.dataset_path))
         os.makedirs(self.dataset_path, exist_ok=True)
 
@@ -32,6 +43,14 @@ class EpisodeRecorder(gym.Wrapper):
         :return: observation
         """
         self.episode_data = []
+        self.n_steps = 0
+
+        if self.streaming is True:
+            # Unfinished episodes are discarded
+            if self._episode_open is True:
+                self.streaming_writer.close_file(discard=True)
+            self.streaming_writer.open(self._get_save_path())
+            self._episode_open = True
 
         obs, info = self.env.reset(**kwargs)
         self._last_obs = copy.deepcopy(obs)
@@ -48,28 +67,54 @@ class EpisodeRecorder(gym.Wrapper):
         """
         obs, reward, terminated, truncated, info = self.env.step(action)
 
+        # Environment settings are stored once, in the episode summary
+        step_info = info
+        if "settings" in info:
+            step_info = {k: v for k, v in info.items() if k != "settings"}
         self.episode_data.append({
             "obs": self._last_obs,
             "action": action,
             "reward": reward,
             "terminated": terminated,
             "truncated": truncated,
-            "info": info})
+            "info": step_info})
+        self.n_steps += 1
         self._last_obs = copy.deepcopy(obs)
         _, self._last_obs["frame"] = cv2.imencode('.jpg', obs["frame"], self.compression_parameters)
 
+        if self.streaming is True and len(self.episode_data) == self.chunk_size:
+            self.streaming_writer.write(self.episode_data)
+            self.episode_data = []
+
         if terminated or truncated:
             to_save = {}
             to_save["episode_summary"] = {
-                "steps": len(self.episode_data),
+                "steps": self.n_steps,
                 "username": self.username,
                 "env_settings": self.env.env_settings.pb_model,
             }
-            to_save["data"] = self.episode_data
 
-            # Save recording file
-            save_path = datetime.datetime.now().strftime('%Y-%m-%d_%H-%M-%S') + ".diambra"
-            pickle_writer = ParallelPickleWriter(os.path.join(self.dataset_path, save_path), to_save)
-            pickle_writer.start()
+            if self.streaming is True:
+                # Streamed file: data chunks followed by the episode summary (in its own compressed stream)
+                if len(self.episode_data) > 0:
+                    self.streaming_writer.write(self.episode_data)
+                    self.episode_data = []
+                self.streaming_writer.write(to_save, new_stream=True)
+                self.streaming_writer.close_file()
+                self._episode_open = False
+            else:
+                # Save recording file: data followed by the episode summary
+                pickle_writer = ParallelPickleWriter(self._get_save_path(), self.episode_data, summary=to_save)
+                pickle_writer.start()
 
         return obs, reward, terminated, truncated, info
+
+    def close(self):
+        if self.streaming_writer is not None:
+            self.streaming_writer.stop(discard=self._episode_open)
+            self.streaming_writer = None
+            self._episode_open = False
+        return self.env.close()
+
+    def _get_save_path(self):
+        return os.path.join(self.dataset_path, datetime.datetime.now().strftime('%Y-%m-%d_%H-%M-%S-%f') + ".diambra")
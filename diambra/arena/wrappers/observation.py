@@ -3,6 +3,7 @@ from copy import deepcopy
 import numpy as np
 from collections import deque
 from collections.abc import Mapping
+from functools import partial
 import cv2  # pytype:disable=import-error
 cv2.ocl.setUseOpenCL(False)
 from diambra.engine import Roles
@@ -56,48 +57,135 @@ class WarpFrame(gym.ObservationWrapper):
         obs["frame"] = cv2.resize(obs["frame"], (self.width, self.height), interpolation=cv2.INTER_LINEAR)[:, :, None]
         return obs
 
+# Resampling methods, by name
+FRAME_INTERPOLATIONS = {
+    "nearest": cv2.INTER_NEAREST,
+    "linear": cv2.INTER_LINEAR,
+    "area": cv2.INTER_AREA,
+    "cubic": cv2.INTER_CUBIC,
+    "lanczos": cv2.INTER_LANCZOS4,
+}
+
+class FramePreprocessing(gym.ObservationWrapper):
+    def __init__(self, env, frame_shape=[84, 84, 1], interpolation="linear", reuse_output=False, resize_first=False):
+        """
+        Grayscale and warp frames to frame_shape resolution in one wrapper, writing in preallocated buffers
+        :param env: (Gym Environment) the environment
+        :param frame_shape: ([int, int, int]) output frame shape, channels 1 for grayscale, 0 to keep them
+        :param interpolation: (str) resampling method (see FRAME_INTERPOLATIONS), "area" gives
+               alias free downscaling at a higher cost than "linear" (WarpFrame one)
+        :param reuse_output: (bool) if to return the same preallocated array at every step
+               (overwritten at the next step) instead of a new one
+        :param resize_first: (bool) if to resize the color frame before grayscaling it with sampling resamplers
+               ("nearest", "linear"), cheaper but rounding may differ by one gray level from GrayscaleFrame + WarpFrame
+        """
+        gym.ObservationWrapper.__init__(self, env)
+        self.unwrapped.logger.warning("Warning: for speedup, avoid frame warping wrappers, use environment's " +
+                           "native frame wrapping through \"frame_shape\" setting (see documentation for details)")
+
+        in_height, in_width, in_channels = self.observation_space.spaces["frame"].shape
+        self.height = frame_shape[0]
+        self.width = frame_shape[1]
+        self.grayscale = frame_shape[2] == 1 and in_channels != 1
+        channels = 1 if frame_shape[2] == 1 else in_channels
+        self.interpolation = FRAME_INTERPOLATIONS[interpolation]
+        self.reuse_output = reuse_output
+        dtype = self.observation_space["frame"].dtype
+        self.observation_space.spaces["frame"] = gym.spaces.Box(low=0, high=255, shape=(self.height, self.width, channels), dtype=dtype)
+
+        # Grayscale then resize by default (same output of GrayscaleFrame + WarpFrame), sampling resamplers
+        # are cheaper on the resized color frame when the order is allowed to change
+        self.resize_first = resize_first is True and self.grayscale is True and \
+                            self.interpolation in [cv2.INTER_NEAREST, cv2.INTER_LINEAR]
+        if self.grayscale is False:
+            self.intermediate = None
+        elif self.resize_first is True:
+            self.intermediate = np.empty((self.height, self.width, in_channels), dtype=dtype)
+        else:
+            self.intermediate = np.empty((in_height, in_width), dtype=dtype)
+        self.output = np.empty((self.height, self.width, channels), dtype=dtype)
+
+    def observation(self, obs):
+        """
+        returns the current observation from a obs
+        :param obs: environment obs
+        :return: the observation
+        """
+        output = self.output if self.reuse_output is True else np.empty_like(self.output)
+        # Single channel output written through its 2D view
+        out = output[:, :, 0] if output.shape[2] == 1 else output
+        frame = obs["frame"]
+        if frame.ndim == 3 and frame.shape[2] == 1:
+            frame = frame[:, :, 0]
+        if self.grayscale is False:
+            cv2.resize(frame, (self.width, self.height), dst=out, interpolation=self.interpolation)
+        elif self.resize_first is True:
+            cv2.resize(frame, (self.width, self.height), dst=self.intermediate, interpolation=self.interpolation)
+            cv2.cvtColor(self.intermediate, cv2.COLOR_RGB2GRAY, dst=out)
+        else:
+            cv2.cvtColor(frame, cv2.COLOR_RGB2GRAY, dst=self.intermediate)
+            cv2.resize(self.intermediate, (self.width, self.height), dst=out, interpolation=self.interpolation)
+        obs["frame"] = output
+        return obs
+
 class FrameStack(gym.Wrapper):
-    def __init__(self, env, n_frames, dilation):
+    def __init__(self, env, n_frames, dilation, reuse_output=False):
         """Stack n_frames last frames with dilation factor.
         :param env: (Gym Environment) the environment
         :param n_frames: (int) the number of frames to stack
         :param dilation: (int) the dilation factor
+        :param reuse_output: (bool) if to return the same preallocated array at every step
+               (overwritten at the next step) instead of a new one
         """
         gym.Wrapper.__init__(self, env)
         self.n_frames = n_frames
         self.dilation = dilation
-        # Keeping all n_frames*dilation in memory,
-        # then extract the subset given by the dilation factor
-        self.frames = deque([], maxlen=n_frames * dilation)
+        self.reuse_output = reuse_output
         shp = self.observation_space["frame"].shape
+        dtype = self.observation_space["frame"].dtype
+        self.frame_shape = shp
+        # Keeping all n_frames*dilation in memory in a circular buffer (H x W x slots x C),
+        # then extract the subset given by the dilation factor
+        self.n_slots = n_frames * dilation
+        self.frames = np.zeros((shp[0], shp[1], self.n_slots, shp[2]), dtype=dtype)
+        self.head = self.n_slots - 1  # Slot of the newest frame
+        # For every head position, slots of the dilated subset from the oldest to the newest frame
+        subset = np.arange(dilation - 1, self.n_slots, dilation)
+        self.slots_table = [(head + 1 + subset) % self.n_slots for head in range(self.n_slots)]
+        self.output = np.zeros((shp[0], shp[1], n_frames, shp[2]), dtype=dtype)
         self.observation_space.spaces["frame"] = gym.spaces.Box(low=0, high=255,
                                                             shape=(shp[0], shp[1], shp[2] * n_frames),
-                                                            dtype=self.observation_space["frame"].dtype)
+                                                            dtype=dtype)
 
     def reset(self, **kwargs):
         obs, info = self.env.reset(**kwargs)
-        for _ in range(self.n_frames * self.dilation):
-            self.frames.append(obs["frame"])
+        self._fill(obs["frame"])
         obs["frame"] = self.get_ob()
         return obs, info
 
     def step(self, action):
         obs, reward, terminated, truncated, info = self.env.step(action)
-        self.frames.append(obs["frame"])
-
-        # Add last obs n_frames - 1 times in case of
-        # new round / stage / continueGame
-        if ((info["round_done"] or info["stage_done"] or info["game_done"]) and not (terminated or truncated)):
-            for _ in range(self.n_frames * self.dilation - 1):
-                self.frames.append(obs["frame"])
-
+        new_round = (info["round_done"] or info["stage_done"] or info["game_done"]) and not (terminated or truncated)
+        self._add_frame(obs["frame"], new_round)
         obs["frame"] = self.get_ob()
         return obs, reward, terminated, truncated, info
 
     def get_ob(self):
-        frames_subset = list(self.frames)[self.dilation - 1::self.dilation]
-        assert len(frames_subset) == self.n_frames
-        return np.concatenate(frames_subset, axis=2)
+        out = self.output if self.reuse_output is True else None
+        frames_subset = np.take(self.frames, self.slots_table[self.head], axis=2, out=out, mode="clip")
+        return frames_subset.reshape(self.frame_shape[0], self.frame_shape[1], self.frame_shape[2] * self.n_frames)
+
+    # Fill the whole buffer with last obs in case of
+    # new round / stage / continueGame
+    def _add_frame(self, frame, new_round):
+        if new_round:
+            self._fill(frame)
+        else:
+            self.head = (self.head + 1) % self.n_slots
+            self.frames[:, :, self.head, :] = frame.reshape(self.frame_shape)
+
+    def _fill(self, frame):
+        self.frames[:] = frame.reshape(self.frame_shape[0], self.frame_shape[1], 1, self.frame_shape[2])
 
 class AddLastActionToObservation(gym.Wrapper):
     def __init__(self, env):
@@ -223,6 +311,95 @@ class ActionsStack(gym.Wrapper):
         for _ in range(self.n_actions_stack):
             self._add_action_to_stack(no_op_action)
 
+class LastActionsStack(gym.Wrapper):
+    def __init__(self, env, n_actions_stack, reuse_output=False):
+        """Add the n_actions_stack last performed actions to the observation, same
+        result of AddLastActionToObservation followed by ActionsStack.
+        :param env: (Gym Environment) the environment
+        :param n_actions_stack: (int) the number of actions to stack
+        :param reuse_output: (bool) if to return views of the history buffer (overwritten
+               at the next step) instead of new arrays
+        """
+        gym.Wrapper.__init__(self, env)
+        self.n_actions_stack = n_actions_stack
+        self.reuse_output = reuse_output
+
+        if self.unwrapped.env_settings.n_players == 1:
+            self.agents = [None]
+            action_spaces = [self.action_space]
+        else:
+            self.agents = ["agent_{}".format(idx) for idx in range(self.unwrapped.env_settings.n_players)]
+            action_spaces = [self.action_space[agent] for agent in self.agents]
+
+        # Per agent history, every action is written twice (rows head and head + n_actions_stack)
+        # so that the last n_actions_stack ones, from the oldest to the newest, are always contiguous
+        self.history = []
+        stacked_spaces = []
+        for action_space in action_spaces:
+            if isinstance(action_space, gym.spaces.MultiDiscrete):
+                action_space_size = list(action_space.nvec)
+            else:
+                action_space_size = [action_space.n]
+            self.history.append(np.zeros((2 * n_actions_stack, len(action_space_size)), dtype=np.int64))
+            stacked_spaces.append(gym.spaces.MultiDiscrete(action_space_size * n_actions_stack))
+        self.head = n_actions_stack - 1
+
+        if self.unwrapped.env_settings.n_players == 1:
+            self.observation_space = gym.spaces.Dict({
+                **self.observation_space.spaces,
+                "action": stacked_spaces[0],
+            })
+        else:
+            for agent, stacked_space in zip(self.agents, stacked_spaces):
+                self.observation_space = gym.spaces.Dict({
+                    **self.observation_space.spaces,
+                    agent: gym.spaces.Dict({"action": stacked_space}),
+                })
+
+    def reset(self, **kwargs):
+        obs, info = self.env.reset(**kwargs)
+        self._fill_stack()
+        return self._process_obs(obs), info
+
+    def step(self, action):
+        obs, reward, terminated, truncated, info = self.env.step(action)
+        new_round = (info["round_done"] or info["stage_done"] or info["game_done"]) and not (terminated or truncated)
+        self._add_to_stack(action, new_round)
+        return self._process_obs(obs), reward, terminated, truncated, info
+
+    # Reset to no-op actions in case of new round / stage / continueGame
+    def _add_to_stack(self, action, new_round):
+        if new_round:
+            self._fill_stack()
+        else:
+            self.head = (self.head + 1) % self.n_actions_stack
+            if self.agents[0] is None:
+                self._add_action(self.history[0], action)
+            else:
+                for agent, history in zip(self.agents, self.history):
+                    self._add_action(history, action[agent])
+
+    def _add_action(self, history, action):
+        history[self.head] = action
+        history[self.head + self.n_actions_stack] = action
+
+    def _fill_stack(self):
+        no_op_action = self.unwrapped.get_no_op_action()
+        for agent, history in zip(self.agents, self.history):
+            history[:] = no_op_action if agent is None else no_op_action[agent]
+        self.head = self.n_actions_stack - 1
+
+    def _process_obs(self, obs):
+        for agent, history in zip(self.agents, self.history):
+            stacked_actions = history[self.head + 1:self.head + 1 + self.n_actions_stack].reshape(-1)
+            if self.reuse_output is False:
+                stacked_actions = stacked_actions.copy()
+            if agent is None:
+                obs["action"] = stacked_actions
+            else:
+                obs[agent] = {"action": stacked_actions}
+        return obs
+
 class NormalizeObservation(gym.ObservationWrapper):
     def __init__(self, env, exclude_image_scaling=False, process_discrete_binary=False):
         gym.ObservationWrapper.__init__(self, env)
@@ -232,9 +409,17 @@ class NormalizeObservation(gym.ObservationWrapper):
 
         self.original_observation_space = deepcopy(self.observation_space)
         self._obs_space_normalization_func(self.observation_space)
+        self._normalization_plan = self._compile_normalization_plan(self.original_observation_space)
 
     def observation(self, observation):
-        return self._obs_normalization_func(observation, self.original_observation_space)
+        for path, leaves in self._normalization_plan:
+            target_dict = observation
+            for k in path:
+                target_dict = target_dict[k]
+            for k, normalization_func in leaves:
+                target_dict[k] = normalization_func(target_dict[k])
+
+        return observation
 
     # Recursive function to modify obs space dict
     # FIXME: this can probably be dropped with gym >= 0.21 and only use the next one, here for SB2 compatibility
@@ -253,35 +438,54 @@ class NormalizeObservation(gym.ObservationWrapper):
                 elif isinstance(v, gym.spaces.Box) and (self.exclude_image_scaling is False or len(v.shape) < 3):
                     obs_dict[k] = gym.spaces.Box(low=0.0, high=1.0, shape=v.shape, dtype=np.float32)
 
-    # Recursive function to modify obs dict
-    def _obs_normalization_func(self, observation, observation_space):
-        # Process all observations
-        for k, v in observation.items():
-            if isinstance(v, dict):
-                self._obs_normalization_func(v, observation_space.spaces[k])
-            else:
-                v_space = observation_space[k]
-                if isinstance(v_space, gym.spaces.MultiDiscrete):
-                    actions_vector = np.zeros((np.sum(v_space.nvec)), dtype=np.uint8)
-                    column_index = 0
-                    for iact in range(v_space.nvec.shape[0]):
-                        actions_vector[column_index + observation[k][iact]] = 1
-                        column_index += v_space.nvec[iact]
-                    observation[k] = actions_vector
-                elif isinstance(v_space, gym.spaces.Discrete) and (v_space.n > 2 or self.process_discrete_binary is True):
-                    var_vector = np.zeros((v_space.n), dtype=np.uint8)
-                    var_vector[observation[k]] = 1
-                    observation[k] = var_vector
-                elif isinstance(v_space, gym.spaces.Box) and (self.exclude_image_scaling is False or len(v_space.shape) < 3):
-                    high_val = np.max(v_space.high)
-                    low_val = np.min(v_space.low)
-                    observation[k] = np.array((observation[k] - low_val) / (high_val - low_val), dtype=np.float32)
+    # Recursive function compiling, once, the normalization to apply to every observation key
+    # [(parent dict keys path, [(key, normalization function), ...]), ...]
+    def _compile_normalization_plan(self, observation_space, path=()):
+        plan = []
+        leaves = []
+        for k, v_space in observation_space.spaces.items():
+            if isinstance(v_space, gym.spaces.Dict):
+                plan += self._compile_normalization_plan(v_space, path + (k,))
+            elif isinstance(v_space, gym.spaces.MultiDiscrete):
+                # Offset of each discrete component in the concatenated one hot vector
+                offsets = np.concatenate([[0], np.cumsum(v_space.nvec)[:-1]]).astype(np.int64)
+                leaves.append((k, partial(_one_hot_multi_discrete, offsets=offsets, size=int(np.sum(v_space.nvec)))))
+            elif isinstance(v_space, gym.spaces.Discrete) and (v_space.n > 2 or self.process_discrete_binary is True):
+                leaves.append((k, partial(_one_hot, size=int(v_space.n))))
+            elif isinstance(v_space, gym.spaces.Box) and (self.exclude_image_scaling is False or len(v_space.shape) < 3):
+                if len(v_space.shape) == 1:
+                    # Per element bounds (e.g. flat RAM states vector)
+                    high_val = v_space.high.astype(np.float32)
+                    low_val = v_space.low.astype(np.float32)
+                else:
+                    high_val = np.float32(np.max(v_space.high))
+                    low_val = np.float32(np.min(v_space.low))
+                leaves.append((k, partial(_scale, low=low_val, value_range=high_val - low_val)))
 
-        return observation
+        if len(leaves) > 0:
+            plan.insert(0, (path, leaves))
+
+        return plan
+
+def _one_hot_multi_discrete(value, offsets, size):
+    actions_vector = np.zeros((size), dtype=np.uint8)
+    actions_vector[offsets + value] = 1
+    return actions_vector
+
+def _one_hot(value, size):
+    var_vector = np.zeros((size), dtype=np.uint8)
+    var_vector[value] = 1
+    return var_vector
+
+def _scale(value, low, value_range):
+    scaled_value = np.subtract(value, low, dtype=np.float32)
+    return np.divide(scaled_value, value_range, out=scaled_value)
 
 class RoleRelativeObservation(gym.Wrapper):
     def __init__(self, env):
         gym.Wrapper.__init__(self, env)
+        assert "P1" in self.observation_space.spaces, "RoleRelativeObservation wrapper can be activated only "\
+                                                      "with \"dict\" RAM states layout"
 
         new_observation_space = {}
         if self.unwrapped.env_settings.n_players == 1:
@@ -298,35 +502,37 @@ class RoleRelativeObservation(gym.Wrapper):
                 new_observation_space["agent_{}".format(idx)]["own"] = self.observation_space["P1"]
                 new_observation_space["agent_{}".format(idx)]["opp"] = self.observation_space["P1"]
 
+        # Keys removed from the observation (P1 / P2 dicts), and targets of the own / opp remap (None: top level)
+        self._removed_keys = tuple(k for k in self.observation_space.spaces.keys() if k not in new_observation_space)
+        if self.unwrapped.env_settings.n_players == 1:
+            self._remap_targets = (None,)
+        else:
+            self._remap_targets = tuple("agent_{}".format(idx) for idx in range(self.unwrapped.env_settings.n_players))
+        self._remap_table = ()
+
         self.observation_space = gym.spaces.Dict(new_observation_space)
 
+    # Own / opponent roles table of the episode, [(remap target, own role name, opponent role name), ...]
+    def _compile_remap_table(self, info):
+        remap_table = []
+        for idx, target in enumerate(self._remap_targets):
+            role_name = Roles.Name(info["settings"].episode_settings.player_settings[idx].role)
+            opponent_role_name = "P2" if role_name == "P1" else "P1"
+            remap_table.append((target, role_name, opponent_role_name))
+        return tuple(remap_table)
+
+    def _process_obs(self, obs):
+        for target, role_name, opponent_role_name in self._remap_table:
+            target_dict = obs if target is None else obs[target]
+            target_dict["own"] = obs[role_name]
+            target_dict["opp"] = obs[opponent_role_name]
+        for k in self._removed_keys:
+            del obs[k]
+        return obs
+
     def reset(self, **kwargs):
         obs, info = self.env.reset(**kwargs)
-        if self.unwrapped.env_settings.n_players == 1:
-            def _process_obs_1p(observation):
-                new_observation = {}
-                role_name = Roles.Name(info["settings"].episode_settings.player_settings[0].role)
-                opponent_role_name = "P2" if role_name == "P1" else "P1"
-                for k, v in observation.items():
-                    if not isinstance(v, dict):
-                        new_observation[k] = v
-                new_observation["own"] = observation[role_name]
-                new_observation["opp"] = observation[opponent_role_name]
-                return new_observation
-            self._process_obs = _process_obs_1p
-        else:
-            def _process_obs_2p(observation):
-                new_observation = {}
-                for k, v in observation.items():
-                    if not isinstance(v, dict) or k.startswith("agent_"):
-                        new_observation[k] = v
-                for idx in range(self.unwrapped.env_settings.n_players):
-                    role_name = Roles.Name(info["settings"].episode_settings.player_settings[idx].role)
-                    opponent_role_name = "P2" if role_name == "P1" else "P1"
-                    new_observation["agent_{}".format(idx)]["own"] = observation[role_name]
-                    new_observation["agent_{}".format(idx)]["opp"] = observation[opponent_role_name]
-                return new_observation
-            self._process_obs = _process_obs_2p
+        self._remap_table = self._compile_remap_table(info)
         return self._process_obs(obs), info
 
     def step(self, action):
@@ -340,10 +546,12 @@ class FlattenFilterDictObs(gym.ObservationWrapper):
         self.filter_keys = filter_keys
         if len(filter_keys) != 0:
             self.filter_keys = list(set(filter_keys))
-            if "frame" not in filter_keys:
+            if "frame" not in filter_keys and "frame" in self.observation_space.spaces:
                 self.filter_keys += ["frame"]
 
         original_obs_space_keys = (flatten_filter_obs_space_func(self.observation_space, [])).keys()
+        # Resolved once: (flattened key, observation keys path) of all selected observations
+        self.key_paths = flatten_filter_obs_space_paths(self.observation_space, self.filter_keys)
         self.observation_space = gym.spaces.Dict(flatten_filter_obs_space_func(self.observation_space, self.filter_keys))
 
         if len(filter_keys) != 0:
@@ -355,7 +563,31 @@ class FlattenFilterDictObs(gym.ObservationWrapper):
                 )
 
     def observation(self, observation):
-        return flatten_filter_obs_func(observation, self.filter_keys)
+        flattened_dict = {}
+        for key, path in self.key_paths:
+            value = observation
+            for k in path:
+                value = value[k]
+            flattened_dict[key] = value
+
+        return flattened_dict
+
+def flatten_filter_obs_space_paths(input_dictionary, filter_keys):
+    key_paths = []
+
+    def visit(subdict, path):
+        for k, v in subdict.spaces.items():
+            new_path = path + (k,)
+            if isinstance(v, gym.spaces.Dict):
+                visit(v, new_path)
+            else:
+                new_key = "_".join(new_path)
+                if len(filter_keys) == 0 or new_key in filter_keys:
+                    key_paths.append((new_key, new_path))
+
+    visit(input_dictionary, ())
+
+    return key_paths
 
 def flatten_filter_obs_space_func(input_dictionary, filter_keys):
     _FLAG_FIRST = object()
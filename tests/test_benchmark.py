@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+import pytest
+import json
+from diambra.arena.utils.benchmark import main, available_cases
+
+# Example Usage:
+# pytest
+# (optional)
+#    module.py (Run specific module)
+#    -s (show output)
+#    -k "expression" (filter tests using case-insensitive with parts of the test name and/or parameters values combined with boolean operators, e.g. "wrappers and doapp")
+
+def func(tmp_path, cases):
+    try:
+        output_path = str(tmp_path / "benchmark.json")
+        assert main(["--steps", "20", "--warmup", "2", "--alloc_steps", "2", "--cases"] + cases + ["--output", output_path]) == 0
+        with open(output_path, "r") as output_file:
+            report = json.load(output_file)
+
+        assert "python" in report["metadata"] and report["metadata"]["steps"] == 20
+        assert len(report["results"]) > 0
+        for name, result in report["results"].items():
+            assert any(name.startswith(case) for case in cases + ["data_loader", "dataset"])
+            assert result["steps_per_second"] > 0
+            assert 0 <= result["latency_ms"]["p50"] <= result["latency_ms"]["p95"] <= result["latency_ms"]["p99"]
+            assert result["alloc_peak_kb_per_step"] >= 0
+
+        # Comparison against a previous run
+        assert main(["--steps", "20", "--warmup", "2", "--alloc_steps", "0", "--cases"] + cases +
+                    ["--output", output_path + ".new", "--compare", output_path]) == 0
+        with open(output_path + ".new", "r") as output_file:
+            assert sorted(json.load(output_file)["comparison"].keys()) == sorted(report["results"].keys())
+
+        print("COMPLETED SUCCESSFULLY!")
+        return 0
+    except Exception as e:
+        print(e)
+        print("ERROR, ABORTED.")
+        return 1
+
+def test_benchmark_cases():
+    cases = available_cases()
+    for n_players in [1, 2]:
+        for prefix in ["raw", "wrapper_frame_stack", "stack_image_agent", "recorder"]:
+            assert "{}_{}p".format(prefix, n_players) in cases
+    assert "data_loading" in cases
+
+@pytest.mark.parametrize("cases", [["raw_1p", "wrapper_noop_reset_2p", "wrapper_sticky_actions_1p"],
+                                   ["stack_filtered_ram_states_2p", "recorder_streaming_1p"],
+                                   ["data_loading"]])
+def test_benchmark(tmp_path, cases):
+    assert func(tmp_path, cases) == 0
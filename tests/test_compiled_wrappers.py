@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+import pytest
+import hashlib
+import numpy as np
+import diambra.arena
+from diambra.arena import SpaceTypes, EnvironmentSettings, EnvironmentSettingsMultiAgent, WrappersSettings
+from diambra.arena.utils.engine_mock import load_mocker
+from diambra.arena.wrappers.compiled import CompiledWrappers
+
+# Example Usage:
+# pytest
+# (optional)
+#    module.py (Run specific module)
+#    -s (show output)
+#    -k "expression" (filter tests using case-insensitive with parts of the test name and/or parameters values combined with boolean operators, e.g. "wrappers and doapp")
+
+wrappers_settings_cases = {
+    "reward": {"normalize_reward": True, "clip_reward": True},
+    "frame": {"frame_shape": (84, 84, 1), "stack_frames": 4, "dilation": 2},
+    "actions": {"no_attack_buttons_combinations": True, "add_last_action": True},
+    "actions_stack": {"add_last_action": True, "stack_actions": 12},
+    "scale": {"frame_shape": (64, 64, 0), "add_last_action": True, "stack_actions": 3, "scale": True,
+              "process_discrete_binary": True},
+    "role_relative": {"add_last_action": True, "role_relative": True},
+    "image_agent": {"normalize_reward": True, "frame_shape": (84, 84, 1), "stack_frames": 4, "add_last_action": True,
+                    "stack_actions": 12, "scale": True, "exclude_image_scaling": True, "role_relative": True, "flatten": True},
+    "filtered": {"frame_shape": (128, 128, 1), "stack_frames": 4, "add_last_action": True, "stack_actions": 12,
+                 "scale": True, "role_relative": True, "flatten": True,
+                 "filter_keys": ["stage", "timer", "own_side", "opp_side", "opp_character", "action"]},
+    "noop_reset": {"no_op_max": 4, "stack_frames": 2, "scale": True, "flatten": True},
+    "ram_states_only": {"exclude_frame": True, "add_last_action": True, "stack_actions": 4, "scale": True, "role_relative": True,
+                        "flatten": True, "filter_keys": ["stage", "timer", "own_health", "opp_side", "action"]},
+}
+
+def run_episode(n_players, action_space, wrappers_kwargs, compiled, mocker):
+    # Fresh engine mock, its game state is carried over across episodes
+    load_mocker(mocker)
+    if n_players == 1:
+        settings = EnvironmentSettings(action_space=action_space)
+    else:
+        settings = EnvironmentSettingsMultiAgent(action_space=(action_space, action_space))
+    settings.splash_screen = False
+    settings.step_ratio = 6
+    # Same seed for both runs from the environment init (seeded with the current time otherwise, changing the mocked episodes)
+    settings.seed = 42
+
+    wrappers_kwargs = dict(wrappers_kwargs)
+    if n_players == 2 and "filter_keys" in wrappers_kwargs:
+        wrappers_kwargs["filter_keys"] = [k if k in ["stage", "timer"] else "agent_0_" + k for k in wrappers_kwargs["filter_keys"]]
+    env = diambra.arena.make("doapp", settings, WrappersSettings(compiled=compiled, **wrappers_kwargs))
+    assert isinstance(env, CompiledWrappers) == compiled
+
+    observation, info = env.reset(seed=42)
+    env.action_space.seed(42)
+    trajectory = [(obs_digest(observation), 0.0, False, False)]
+    terminated = truncated = False
+    while not (terminated or truncated):
+        observation, reward, terminated, truncated, info = env.step(env.action_space.sample())
+        trajectory.append((obs_digest(observation), reward, terminated, truncated))
+    env.close()
+
+    return env, trajectory
+
+# Observation digest (dtype, shape and content hash of each leaf), full frames of long episodes do not fit in memory
+def obs_digest(observation):
+    if isinstance(observation, dict):
+        return {k: obs_digest(v) for k, v in observation.items()}
+    observation = np.ascontiguousarray(observation)
+    return (observation.dtype.str, observation.shape, hashlib.sha1(observation.tobytes()).hexdigest())
+
+def func(n_players, action_space, case, mocker):
+    try:
+        wrappers_kwargs = wrappers_settings_cases[case]
+        reference_env, reference_trajectory = run_episode(n_players, action_space, wrappers_kwargs, False, mocker)
+        compiled_env, compiled_trajectory = run_episode(n_players, action_space, wrappers_kwargs, True, mocker)
+
+        # Same spaces and same trajectory of the layered wrappers stack
+        assert compiled_env.observation_space == reference_env.observation_space
+        assert compiled_env.action_space == reference_env.action_space
+        assert len(compiled_trajectory) == len(reference_trajectory)
+        for step, reference_step in zip(compiled_trajectory, reference_trajectory):
+            assert step == reference_step
+
+        print("COMPLETED SUCCESSFULLY!")
+        return 0
+    except Exception as e:
+        print(e)
+        print("ERROR, ABORTED.")
+        return 1
+
+@pytest.mark.parametrize("n_players", [1, 2])
+@pytest.mark.parametrize("action_space", [SpaceTypes.DISCRETE, SpaceTypes.MULTI_DISCRETE])
+@pytest.mark.parametrize("case", list(wrappers_settings_cases.keys()))
+def test_compiled_wrappers_mock(n_players, action_space, case, mocker):
+    assert func(n_players, action_space, case, mocker) == 0
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+import pytest
+import asyncio
+import numpy as np
+import gymnasium as gym
+import diambra.arena
+from diambra.arena import SpaceTypes, EnvironmentSettings, EnvironmentSettingsMultiAgent, WrappersSettings
+from diambra.engine import model
+from diambra.arena.engine.interface import DiambraEngine, step_many
+from diambra.arena.utils.engine_mock import load_mocker
+from diambra.arena.utils.gym_utils import available_games, discrete_to_multi_discrete_action
+from diambra.arena.engine.shm_frames import is_shm_frame_reference, SHM_FRAME_MAGIC
+
+# Client side step_repeat, before the engine mock patches it
+client_step_repeat = DiambraEngine.step_repeat
+
+# Example Usage:
+# pytest
+# (optional)
+#    module.py (Run specific module)
+#    -s (show output)
+#    -k "expression" (filter tests using case-insensitive with parts of the test name and/or parameters values combined with boolean operators, e.g. "wrappers and doapp")
+
+def make_env(n_players, **kwargs):
+    if n_players == 1:
+        settings = EnvironmentSettings(**kwargs)
+    else:
+        settings = EnvironmentSettingsMultiAgent(**kwargs)
+    settings.splash_screen = False
+    return diambra.arena.make("doapp", settings)
+
+def func_async(n_players, mocker):
+    load_mocker(mocker)
+    try:
+        env = make_env(n_players)
+        env.reset(seed=42)
+        engine = env.unwrapped.arena_engine
+        request = env.unwrapped.env_settings.update_episode_settings({})
+        action_list = [[0, 0]] * n_players
+
+        # Future based API
+        future = engine.step_async(action_list)
+        response = future.result()
+        assert isinstance(response, model.StepResetResponse)
+        response = engine.reset_async(request.episode_settings).result()
+        assert isinstance(response, model.StepResetResponse)
+
+        # Asyncio based API
+        async def _run():
+            responses = await asyncio.gather(engine.step_aio(action_list), engine.step_aio(action_list))
+            responses.append(await engine.reset_aio(request.episode_settings))
+            return responses
+
+        for response in asyncio.run(_run()):
+            assert isinstance(response, model.StepResetResponse)
+
+        env.close()
+
+        print("COMPLETED SUCCESSFULLY!")
+        return 0
+    except Exception as e:
+        print(e)
+        print("ERROR, ABORTED.")
+        return 1
+
+@pytest.mark.parametrize("n_players", [1, 2])
+def test_engine_async_mock(n_players, mocker):
+    assert func_async(n_players, mocker) == 0
+
+def func_frame_transport(n_players, frame_transport, frame_shape, max_cached_frames_bytes, mocker):
+    engine_mock = load_mocker(mocker, max_cached_frames_bytes=max_cached_frames_bytes)
+    try:
+        env = make_env(n_players, frame_transport=frame_transport, frame_shape=frame_shape)
+        rounds_per_stage = available_games(False)["doapp"]["rounds_per_stage"]
+
+        # Mock frames are filled with (stage * rounds_per_stage + timer) % 255
+        def check_frame(observation):
+            assert observation["frame"].dtype == np.uint8
+            assert env.observation_space["frame"].contains(observation["frame"])
+            expected_value = np.array((observation["stage"][0] * rounds_per_stage + observation["timer"][0]) % 255, dtype=np.int8).view(np.uint8)
+            assert np.all(observation["frame"] == expected_value)
+
+        observation, info = env.reset(seed=42)
+        check_frame(observation)
+        terminated = truncated = False
+        while not (terminated or truncated):
+            observation, reward, terminated, truncated, info = env.step(env.unwrapped.get_no_op_action())
+            check_frame(observation)
+
+        # Uniform frames built once per value, within the cache size
+        frame_bytes = env.unwrapped._frame_size
+        assert 0 < len(engine_mock._frames_cache) * frame_bytes <= max_cached_frames_bytes or \
+               (len(engine_mock._frames_cache) == 0 and max_cached_frames_bytes < frame_bytes)
+
+        response = env.unwrapped.arena_engine.step([[0, 0]] * n_players)
+        assert is_shm_frame_reference(response.observation.frame, env.unwrapped._frame_size) == (frame_transport == "shm")
+
+        # Raw frame (engine falling back from shared memory) starting with the reference magic bytes
+        raw_response = model.StepResetResponse()
+        raw_frame = np.random.default_rng(42).integers(0, 256, size=env.unwrapped._frame_size, dtype=np.uint8)
+        raw_frame[:len(SHM_FRAME_MAGIC)] = np.frombuffer(SHM_FRAME_MAGIC, dtype=np.uint8)
+        raw_response.observation.frame = raw_frame.tobytes()
+        assert is_shm_frame_reference(raw_response.observation.frame, env.unwrapped._frame_size) is False
+        assert np.array_equal(env.unwrapped._get_frame(raw_response).reshape(-1), raw_frame)
+        env.close()
+
+        print("COMPLETED SUCCESSFULLY!")
+        return 0
+    except Exception as e:
+        print(e)
+        print("ERROR, ABORTED.")
+        return 1
+
+@pytest.mark.parametrize("n_players", [1, 2])
+@pytest.mark.parametrize("frame_transport", ["grpc", "shm"])
+@pytest.mark.parametrize("frame_shape", [(0, 0, 0), (84, 84, 1)])
+@pytest.mark.parametrize("max_cached_frames_bytes", [0, 64*1024*1024])
+def test_engine_frame_transport_mock(n_players, frame_transport, frame_shape, max_cached_frames_bytes, mocker):
+    assert func_frame_transport(n_players, frame_transport, frame_shape, max_cached_frames_bytes, mocker) == 0
+
+def func_step_many(n_players, batched_step, mocker):
+    load_mocker(mocker, batched_step=batched_step)
+    try:
+        envs = [make_env(n_players) for _ in range(3)]
+        for env in envs:
+            env.reset(seed=42)
+        engines = [env.unwrapped.arena_engine for env in envs]
+        assert (engines[0].step_batch is not None) == batched_step
+
+        for _ in range(10):
+            responses = step_many(engines, [[[0, 0]] * n_players for _ in engines])
+            assert len(responses) == len(engines)
+            for response in responses:
+                assert isinstance(response, model.StepResetResponse)
+
+        try:
+            step_many(engines, [[[0, 0]] * n_players])
+            raise RuntimeError("Mismatching lengths not detected")
+        except Exception as e:
+            assert "action lists" in str(e)
+
+        for env in envs:
+            env.close()
+
+        print("COMPLETED SUCCESSFULLY!")
+        return 0
+    except Exception as e:
+        print(e)
+        print("ERROR, ABORTED.")
+        return 1
+
+@pytest.mark.parametrize("n_players", [1, 2])
+@pytest.mark.parametrize("batched_step", [False, True])
+def test_engine_step_many_mock(n_players, batched_step, mocker):
+    assert func_step_many(n_players, batched_step, mocker) == 0
+
+def func_actions_encoding(n_players, action_space, mocker):
+    load_mocker(mocker)
+    try:
+        if n_players == 1:
+            env = make_env(n_players, action_space=action_space)
+        else:
+            env = make_env(n_players, action_space=(action_space, SpaceTypes.MULTI_DISCRETE))
+        env.reset(seed=42)
+        engine_step = mocker.spy(env.unwrapped.arena_engine, "step")
+
+        for _ in range(50):
+            actions = env.action_space.sample()
+            env.step(actions)
+            action_list = engine_step.call_args[0][0]
+            assert len(action_list) == n_players
+            # Agents mapped to players in order, regardless of the actions dict order
+            agents_actions = [actions] if n_players == 1 else [actions["agent_{}".format(idx)] for idx in range(n_players)]
+            for idx, action in enumerate(agents_actions):
+                if isinstance(env.action_space if n_players == 1 else env.action_space["agent_{}".format(idx)], gym.spaces.Discrete):
+                    action = discrete_to_multi_discrete_action(action, env.unwrapped.n_actions[0])
+                assert list(action_list[idx]) == list(action)
+            if n_players == 2:
+                env.step(dict(reversed(list(actions.items()))))
+                assert [list(action) for action in engine_step.call_args[0][0]] == [list(action) for action in action_list]
+        env.close()
+
+        print("COMPLETED SUCCESSFULLY!")
+        return 0
+    except Exception as e:
+        print(e)
+        print("ERROR, ABORTED.")
+        return 1
+
+@pytest.mark.parametrize("n_players", [1, 2])
+@pytest.mark.parametrize("action_space", [SpaceTypes.DISCRETE, SpaceTypes.MULTI_DISCRETE])
+def test_engine_actions_encoding_mock(n_players, action_space, mocker):
+    assert func_actions_encoding(n_players, action_space, mocker) == 0
+
+def func_info(n_players, mocker):
+    load_mocker(mocker)
+    try:
+        env = make_env(n_players)
+        observation, info = env.reset(seed=42)
+        assert info["settings"] is env.unwrapped.env_settings.pb_model
+        game_states = [model.GameStates.Name(value) for value in model.GameStates.values()]
+        assert all(k in info for k in game_states)
+
+        terminated = False
+        while not terminated:
+            observation, reward, terminated, truncated, info = env.step(env.get_no_op_action())
+            assert all(k in info for k in game_states)
+            # Environment settings only at episode boundaries
+            assert ("settings" in info) == terminated
+        env.close()
+
+        print("COMPLETED SUCCESSFULLY!")
+        return 0
+    except Exception as e:
+        print(e)
+        print("ERROR, ABORTED.")
+        return 1
+
+@pytest.mark.parametrize("n_players", [1, 2])
+def test_engine_info_mock(n_players, mocker):
+    assert func_info(n_players, mocker) == 0
+
+def run_sticky_actions(n_players, repeat_action, step_repeat, mocker):
+    # Fresh zero delay engine mock, same seed from the environment init for all runs
+    load_mocker(mocker, fps=0)
+    if step_repeat == "client":
+        mocker.patch("diambra.arena.engine.interface.DiambraEngine.step_repeat", client_step_repeat)
+    if n_players == 1:
+        settings = EnvironmentSettings()
+    else:
+        settings = EnvironmentSettingsMultiAgent()
+    settings.splash_screen = False
+    settings.step_ratio = 1
+    settings.seed = 42
+    env = diambra.arena.make("doapp", settings, WrappersSettings(no_op_max=4, repeat_action=repeat_action))
+    layer = env
+    while layer is not env.unwrapped:
+        if step_repeat is None:
+            # Wrappers loop of single steps
+            layer._step_repeat = None
+        else:
+            assert layer._step_repeat is not None
+        layer = layer.env
+    engine_step = mocker.spy(env.unwrapped.arena_engine, "step")
+
+    trajectory = []
+    env.action_space.seed(42)
+    for episode in range(3):
+        observation, info = env.reset(seed=42 + episode)
+        trajectory.append((np.copy(observation["frame"]), observation["P1"]["health"][0], info["settings"].episode_settings.random_seed))
+        for _ in range(100):
+            observation, reward, terminated, truncated, info = env.step(env.action_space.sample())
+            trajectory.append((np.copy(observation["frame"]), observation["P1"]["health"][0], observation["timer"][0],
+                               reward, terminated, truncated, info["round_done"]))
+            if terminated or truncated:
+                break
+    env.close()
+
+    # Engine side repeat: a single engine call per agent step (no sticky actions wrapper with repeat_action = 1)
+    if step_repeat == "engine":
+        assert engine_step.call_count == (0 if repeat_action > 1 else len(trajectory) - 3)
+    else:
+        assert engine_step.call_count > len(trajectory) - 3
+
+    return trajectory
+
+def func_step_repeat(n_players, repeat_action, step_repeat, mocker):
+    try:
+        reference_trajectory = run_sticky_actions(n_players, repeat_action, None, mocker)
+        trajectory = run_sticky_actions(n_players, repeat_action, step_repeat, mocker)
+
+        assert len(trajectory) == len(reference_trajectory)
+        for step, reference_step in zip(trajectory, reference_trajectory):
+            assert np.array_equal(step[0], reference_step[0])
+            assert step[1:] == reference_step[1:]
+
+        print("COMPLETED SUCCESSFULLY!")
+        return 0
+    except Exception as e:
+        print(e)
+        print("ERROR, ABORTED.")
+        return 1
+
+@pytest.mark.parametrize("n_players", [1, 2])
+@pytest.mark.parametrize("repeat_action", [1, 4])
+@pytest.mark.parametrize("step_repeat", ["client", "engine"])
+def test_engine_step_repeat_mock(n_players, repeat_action, step_repeat, mocker):
+    assert func_step_repeat(n_players, repeat_action, step_repeat, mocker) == 0
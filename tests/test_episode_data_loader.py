@@ -1,5 +1,17 @@
 #!/usr/bin/env python3
-from diambra.arena.utils.diambra_data_loader import DiambraDataLoader
+import pytest
+import cv2
+import numpy as np
+import threading
+import sys
+import subprocess
+import diambra.arena
+from diambra.arena import EnvironmentSettings, RecordingSettings
+from diambra.arena.utils.diambra_data_loader import DiambraDataLoader, DiambraDataset, load_episode
+from diambra.arena.utils.columnar_dataset import ColumnarEpisode, convert_dataset, write_columnar_episode
+from diambra.arena.utils.engine_mock import load_mocker
+from diambra.arena.utils.gym_utils import ParallelPickleWriter, StreamingPickleWriter, load_episode_summary
+from diambra.arena.utils import gym_utils, diambra_data_loader
 import os
 from os.path import expanduser
 
@@ -33,3 +45,323 @@ def func():
 def test_episode_data_loader():
     assert func() == 0
 
+def func_recording(dataset_path, streaming, chunk_size, mocker):
+    load_mocker(mocker)
+    try:
+        settings = EnvironmentSettings()
+        settings.splash_screen = False
+        settings.step_ratio = 6
+        settings.frame_shape = (64, 64, 1)
+
+        recording_settings = RecordingSettings()
+        recording_settings.dataset_path = str(dataset_path)
+        recording_settings.username = "test"
+        recording_settings.streaming = streaming
+        recording_settings.chunk_size = chunk_size
+
+        env = diambra.arena.make("doapp", settings, episode_recording_settings=recording_settings)
+        observation, info = env.reset(seed=42)
+        rewards = []
+        terminated = truncated = False
+        while not (terminated or truncated):
+            observation, reward, terminated, truncated, info = env.step(env.unwrapped.get_no_op_action())
+            rewards.append(reward)
+        # Unfinished episodes are not saved
+        env.reset()
+        env.step(env.unwrapped.get_no_op_action())
+        env.close()
+
+        for thread in threading.enumerate():
+            if isinstance(thread, ParallelPickleWriter):
+                thread.join()
+
+        episode_files = os.listdir(dataset_path)
+        assert len(episode_files) == 1
+        episode = load_episode(os.path.join(dataset_path, episode_files[0]))
+        assert episode["episode_summary"]["steps"] == len(rewards)
+        assert [step_data["reward"] for step_data in episode["data"]] == rewards
+        assert episode["data"][-1]["terminated"] is True
+
+        # Summary read from its own stream, without loading the episode
+        load_episode_spy = mocker.spy(gym_utils, "load_episode")
+        assert load_episode_summary(os.path.join(dataset_path, episode_files[0])) == episode["episode_summary"]
+        assert load_episode_spy.call_count == 0
+
+        # Older recordings saved in one shot
+        one_shot_path = os.path.join(str(dataset_path), "one_shot.diambra.old")
+        pickle_writer = ParallelPickleWriter(one_shot_path, episode)
+        pickle_writer.start()
+        pickle_writer.join()
+        assert load_episode_summary(one_shot_path) == episode["episode_summary"]
+        os.remove(one_shot_path)
+
+        data_loader = DiambraDataLoader(str(dataset_path))
+        data_loader.reset()
+        for reward in rewards:
+            observation, action, step_reward, terminated, truncated, info = data_loader.step()
+            assert step_reward == reward
+            assert observation["frame"].shape == (64, 64)
+
+        return 0
+    except Exception as e:
+        print(e)
+        return 1
+
+@pytest.mark.parametrize("streaming", [False, True])
+@pytest.mark.parametrize("chunk_size", [1, 7, 512])
+def test_episode_recording_mock(tmp_path, streaming, chunk_size, mocker):
+    assert func_recording(tmp_path, streaming, chunk_size, mocker) == 0
+
+
+def func_columnar(tmp_path, mocker):
+    load_mocker(mocker)
+    try:
+        dataset_path = os.path.join(str(tmp_path), "recorded")
+        columnar_path = os.path.join(str(tmp_path), "columnar")
+
+        settings = EnvironmentSettings()
+        settings.splash_screen = False
+        settings.step_ratio = 6
+        settings.frame_shape = (64, 64, 1)
+
+        recording_settings = RecordingSettings()
+        recording_settings.dataset_path = dataset_path
+        recording_settings.username = "test"
+
+        env = diambra.arena.make("doapp", settings, episode_recording_settings=recording_settings)
+        env.reset(seed=42)
+        terminated = truncated = False
+        while not (terminated or truncated):
+            observation, reward, terminated, truncated, info = env.step(env.action_space.sample())
+        env.close()
+
+        for thread in threading.enumerate():
+            if isinstance(thread, ParallelPickleWriter):
+                thread.join()
+
+        converted = convert_dataset(dataset_path, columnar_path)
+        assert len(converted) == 1
+        episode = load_episode(os.path.join(dataset_path, os.listdir(dataset_path)[0]))
+        columnar_episode = ColumnarEpisode(converted[0])
+        assert len(columnar_episode) == len(episode["data"])
+        assert columnar_episode.episode_summary == episode["episode_summary"]
+
+        for idx, step_data in enumerate(episode["data"]):
+            columnar_step_data = columnar_episode[idx]
+            for k in ["action", "reward", "terminated", "truncated"]:
+                assert np.array_equal(columnar_step_data[k], step_data[k])
+            for k, v in step_data["obs"].items():
+                assert np.array_equal(columnar_step_data["obs"][k], v)
+            # Environment settings only stored in the episode summary
+            assert "settings" not in step_data["info"] and "settings" not in columnar_step_data["info"]
+            for k, v in step_data["info"].items():
+                assert np.array_equal(columnar_step_data["info"][k], v)
+            assert np.array_equal(columnar_episode.get_frame(idx),
+                                  cv2.imdecode(np.frombuffer(step_data["obs"]["frame"], dtype=np.uint8), cv2.IMREAD_UNCHANGED))
+
+        data_loader = DiambraDataLoader(columnar_path)
+        data_loader.reset()
+        for step_data in episode["data"]:
+            observation, action, reward, terminated, truncated, info = data_loader.step()
+            assert reward == step_data["reward"]
+            assert observation["frame"].shape == (64, 64)
+
+        return 0
+    except Exception as e:
+        print(e)
+        return 1
+
+def test_episode_columnar_mock(tmp_path, mocker):
+    assert func_columnar(tmp_path, mocker) == 0
+
+# Same nested structure and values
+def assert_same_step_data(step_data, reference_step_data):
+    assert isinstance(step_data, dict) == isinstance(reference_step_data, dict)
+    if isinstance(reference_step_data, dict):
+        assert sorted(step_data.keys()) == sorted(reference_step_data.keys())
+        for k, v in reference_step_data.items():
+            assert_same_step_data(step_data[k], v)
+    else:
+        assert np.array_equal(np.asarray(step_data), np.asarray(reference_step_data))
+
+def func_columnar_heterogeneous_steps(tmp_path):
+    try:
+        frame = cv2.imencode(".png", np.zeros((8, 8), dtype=np.uint8))[1]
+        episode_data = []
+        for idx in range(6):
+            step_data = {"obs": {"frame": frame, "stage": np.array([1]), "moves": list(range(idx))},
+                         "action": idx, "reward": float(idx), "terminated": False, "truncated": False,
+                         "info": {"round_done": idx % 2 == 0}}
+            # Key present only from the first steps
+            if idx < 3:
+                step_data["obs"]["P1"] = {"health": np.array([100 - idx])}
+            # Key appearing later
+            if idx >= 4:
+                step_data["info"]["continue"] = idx
+            episode_data.append(step_data)
+
+        columnar_path = write_columnar_episode({"episode_summary": {"n_steps": 6}, "data": episode_data},
+                                               os.path.join(str(tmp_path), "episode.diambrac"))
+        columnar_episode = ColumnarEpisode(columnar_path)
+        assert len(columnar_episode) == len(episode_data)
+        assert sorted(columnar_episode.meta["objects"]) == ["info/continue", "obs/P1/health", "obs/moves"]
+        for idx, step_data in enumerate(episode_data):
+            columnar_step_data = columnar_episode[idx]
+            assert np.array_equal(columnar_step_data["obs"].pop("frame"), frame.reshape(-1))
+            step_data["obs"].pop("frame")
+            assert_same_step_data(columnar_step_data, step_data)
+
+        return 0
+    except Exception as e:
+        print(e)
+        return 1
+
+def test_episode_columnar_heterogeneous_steps(tmp_path):
+    assert func_columnar_heterogeneous_steps(tmp_path) == 0
+
+def func_dataset(tmp_path, columnar, mocker):
+    load_mocker(mocker)
+    try:
+        dataset_path = str(tmp_path)
+
+        settings = EnvironmentSettings()
+        settings.splash_screen = False
+        settings.step_ratio = 6
+        settings.frame_shape = (64, 64, 1)
+
+        recording_settings = RecordingSettings()
+        recording_settings.dataset_path = dataset_path
+        recording_settings.username = "test"
+
+        env = diambra.arena.make("doapp", settings, episode_recording_settings=recording_settings)
+        for _ in range(2):
+            env.reset(seed=42)
+            terminated = truncated = False
+            while not (terminated or truncated):
+                observation, reward, terminated, truncated, info = env.step(env.action_space.sample())
+        env.close()
+
+        for thread in threading.enumerate():
+            if isinstance(thread, ParallelPickleWriter):
+                thread.join()
+
+        if columnar is True:
+            # Default in place conversion: recorded files are kept, each episode is loaded once (as columnar)
+            convert_dataset(dataset_path)
+            assert len([file_name for file_name in os.listdir(dataset_path) if file_name.endswith(".diambra")]) == 2
+
+        # Global index built without loading the episodes
+        load_episode_spy = mocker.spy(diambra_data_loader, "load_episode")
+        dataset = DiambraDataset(dataset_path, num_workers=3, prefetch=2, cache_size=1)
+        assert load_episode_spy.call_count == 0
+        assert len(dataset.episode_files) == 2
+        assert all(file_name.endswith(".diambrac") == columnar for file_name in dataset.episode_files)
+        assert sorted(DiambraDataLoader(dataset_path).episode_files) == dataset.episode_files
+
+        # Sequential reference
+        data_loader = DiambraDataLoader(dataset_path)
+        data_loader.episode_files = dataset.episode_files
+        reference_steps = []
+        for _ in range(len(dataset.episode_files)):
+            data_loader.reset()
+            for _ in range(len(data_loader.episode_data)):
+                observation, action, reward, terminated, truncated, info = data_loader.step()
+                reference_steps.append((np.copy(observation["frame"]), action, reward))
+        assert len(dataset) == len(reference_steps)
+
+        def check_step(step_data, idx):
+            assert np.array_equal(step_data["obs"]["frame"], reference_steps[idx][0])
+            assert np.array_equal(step_data["action"], reference_steps[idx][1])
+            assert step_data["reward"] == reference_steps[idx][2]
+
+        for idx in [0, len(dataset) - 1, len(dataset) // 2, -1]:
+            check_step(dataset[idx], idx % len(dataset))
+
+        indices = [len(dataset) - 1, 0, 5, 5]
+        for step_data, idx in zip(dataset.get_batch(indices), indices):
+            check_step(step_data, idx)
+
+        # Shuffled iteration, reproducible with the same seed, visiting each step once
+        visited = []
+        for batch in dataset.iterate(batch_size=7, shuffle=True, seed=0):
+            assert len(batch) <= 7
+            visited += [step_data["reward"] for step_data in batch]
+        assert sorted(visited) == sorted([reference_step[2] for reference_step in reference_steps])
+        visited_again = [step_data["reward"] for batch in dataset.iterate(batch_size=7, shuffle=True, seed=0) for step_data in batch]
+        assert visited_again == visited
+        assert all([len(batch) == 7 for batch in dataset.iterate(batch_size=7, seed=0, drop_last=True)])
+
+        for idx, step_data in enumerate(dataset):
+            check_step(step_data, idx)
+
+        dataset.close()
+
+        # Concurrent requests of the same episode load it once, shuffled (windowed) iteration loads each episode once
+        dataset = DiambraDataset(dataset_path, num_workers=4, prefetch=2, cache_size=2)
+        load_episode_spy.reset_mock()
+        for step_data, idx in zip(dataset.get_batch(list(range(16))), range(16)):
+            check_step(step_data, idx)
+        assert load_episode_spy.call_count == (0 if columnar else 1)
+        visited = [step_data["reward"] for batch in dataset.iterate(batch_size=7, shuffle=True, seed=1) for step_data in batch]
+        assert sorted(visited) == sorted([reference_step[2] for reference_step in reference_steps])
+        assert load_episode_spy.call_count == (0 if columnar else 2)
+        dataset.close()
+
+        return 0
+    except Exception as e:
+        print(e)
+        return 1
+
+@pytest.mark.parametrize("columnar", [False, True])
+def test_episode_dataset_mock(tmp_path, columnar, mocker):
+    assert func_dataset(tmp_path, columnar, mocker) == 0
+
+# Streaming writer left running at interpreter exit: queued objects flushed, unfinished files removed
+STREAMING_WRITER_EXIT_SCRIPT = """
+import sys
+from diambra.arena.utils.gym_utils import StreamingPickleWriter
+writer = StreamingPickleWriter()
+writer.start()
+writer.open(sys.argv[1])
+for idx in range(20):
+    writer.write([idx] * 1000)
+writer.write({"episode_summary": {"n_steps": 20}})
+writer.close_file()
+writer.open(sys.argv[2])
+writer.write([0] * 1000)
+"""
+
+def func_streaming_writer(tmp_path):
+    try:
+        completed_path = os.path.join(str(tmp_path), "completed.diambra")
+        unfinished_path = os.path.join(str(tmp_path), "unfinished.diambra")
+        subprocess.run([sys.executable, "-c", STREAMING_WRITER_EXIT_SCRIPT, completed_path, unfinished_path], check=True, timeout=60)
+        episode = load_episode(completed_path)
+        assert episode["episode_summary"] == {"n_steps": 20}
+        assert episode["data"] == [idx for idx in range(20) for _ in range(1000)]
+        assert not os.path.exists(unfinished_path)
+
+        # Write error: partial file removed, following writes skipped, next file written
+        failed_path = os.path.join(str(tmp_path), "failed.diambra")
+        next_path = os.path.join(str(tmp_path), "next.diambra")
+        writer = StreamingPickleWriter()
+        writer.start()
+        writer.open(failed_path)
+        writer.write([1, 2, 3])
+        writer.write([lambda: None])
+        writer.write([4, 5, 6])
+        writer.close_file()
+        writer.open(next_path)
+        writer.write([7, 8, 9])
+        writer.write({"episode_summary": {}})
+        writer.stop()
+        assert not os.path.exists(failed_path)
+        assert load_episode(next_path)["data"] == [7, 8, 9]
+
+        return 0
+    except Exception as e:
+        print(e)
+        return 1
+
+def test_streaming_writer(tmp_path):
+    assert func_streaming_writer(tmp_path) == 0
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+import pytest
+import os
+import json
+import pickle
+from copy import deepcopy
+import diambra.arena
+from diambra.arena import EnvironmentSettings
+from diambra.arena.utils.gym_utils import available_games, games_registry
+
+# Example Usage:
+# pytest
+# (optional)
+#    module.py (Run specific module)
+#    -s (show output)
+#    -k "expression" (filter tests using case-insensitive with parts of the test name and/or parameters values combined with boolean operators, e.g. "wrappers and doapp")
+
+def test_games_registry():
+    games_dict = available_games(False)
+
+    # Parsed once and shared
+    assert games_dict is games_registry()
+    assert available_games(False) is games_dict
+
+    games_file_path = os.path.join(os.path.dirname(diambra.arena.utils.gym_utils.__file__), "integratedGames.json")
+    with open(games_file_path) as games_file:
+        games_json = json.load(games_file)
+    assert sorted(games_dict.keys()) == sorted(games_json.keys())
+    for game_id, game_data in games_dict.items():
+        assert game_data.id == game_id
+        assert list(game_data.char_list) == games_json[game_id]["char_list"]
+        assert list(game_data.frame_shape) == games_json[game_id]["frame_shape"]
+        assert game_data["rounds_per_stage"] == games_json[game_id]["rounds_per_stage"]
+        assert list(game_data.ram_states["common"]["timer"]) == games_json[game_id]["ram_states"]["common"]["timer"]
+
+    # Read-only
+    with pytest.raises(TypeError):
+        games_dict["doapp"]["ram_states"]["common"]["timer"] = None
+    with pytest.raises(AttributeError):
+        games_dict["doapp"].char_list.append("New")
+
+    # Settings copies share it, pickling preserves it
+    settings = EnvironmentSettings()
+    settings.games_dict = available_games(False)
+    assert deepcopy(settings).games_dict is games_dict
+    assert pickle.loads(pickle.dumps(settings)).games_dict == games_dict
@@ -28,13 +28,17 @@ def func(settings, mocker):
         return 1
 
 games_dict = available_games(False)
-gym_settings_var_order = ["frame_shape", "step_ratio", "action_space", "difficulty", "continue_game",
+gym_settings_var_order = ["frame_shape", "step_ratio", "action_space", "reuse_obs_arrays", "ram_states_layout", "frame_transport", "profile_latency", "difficulty", "continue_game",
                           "tower", "role", "characters", "super_art", "fighting_style", "ultimate_style", "speed_mode"]
 
 ok_test_parameters = {
     "frame_shape": [(0, 0, 0), (0, 0, 1), (82, 82, 0), (82, 82, 1)],
     "step_ratio": [1, 3, 6],
     "action_space": [SpaceTypes.DISCRETE, SpaceTypes.MULTI_DISCRETE],
+    "reuse_obs_arrays": [False, True],
+    "ram_states_layout": ["dict", "flat"],
+    "frame_transport": ["grpc", "shm"],
+    "profile_latency": [False, True],
     "difficulty": [None, 1, 3],
     "continue_game": [-1.0, 0.0, 0.3],
     "tower": [1, 3, 4],
@@ -51,6 +55,10 @@ ko_test_parameters = {
     "step_ratio": [8],
     "difficulty": [True, 0, "Random"],
     "action_space": ["Random", 12, "discrete", SpaceTypes.BOX],
+    "reuse_obs_arrays": ["True", None],
+    "ram_states_layout": ["nested", None],
+    "frame_transport": ["tcp"],
+    "profile_latency": [None],
     "continue_game": [1.3, "string"],
     "tower": [5],
     "role": [["P1", "P2"], [5, 4], ["P1P2", "Random"], ["Random", "Random"]],
@@ -68,7 +76,7 @@ def pytest_generate_tests(metafunc):
 # Gym
 @pytest.mark.parametrize("game_id", list(games_dict.keys()))
 @pytest.mark.parametrize("n_players", [1, 2])
-def test_gym_settings(game_id, n_players, frame_shape, step_ratio, action_space, difficulty, continue_game,
+def test_gym_settings(game_id, n_players, frame_shape, step_ratio, action_space, reuse_obs_arrays, ram_states_layout, frame_transport, profile_latency, difficulty, continue_game,
                       tower, role, characters, super_art, fighting_style, ultimate_style, speed_mode, expected, mocker):
 
     game_data = games_dict[game_id]
@@ -86,6 +94,10 @@ def test_gym_settings(game_id, n_players, frame_shape, step_ratio, action_space,
     settings.frame_shape = frame_shape
     settings.step_ratio = step_ratio
     settings.action_space = (action_space, action_space)
+    settings.reuse_obs_arrays = reuse_obs_arrays
+    settings.ram_states_layout = ram_states_layout
+    settings.frame_transport = frame_transport
+    settings.profile_latency = profile_latency
     settings.splash_screen = False
 
     settings.difficulty = difficulty
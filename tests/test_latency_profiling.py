@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+import pytest
+import time
+import diambra.arena
+from diambra.arena import EnvironmentSettings, EnvironmentSettingsMultiAgent, WrappersSettings
+from diambra.arena.utils.engine_mock import load_mocker
+
+# Example Usage:
+# pytest
+# (optional)
+#    module.py (Run specific module)
+#    -s (show output)
+#    -k "expression" (filter tests using case-insensitive with parts of the test name and/or parameters values combined with boolean operators, e.g. "wrappers and doapp")
+
+def func(n_players, profile_latency, repeat_action, mocker):
+    load_mocker(mocker)
+    try:
+        if n_players == 1:
+            settings = EnvironmentSettings()
+        else:
+            settings = EnvironmentSettingsMultiAgent()
+        settings.splash_screen = False
+        settings.frame_shape = (64, 64, 1)
+        settings.profile_latency = profile_latency
+        settings.step_ratio = 1
+
+        wrappers_settings = WrappersSettings(repeat_action=repeat_action, stack_frames=4, add_last_action=True,
+                                             stack_actions=6, scale=True, flatten=True)
+        env = diambra.arena.make("doapp", settings, wrappers_settings)
+
+        observation, info = env.reset(seed=42)
+        if profile_latency is True:
+            env.unwrapped.profiler.reset()
+        n_steps = 50
+        elapsed = 0.0
+        for _ in range(n_steps):
+            start = time.perf_counter()
+            observation, reward, terminated, truncated, info = env.step(env.action_space.sample())
+            if terminated or truncated:
+                observation, info = env.reset()
+            elapsed += time.perf_counter() - start
+
+        if profile_latency is False:
+            assert "latency" not in info
+            try:
+                env.unwrapped.latency_percentiles()
+                raise RuntimeError("Latency percentiles returned while profiling is disabled")
+            except Exception as e:
+                assert "not enabled" in str(e)
+        else:
+            stats = env.unwrapped.latency_percentiles()
+            # Sticky actions: a single repeated step of the environment
+            engine_layer = "engine_step" if repeat_action == 1 else "engine_step_repeat"
+            layers = [engine_layer, "decode_obs", "decode_info", type(env.unwrapped).__name__,
+                      "FrameStack", "LastActionsStack", "NormalizeObservation", "FlattenFilterDictObs"]
+            if repeat_action > 1:
+                layers.append("StickyActions")
+            for layer in layers:
+                assert layer in stats, "Missing layer {}".format(layer)
+                assert 0.0 <= stats[layer]["p50"] <= stats[layer]["p95"] <= stats[layer]["p99"]
+            assert stats[engine_layer]["count"] == n_steps
+            assert stats[type(env.unwrapped).__name__]["count"] == n_steps
+            assert stats["FrameStack"]["count"] == n_steps
+            assert engine_layer in info["latency"]
+
+            # Layers times are exclusive: they add up to (at most) the measured steps time
+            profiler = env.unwrapped.profiler
+            recorded = sum(samples[:profiler.counts[layer]].sum() for layer, samples in profiler.samples.items())
+            assert recorded <= elapsed, "Layers times ({}) exceed the steps time ({})".format(recorded, elapsed)
+
+        env.close()
+
+        print("COMPLETED SUCCESSFULLY!")
+        return 0
+    except Exception as e:
+        print(e)
+        print("ERROR, ABORTED.")
+        return 1
+
+@pytest.mark.parametrize("n_players", [1, 2])
+@pytest.mark.parametrize("profile_latency", [False, True])
+@pytest.mark.parametrize("repeat_action", [1, 4])
+def test_latency_profiling_mock(n_players, profile_latency, repeat_action, mocker):
+    assert func(n_players, profile_latency, repeat_action, mocker) == 0
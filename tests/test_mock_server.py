@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+import pytest
+import numpy as np
+import diambra.arena
+from diambra.arena import DiambraVecEnv, EnvironmentSettings, EnvironmentSettingsMultiAgent, WrappersSettings
+from diambra.arena.engine.interface import DiambraEngine, step_many
+from diambra.arena.utils.mock_server import serve
+from diambra.engine import model
+
+# Example Usage:
+# pytest
+# (optional)
+#    module.py (Run specific module)
+#    -s (show output)
+#    -k "expression" (filter tests using case-insensitive with parts of the test name and/or parameters values combined with boolean operators, e.g. "wrappers and doapp")
+
+# Real gRPC client against local mock engine servers, no patching
+def make_settings(n_players, frame_transport="grpc"):
+    if n_players == 1:
+        settings = EnvironmentSettings()
+    else:
+        settings = EnvironmentSettingsMultiAgent()
+    settings.splash_screen = False
+    settings.step_ratio = 6
+    settings.frame_shape = (64, 64, 1)
+    settings.grpc_timeout = 10
+    settings.frame_transport = frame_transport
+    return settings
+
+def func_env(n_players, frame_transport):
+    server, port = serve(port=0)
+    try:
+        env = diambra.arena.make("doapp", make_settings(n_players, frame_transport), WrappersSettings(stack_frames=4),
+                                 env_addresses=["localhost:{}".format(port)])
+        observation, info = env.reset(seed=42)
+        terminated = truncated = False
+        n_steps = 0
+        while not (terminated or truncated):
+            observation, reward, terminated, truncated, info = env.step(env.action_space.sample())
+            assert env.observation_space["frame"].contains(observation["frame"])
+            n_steps += 1
+        assert n_steps > 0
+
+        # Frame references only when shared memory transport is in use
+        response = env.unwrapped.arena_engine.step([[0, 0]] * n_players)
+        assert response.observation.frame.startswith(b"DSHM") == (frame_transport == "shm")
+        env.close()
+
+        print("COMPLETED SUCCESSFULLY!")
+        return 0
+    except Exception as e:
+        print(e)
+        print("ERROR, ABORTED.")
+        return 1
+    finally:
+        server.stop(grace=None)
+
+def func_vec_env(n_players, num_envs):
+    servers = [serve(port=0) for _ in range(num_envs)]
+    try:
+        env_addresses = ["localhost:{}".format(port) for _, port in servers]
+        vec_env = DiambraVecEnv("doapp", make_settings(n_players), WrappersSettings(), num_envs=num_envs, env_addresses=env_addresses)
+        observations, infos = vec_env.reset(seed=42)
+        for _ in range(100):
+            observations, rewards, terminations, truncations, infos = vec_env.step(vec_env.action_space.sample())
+            assert vec_env.observation_space["frame"].contains(observations["frame"])
+
+        # Concurrent Step RPCs fan out, responses in order
+        engines = [env.unwrapped.arena_engine for env in vec_env.envs]
+        responses = step_many(engines, [[[0, 0]] * n_players for _ in engines])
+        assert len(responses) == num_envs
+        for response in responses:
+            assert isinstance(response, model.StepResetResponse)
+        vec_env.close()
+
+        print("COMPLETED SUCCESSFULLY!")
+        return 0
+    except Exception as e:
+        print(e)
+        print("ERROR, ABORTED.")
+        return 1
+    finally:
+        for server, _ in servers:
+            server.stop(grace=None)
+
+def test_mock_server_actions_request():
+    server, port = serve(port=0)
+    engine = DiambraEngine("localhost:{}".format(port), grpc_timeout=10)
+    try:
+        # Reused request message, same encoding of a freshly built one
+        for action_list in [[[1, 2]], [[3, 4], [5, 6]], [[7, 0]], [(np.int64(8), np.int64(1)), [0, 0]]]:
+            expected = model.Actions(actions=[model.Actions.Action(move=int(move), attack=int(attack)) for move, attack in action_list])
+            assert engine._actions_request(action_list).SerializeToString() == expected.SerializeToString()
+    finally:
+        engine.client.channel.close()
+        server.stop(grace=None)
+
+def test_mock_server_shutdown():
+    server, port = serve(port=0)
+    engine = DiambraEngine("localhost:{}".format(port), grpc_timeout=10)
+    engine.client.Shutdown(model.Empty())
+    assert server.wait_for_termination(timeout=10) is False
+    engine.client.channel.close()
+
+@pytest.mark.parametrize("n_players", [1, 2])
+@pytest.mark.parametrize("frame_transport", ["grpc", "shm"])
+def test_mock_server_env(n_players, frame_transport):
+    assert func_env(n_players, frame_transport) == 0
+
+@pytest.mark.parametrize("n_players", [1, 2])
+def test_mock_server_vec_env(n_players):
+    assert func_vec_env(n_players, 3) == 0
@@ -0,0 +1,552 @@
+#!/usr/bin/env python3
+import pytest
+import numpy as np
+import cv2
+import gymnasium as gym
+from collections import deque
+from copy import deepcopy
+import diambra.arena
+from diambra.engine import Roles
+from diambra.arena import SpaceTypes, EnvironmentSettings, EnvironmentSettingsMultiAgent, WrappersSettings
+from diambra.arena.utils.engine_mock import load_mocker
+from diambra.arena.utils.gym_utils import available_games
+from diambra.arena.wrappers.observation import flatten_filter_obs_func, GrayscaleFrame, WarpFrame, FramePreprocessing, FRAME_INTERPOLATIONS, FrameStack, \
+                                             AddLastActionToObservation, ActionsStack, LastActionsStack, NormalizeObservation, \
+                                             RoleRelativeObservation, FlattenFilterDictObs
+
+# Example Usage:
+# pytest
+# (optional)
+#    module.py (Run specific module)
+#    -s (show output)
+#    -k "expression" (filter tests using case-insensitive with parts of the test name and/or parameters values combined with boolean operators, e.g. "wrappers and doapp")
+
+def run_env(game_id, n_players, settings_kwargs, wrappers_settings, n_steps):
+    if n_players == 1:
+        settings = EnvironmentSettings(**settings_kwargs)
+    else:
+        settings = EnvironmentSettingsMultiAgent(**settings_kwargs)
+    settings.splash_screen = False
+    settings.frame_shape = (64, 64, 1)
+
+    env = diambra.arena.make(game_id, settings, wrappers_settings)
+    observations = []
+    observation, info = env.reset(seed=42)
+    observations.append(observation)
+    for _ in range(n_steps):
+        observation, reward, terminated, truncated, info = env.step(env.unwrapped.get_no_op_action())
+        observations.append(observation)
+        if terminated or truncated:
+            break
+    env.close()
+
+    return env, observations
+
+def func_flat_layout(game_id, n_players, mocker):
+    load_mocker(mocker)
+    try:
+        # Same seed for both runs from the environment init (seeded with the current time otherwise, changing the mocked episodes)
+        _, dict_observations = run_env(game_id, n_players, {"seed": 42}, WrappersSettings(), 20)
+        flat_env, flat_observations = run_env(game_id, n_players, {"seed": 42, "ram_states_layout": "flat"}, WrappersSettings(), 20)
+
+        assert len(dict_observations) == len(flat_observations)
+        for dict_observation, flat_observation in zip(dict_observations, flat_observations):
+            assert flat_env.observation_space.contains(flat_observation)
+            flat_dict_observation = flatten_filter_obs_func(dict_observation, [])
+            assert sorted(flat_env.unwrapped.ram_states_index.keys()) == sorted([k for k in flat_dict_observation.keys() if k != "frame"])
+            for k, idx in flat_env.unwrapped.ram_states_index.items():
+                assert flat_observation["ram_states"][idx] == np.squeeze(flat_dict_observation[k])
+            assert np.array_equal(flat_observation["frame"], dict_observation["frame"])
+
+        wrappers_settings = WrappersSettings(stack_frames=2, add_last_action=True, stack_actions=3, scale=True, flatten=True)
+        flat_env, flat_observations = run_env(game_id, n_players, {"ram_states_layout": "flat"}, wrappers_settings, 20)
+        for flat_observation in flat_observations:
+            assert flat_env.observation_space.contains(flat_observation)
+
+        print("COMPLETED SUCCESSFULLY!")
+        return 0
+    except Exception as e:
+        print(e)
+        print("ERROR, ABORTED.")
+        return 1
+
+# Reference frame stacking, keeping the list of frames in a deque
+class FrameStackReference(gym.Wrapper):
+    def __init__(self, env, n_frames, dilation):
+        gym.Wrapper.__init__(self, env)
+        self.n_frames = n_frames
+        self.dilation = dilation
+        self.frames = deque([], maxlen=n_frames * dilation)
+        self.stacked_frames = []
+
+    def reset(self, **kwargs):
+        obs, info = self.env.reset(**kwargs)
+        for _ in range(self.n_frames * self.dilation):
+            self.frames.append(obs["frame"])
+        self.stacked_frames.append(self._get_ob())
+        return obs, info
+
+    def step(self, action):
+        obs, reward, terminated, truncated, info = self.env.step(action)
+        self.frames.append(obs["frame"])
+        if ((info["round_done"] or info["stage_done"] or info["game_done"]) and not (terminated or truncated)):
+            for _ in range(self.n_frames * self.dilation - 1):
+                self.frames.append(obs["frame"])
+        self.stacked_frames.append(self._get_ob())
+        return obs, reward, terminated, truncated, info
+
+    def _get_ob(self):
+        return np.concatenate(list(self.frames)[self.dilation - 1::self.dilation], axis=2)
+
+def func_frame_stack(n_players, n_frames, dilation, reuse_output, mocker):
+    load_mocker(mocker)
+    try:
+        if n_players == 1:
+            settings = EnvironmentSettings()
+        else:
+            settings = EnvironmentSettingsMultiAgent()
+        settings.splash_screen = False
+        settings.frame_shape = (32, 32, 0)
+        settings.step_ratio = 6
+
+        env = diambra.arena.make("doapp", settings)
+        reference_env = FrameStackReference(env, n_frames, dilation)
+        env = FrameStack(reference_env, n_frames, dilation, reuse_output)
+
+        observation, info = env.reset(seed=42)
+        stacked_frames = [np.copy(observation["frame"])]
+        terminated = truncated = False
+        while not (terminated or truncated):
+            observation, reward, terminated, truncated, info = env.step(env.action_space.sample())
+            assert env.observation_space["frame"].contains(observation["frame"])
+            stacked_frames.append(np.copy(observation["frame"]))
+        env.close()
+
+        assert len(stacked_frames) == len(reference_env.stacked_frames)
+        for stacked_frame, reference_stacked_frame in zip(stacked_frames, reference_env.stacked_frames):
+            assert np.array_equal(stacked_frame, reference_stacked_frame)
+
+        print("COMPLETED SUCCESSFULLY!")
+        return 0
+    except Exception as e:
+        print(e)
+        print("ERROR, ABORTED.")
+        return 1
+
+def func_frame_preprocessing(n_players, frame_shape, interpolation, reuse_output, resize_first, mocker):
+    load_mocker(mocker)
+    try:
+        if n_players == 1:
+            settings = EnvironmentSettings()
+        else:
+            settings = EnvironmentSettingsMultiAgent()
+        settings.splash_screen = False
+        settings.step_ratio = 6
+
+        env = diambra.arena.make("doapp", settings)
+        env = FramePreprocessing(env, frame_shape, interpolation, reuse_output, resize_first)
+        assert env.resize_first == (resize_first is True and frame_shape[2] == 1 and interpolation in ["nearest", "linear"])
+
+        observation, info = env.reset(seed=42)
+        outputs = []
+        for _ in range(10):
+            observation, reward, terminated, truncated, info = env.step(env.action_space.sample())
+            raw_frame = env.unwrapped._frame
+            assert env.observation_space["frame"].contains(observation["frame"])
+            assert (observation["frame"] is env.output) == reuse_output
+            outputs.append(observation["frame"])
+
+            # Reference: GrayscaleFrame followed by WarpFrame
+            reference_frame = cv2.cvtColor(raw_frame, cv2.COLOR_RGB2GRAY) if frame_shape[2] == 1 else raw_frame
+            reference_frame = cv2.resize(reference_frame, (frame_shape[1], frame_shape[0]), interpolation=FRAME_INTERPOLATIONS[interpolation])
+            reference_frame = reference_frame.reshape(env.observation_space["frame"].shape)
+            # Sampling resamplers resizing the color frame first, rounding may differ by one gray level
+            tolerance = 1 if env.resize_first is True else 0
+            assert np.max(np.abs(observation["frame"].astype(np.int16) - reference_frame.astype(np.int16))) <= tolerance
+        env.close()
+
+        if reuse_output is False:
+            assert len(set(id(output) for output in outputs)) == len(outputs)
+
+        print("COMPLETED SUCCESSFULLY!")
+        return 0
+    except Exception as e:
+        print(e)
+        print("ERROR, ABORTED.")
+        return 1
+
+def func_frame_preprocessing_wrapping(n_players, frame_interpolation, mocker):
+    load_mocker(mocker)
+    try:
+        if n_players == 1:
+            settings = EnvironmentSettings()
+        else:
+            settings = EnvironmentSettingsMultiAgent()
+        settings.splash_screen = False
+
+        # Grayscale + resize fused by env_wrapping
+        env = diambra.arena.make("doapp", settings, WrappersSettings(frame_shape=(84, 84, 1), frame_interpolation=frame_interpolation))
+        assert isinstance(env, FramePreprocessing)
+        assert env.resize_first == (frame_interpolation is not None)
+        env.reset(seed=42)
+        native_frame_shape = env.unwrapped._frame.shape
+
+        # Reference: GrayscaleFrame followed by WarpFrame
+        grayscale_env = GrayscaleFrame(diambra.arena.make("doapp", deepcopy(settings)))
+        warp_env = WarpFrame(grayscale_env, (84, 84))
+
+        # Random frames, the mocked ones are uniform
+        rng = np.random.default_rng(42)
+        for _ in range(20):
+            frame = rng.integers(0, 256, size=native_frame_shape, dtype=np.uint8)
+            output_frame = env.observation({"frame": frame})["frame"]
+            reference_frame = warp_env.observation(grayscale_env.observation({"frame": frame}))["frame"]
+            assert output_frame.shape == reference_frame.shape and output_frame.dtype == reference_frame.dtype
+            if frame_interpolation is None:
+                assert output_frame.tobytes() == reference_frame.tobytes()
+            else:
+                assert np.max(np.abs(output_frame.astype(np.int16) - reference_frame.astype(np.int16))) <= 1
+        env.close()
+        warp_env.close()
+
+        print("COMPLETED SUCCESSFULLY!")
+        return 0
+    except Exception as e:
+        print(e)
+        print("ERROR, ABORTED.")
+        return 1
+
+# Keeps a copy of the stacked actions computed by AddLastActionToObservation + ActionsStack
+class ActionsStackReference(gym.Wrapper):
+    def __init__(self, env):
+        gym.Wrapper.__init__(self, env)
+        self.stacked_actions = []
+
+    def reset(self, **kwargs):
+        obs, info = self.env.reset(**kwargs)
+        self._store(obs)
+        return obs, info
+
+    def step(self, action):
+        obs, reward, terminated, truncated, info = self.env.step(action)
+        self._store(obs)
+        return obs, reward, terminated, truncated, info
+
+    def _store(self, obs):
+        if self.unwrapped.env_settings.n_players == 1:
+            self.stacked_actions.append([np.copy(obs["action"])])
+        else:
+            self.stacked_actions.append([np.copy(obs["agent_{}".format(idx)]["action"]) for idx in range(self.unwrapped.env_settings.n_players)])
+
+def func_last_actions_stack(n_players, action_space, n_actions_stack, reuse_output, mocker):
+    load_mocker(mocker)
+    try:
+        if n_players == 1:
+            settings = EnvironmentSettings(action_space=action_space)
+        else:
+            settings = EnvironmentSettingsMultiAgent(action_space=(action_space, SpaceTypes.MULTI_DISCRETE))
+        settings.splash_screen = False
+        settings.frame_shape = (32, 32, 1)
+        settings.step_ratio = 6
+
+        env = diambra.arena.make("doapp", settings)
+        reference_env = ActionsStackReference(ActionsStack(AddLastActionToObservation(env), n_actions_stack))
+        env = LastActionsStack(reference_env, n_actions_stack, reuse_output)
+        assert env.observation_space == reference_env.observation_space
+
+        observation, info = env.reset(seed=42)
+        stacked_actions = []
+        terminated = truncated = False
+        while not (terminated or truncated):
+            if n_players == 1:
+                stacked_actions.append([np.copy(observation["action"])])
+            else:
+                stacked_actions.append([np.copy(observation["agent_{}".format(idx)]["action"]) for idx in range(n_players)])
+            for agent_observation, agent_observation_space in ([(observation, env.observation_space)] if n_players == 1 else
+                    [(observation["agent_{}".format(idx)], env.observation_space["agent_{}".format(idx)]) for idx in range(n_players)]):
+                assert agent_observation_space["action"].contains(agent_observation["action"])
+            observation, reward, terminated, truncated, info = env.step(env.action_space.sample())
+        stacked_actions.append([np.copy(observation["action"])] if n_players == 1 else
+                               [np.copy(observation["agent_{}".format(idx)]["action"]) for idx in range(n_players)])
+        env.close()
+
+        assert len(stacked_actions) == len(reference_env.stacked_actions)
+        for agents_stacked_actions, reference_agents_stacked_actions in zip(stacked_actions, reference_env.stacked_actions):
+            for stacked_action, reference_stacked_action in zip(agents_stacked_actions, reference_agents_stacked_actions):
+                assert np.array_equal(stacked_action, reference_stacked_action)
+
+        print("COMPLETED SUCCESSFULLY!")
+        return 0
+    except Exception as e:
+        print(e)
+        print("ERROR, ABORTED.")
+        return 1
+
+# Reference observation normalization, recursing through the observation
+def normalize_obs_reference(observation, observation_space, exclude_image_scaling, process_discrete_binary):
+    for k, v in observation.items():
+        if isinstance(v, dict):
+            normalize_obs_reference(v, observation_space.spaces[k], exclude_image_scaling, process_discrete_binary)
+        else:
+            v_space = observation_space[k]
+            if isinstance(v_space, gym.spaces.MultiDiscrete):
+                actions_vector = np.zeros((np.sum(v_space.nvec)), dtype=np.uint8)
+                column_index = 0
+                for iact in range(v_space.nvec.shape[0]):
+                    actions_vector[column_index + observation[k][iact]] = 1
+                    column_index += v_space.nvec[iact]
+                observation[k] = actions_vector
+            elif isinstance(v_space, gym.spaces.Discrete) and (v_space.n > 2 or process_discrete_binary is True):
+                var_vector = np.zeros((v_space.n), dtype=np.uint8)
+                var_vector[observation[k]] = 1
+                observation[k] = var_vector
+            elif isinstance(v_space, gym.spaces.Box) and (exclude_image_scaling is False or len(v_space.shape) < 3):
+                high_val = v_space.high if len(v_space.shape) == 1 else np.max(v_space.high)
+                low_val = v_space.low if len(v_space.shape) == 1 else np.min(v_space.low)
+                observation[k] = np.array((observation[k] - low_val) / (high_val - low_val), dtype=np.float32)
+
+    return observation
+
+def assert_obs_equal(observation, reference_observation):
+    assert sorted(observation.keys()) == sorted(reference_observation.keys())
+    for k, v in observation.items():
+        if isinstance(v, dict):
+            assert_obs_equal(v, reference_observation[k])
+        else:
+            assert np.asarray(v).dtype == np.asarray(reference_observation[k]).dtype
+            assert np.allclose(v, reference_observation[k], rtol=0.0, atol=1e-6)
+
+def func_normalize(n_players, ram_states_layout, exclude_image_scaling, process_discrete_binary, mocker):
+    load_mocker(mocker)
+    try:
+        if n_players == 1:
+            settings = EnvironmentSettings()
+        else:
+            settings = EnvironmentSettingsMultiAgent()
+        settings.splash_screen = False
+        settings.frame_shape = (32, 32, 1)
+        settings.ram_states_layout = ram_states_layout
+
+        wrappers_settings = WrappersSettings(stack_frames=2, add_last_action=True, stack_actions=4)
+        env = diambra.arena.make("doapp", settings, wrappers_settings)
+        normalized_env = NormalizeObservation(env, exclude_image_scaling, process_discrete_binary)
+
+        observation, info = env.reset(seed=42)
+        for _ in range(20):
+            normalized_observation = normalized_env.observation(deepcopy(observation))
+            assert normalized_env.observation_space.contains(normalized_observation)
+            reference_observation = normalize_obs_reference(deepcopy(observation), normalized_env.original_observation_space,
+                                                            exclude_image_scaling, process_discrete_binary)
+            assert_obs_equal(normalized_observation, reference_observation)
+            observation, reward, terminated, truncated, info = env.step(env.action_space.sample())
+        env.close()
+
+        print("COMPLETED SUCCESSFULLY!")
+        return 0
+    except Exception as e:
+        print(e)
+        print("ERROR, ABORTED.")
+        return 1
+
+# Keeps a copy of the observation before the role relative remap, and the info of the episode reset
+class ObservationReference(gym.Wrapper):
+    def reset(self, **kwargs):
+        obs, info = self.env.reset(**kwargs)
+        self.observation, self.info = deepcopy(obs), info
+        return obs, info
+
+    def step(self, action):
+        obs, reward, terminated, truncated, info = self.env.step(action)
+        self.observation = deepcopy(obs)
+        return obs, reward, terminated, truncated, info
+
+# Reference role relative observation, from the episode roles in info
+def role_relative_obs_reference(observation, info, n_players):
+    new_observation = {}
+    for k, v in observation.items():
+        if not isinstance(v, dict) or (n_players == 2 and k.startswith("agent_")):
+            new_observation[k] = v
+    for idx in range(n_players):
+        target_dict = new_observation if n_players == 1 else new_observation["agent_{}".format(idx)]
+        role_name = Roles.Name(info["settings"].episode_settings.player_settings[idx].role)
+        target_dict["own"] = observation[role_name]
+        target_dict["opp"] = observation["P2" if role_name == "P1" else "P1"]
+    return new_observation
+
+def func_role_relative(n_players, mocker):
+    load_mocker(mocker)
+    try:
+        if n_players == 1:
+            settings = EnvironmentSettings()
+        else:
+            settings = EnvironmentSettingsMultiAgent()
+        settings.splash_screen = False
+        settings.frame_shape = (32, 32, 1)
+
+        env = diambra.arena.make("doapp", settings, WrappersSettings(add_last_action=True, stack_actions=4))
+        reference_env = ObservationReference(env)
+        env = RoleRelativeObservation(reference_env)
+
+        for episode in range(3):
+            observation, info = env.reset(seed=42 + episode)
+            for _ in range(20):
+                assert sorted(observation.keys()) == sorted(env.observation_space.keys())
+                reference_observation = role_relative_obs_reference(reference_env.observation, reference_env.info, n_players)
+                assert_obs_equal(observation, reference_observation)
+                observation, reward, terminated, truncated, info = env.step(env.action_space.sample())
+                if terminated or truncated:
+                    break
+        env.close()
+
+        print("COMPLETED SUCCESSFULLY!")
+        return 0
+    except Exception as e:
+        print(e)
+        print("ERROR, ABORTED.")
+        return 1
+
+def func_flatten_filter(n_players, filter_keys, mocker):
+    load_mocker(mocker)
+    try:
+        if n_players == 1:
+            settings = EnvironmentSettings()
+        else:
+            settings = EnvironmentSettingsMultiAgent()
+        settings.splash_screen = False
+        settings.frame_shape = (32, 32, 1)
+
+        wrappers_settings = WrappersSettings(add_last_action=True, stack_actions=4, scale=True, role_relative=True)
+        env = diambra.arena.make("doapp", settings, wrappers_settings)
+        if n_players == 2:
+            filter_keys = [key if key in ["stage", "timer"] else "agent_0_" + key for key in filter_keys]
+        flattened_env = FlattenFilterDictObs(env, filter_keys)
+
+        observation, info = env.reset(seed=42)
+        for _ in range(20):
+            flattened_observation = flattened_env.observation(observation)
+            assert flattened_env.observation_space.contains(flattened_observation)
+            reference_observation = flatten_filter_obs_func(observation, flattened_env.filter_keys)
+            assert_obs_equal(flattened_observation, reference_observation)
+            observation, reward, terminated, truncated, info = env.step(env.action_space.sample())
+        env.close()
+
+        print("COMPLETED SUCCESSFULLY!")
+        return 0
+    except Exception as e:
+        print(e)
+        print("ERROR, ABORTED.")
+        return 1
+
+def run_exclude_frame(n_players, ram_states_layout, exclude_frame, mocker):
+    # Fresh engine mock, same seed from the environment init for both runs
+    load_mocker(mocker)
+    if n_players == 1:
+        settings = EnvironmentSettings()
+    else:
+        settings = EnvironmentSettingsMultiAgent()
+    settings.splash_screen = False
+    settings.seed = 42
+    settings.step_ratio = 6
+    settings.ram_states_layout = ram_states_layout
+
+    wrappers_kwargs = {"no_op_max": 2, "frame_shape": (84, 84, 1), "stack_frames": 4, "add_last_action": True,
+                       "stack_actions": 4, "scale": True, "exclude_frame": exclude_frame}
+    if ram_states_layout == "dict":
+        filter_keys = ["stage", "timer", "own_health", "opp_health", "action"]
+        if n_players == 2:
+            filter_keys = [key if key in ["stage", "timer"] else "agent_0_" + key for key in filter_keys]
+        wrappers_kwargs.update({"role_relative": True, "flatten": True, "filter_keys": filter_keys})
+    env = diambra.arena.make("doapp", settings, WrappersSettings(**wrappers_kwargs), render_mode="rgb_array")
+    get_frame = mocker.spy(env.unwrapped, "_get_frame")
+
+    trajectory = []
+    observation, info = env.reset(seed=42)
+    env.action_space.seed(42)
+    for _ in range(50):
+        trajectory.append((deepcopy(observation), np.copy(env.render())))
+        observation, reward, terminated, truncated, info = env.step(env.action_space.sample())
+        if terminated or truncated:
+            break
+    env.close()
+
+    # Frames only decoded on render
+    if exclude_frame is True:
+        assert get_frame.call_count == len(trajectory)
+
+    return env, trajectory
+
+def func_exclude_frame(n_players, ram_states_layout, mocker):
+    try:
+        reference_env, reference_trajectory = run_exclude_frame(n_players, ram_states_layout, False, mocker)
+        env, trajectory = run_exclude_frame(n_players, ram_states_layout, True, mocker)
+
+        assert "frame" not in env.observation_space.spaces
+        assert {k: v for k, v in reference_env.observation_space.spaces.items() if k != "frame"} == env.observation_space.spaces
+        assert len(trajectory) == len(reference_trajectory)
+        for (observation, frame), (reference_observation, reference_frame) in zip(trajectory, reference_trajectory):
+            assert "frame" not in observation
+            reference_observation.pop("frame")
+            assert_obs_equal(observation, reference_observation)
+            assert np.array_equal(frame, reference_frame)
+
+        print("COMPLETED SUCCESSFULLY!")
+        return 0
+    except Exception as e:
+        print(e)
+        print("ERROR, ABORTED.")
+        return 1
+
+games_dict = available_games(False)
+
+@pytest.mark.parametrize("game_id", list(games_dict.keys()))
+@pytest.mark.parametrize("n_players", [1, 2])
+def test_flat_ram_states_layout_mock(game_id, n_players, mocker):
+    assert func_flat_layout(game_id, n_players, mocker) == 0
+
+@pytest.mark.parametrize("n_players", [1, 2])
+@pytest.mark.parametrize("n_frames", [1, 4])
+@pytest.mark.parametrize("dilation", [1, 3])
+@pytest.mark.parametrize("reuse_output", [False, True])
+def test_frame_stack_mock(n_players, n_frames, dilation, reuse_output, mocker):
+    assert func_frame_stack(n_players, n_frames, dilation, reuse_output, mocker) == 0
+
+@pytest.mark.parametrize("n_players", [1, 2])
+@pytest.mark.parametrize("frame_shape", [(84, 84, 1), (84, 84, 0), (600, 600, 1)])
+@pytest.mark.parametrize("interpolation", ["nearest", "linear", "area", "cubic"])
+@pytest.mark.parametrize("reuse_output", [False, True])
+@pytest.mark.parametrize("resize_first", [False, True])
+def test_frame_preprocessing_mock(n_players, frame_shape, interpolation, reuse_output, resize_first, mocker):
+    assert func_frame_preprocessing(n_players, frame_shape, interpolation, reuse_output, resize_first, mocker) == 0
+
+@pytest.mark.parametrize("n_players", [1, 2])
+@pytest.mark.parametrize("frame_interpolation", [None, "linear"])
+def test_frame_preprocessing_wrapping_mock(n_players, frame_interpolation, mocker):
+    assert func_frame_preprocessing_wrapping(n_players, frame_interpolation, mocker) == 0
+
+@pytest.mark.parametrize("n_players", [1, 2])
+@pytest.mark.parametrize("action_space", [SpaceTypes.DISCRETE, SpaceTypes.MULTI_DISCRETE])
+@pytest.mark.parametrize("n_actions_stack", [2, 12])
+@pytest.mark.parametrize("reuse_output", [False, True])
+def test_last_actions_stack_mock(n_players, action_space, n_actions_stack, reuse_output, mocker):
+    assert func_last_actions_stack(n_players, action_space, n_actions_stack, reuse_output, mocker) == 0
+
+@pytest.mark.parametrize("n_players", [1, 2])
+@pytest.mark.parametrize("ram_states_layout", ["dict", "flat"])
+@pytest.mark.parametrize("exclude_image_scaling", [False, True])
+@pytest.mark.parametrize("process_discrete_binary", [False, True])
+def test_normalize_observation_mock(n_players, ram_states_layout, exclude_image_scaling, process_discrete_binary, mocker):
+    assert func_normalize(n_players, ram_states_layout, exclude_image_scaling, process_discrete_binary, mocker) == 0
+
+@pytest.mark.parametrize("n_players", [1, 2])
+def test_role_relative_mock(n_players, mocker):
+    assert func_role_relative(n_players, mocker) == 0
+
+@pytest.mark.parametrize("n_players", [1, 2])
+@pytest.mark.parametrize("filter_keys", [[], ["stage", "own_health", "opp_character", "action"]])
+def test_flatten_filter_mock(n_players, filter_keys, mocker):
+    assert func_flatten_filter(n_players, filter_keys, mocker) == 0
+
+@pytest.mark.parametrize("n_players", [1, 2])
+@pytest.mark.parametrize("ram_states_layout", ["dict", "flat"])
+def test_exclude_frame_mock(n_players, ram_states_layout, mocker):
+    assert func_exclude_frame(n_players, ram_states_layout, mocker) == 0
@@ -28,18 +28,22 @@ def func(settings, wrappers_settings, episode_recording_settings, mocker):
         print("ERROR, ABORTED.")
         return 1
 
-episode_recording_settings_var_order = ["username", "dataset_path"]
+episode_recording_settings_var_order = ["username", "dataset_path", "streaming", "chunk_size"]
 games_dict = available_games(False)
 home_dir = expanduser("~")
 
 ok_test_parameters = {
     "username": ["alexpalms", "test"],
     "dataset_path": [os.path.join(home_dir, "DIAMBRA")],
+    "streaming": [False, True],
+    "chunk_size": [1, 512],
 }
 
 ko_test_parameters = {
     "username": [123],
     "dataset_path": [True],
+    "streaming": ["True"],
+    "chunk_size": [0],
 }
 
 def pytest_generate_tests(metafunc):
@@ -51,7 +55,7 @@ def pytest_generate_tests(metafunc):
 @pytest.mark.parametrize("game_id", list(games_dict.keys()))
 @pytest.mark.parametrize("n_players", [1, 2])
 @pytest.mark.parametrize("action_space", [SpaceTypes.DISCRETE, SpaceTypes.MULTI_DISCRETE])
-def test_settings_recording(game_id ,username, dataset_path, n_players, action_space, expected, mocker):
+def test_settings_recording(game_id ,username, dataset_path, streaming, chunk_size, n_players, action_space, expected, mocker):
     # Env settings
     if (n_players == 1):
         settings = EnvironmentSettings()
@@ -76,5 +80,7 @@ def test_settings_recording(game_id ,username, dataset_path, n_players, action_s
     episode_recording_settings = RecordingSettings()
     episode_recording_settings.username = username
     episode_recording_settings.dataset_path = dataset_path
+    episode_recording_settings.streaming = streaming
+    episode_recording_settings.chunk_size = chunk_size
 
     assert func(settings, wrappers_settings, episode_recording_settings, mocker) == expected
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+import pytest
+import os
+import numpy as np
+from diambra.arena import DiambraVecEnv, SpaceTypes, EnvironmentSettings, EnvironmentSettingsMultiAgent, WrappersSettings
+from diambra.arena.utils.engine_mock import load_vectorized_mocker
+
+# Example Usage:
+# pytest
+# (optional)
+#    module.py (Run specific module)
+#    -s (show output)
+#    -k "expression" (filter tests using case-insensitive with parts of the test name and/or parameters values combined with boolean operators, e.g. "wrappers and doapp")
+
+# Same (nested dict) observation, optionally taken from the idx-th slot of a batched one
+def assert_same_observation(observation, reference_observation, idx=None):
+    if isinstance(reference_observation, dict):
+        for k, v in reference_observation.items():
+            assert_same_observation(observation[k], v, idx)
+    else:
+        assert np.array_equal(observation if idx is None else observation[idx], reference_observation)
+
+def func(n_players, action_space, wrappers_settings, num_envs, mocker):
+    try:
+        # One independent engine mock slot per environment
+        engine_mock = load_vectorized_mocker(mocker, n_envs=num_envs)
+        if n_players == 1:
+            settings = EnvironmentSettings()
+            settings.action_space = action_space
+        else:
+            settings = EnvironmentSettingsMultiAgent()
+            settings.action_space = (action_space, action_space)
+        settings.frame_shape = (128, 128, 1)
+        settings.splash_screen = False
+
+        env_addresses = ["localhost:{}".format(50051 + idx) for idx in range(num_envs)]
+        vec_env = DiambraVecEnv("doapp", settings, wrappers_settings, num_envs=num_envs, env_addresses=env_addresses)
+        assert engine_mock.n_connected_envs == num_envs
+        engines = [env.unwrapped.arena_engine for env in vec_env.envs]
+        assert [engine.mock_env_idx for engine in engines] == list(range(num_envs))
+        engine_reset_spies = [mocker.spy(engine, "reset") for engine in engines]
+        env_spies = [(mocker.spy(env, "reset"), mocker.spy(env, "step")) for env in vec_env.envs]
+
+        # Gymnasium VectorEnv API: infos as dict of arrays with masks, seed offset by the rank of each environment
+        observations, infos = vec_env.reset(seed=42)
+        assert vec_env.observation_space.contains(observations)
+        assert isinstance(infos, dict) and np.all(infos["_settings"])
+        assert [infos["settings"][idx].episode_settings.random_seed for idx in range(num_envs)] == [42 + idx for idx in range(num_envs)]
+        for idx in range(num_envs):
+            assert_same_observation(observations, env_spies[idx][0].spy_return[0], idx)
+        assert [spy.call_count for spy in engine_reset_spies] == [1] * num_envs
+
+        n_resets = np.ones((num_envs,), dtype=np.int64)
+        for _ in range(50):
+            observations, rewards, terminations, truncations, infos = vec_env.step(vec_env.action_space.sample())
+            assert observations["frame"].shape == (num_envs, 128, 128, wrappers_settings.stack_frames)
+            assert rewards.shape == (num_envs,) and terminations.shape == (num_envs,) and truncations.shape == (num_envs,)
+            assert isinstance(infos, dict)
+            for idx in range(num_envs):
+                # Each slot holds the results of its own environment
+                env_reset_spy, env_step_spy = env_spies[idx]
+                _, reward, terminated, truncated, info = env_step_spy.spy_return
+                assert rewards[idx] == reward and terminations[idx] == terminated and truncations[idx] == truncated
+                if terminated or truncated:
+                    # Only done environments are reset
+                    n_resets[idx] += 1
+                    assert infos["_final_observation"][idx] and infos["_final_info"][idx]
+                    assert_same_observation(infos["final_observation"][idx], env_step_spy.spy_return[0])
+                    assert_same_observation(observations, env_reset_spy.spy_return[0], idx)
+                else:
+                    assert "_final_observation" not in infos or not infos["_final_observation"][idx]
+                    assert_same_observation(observations, env_step_spy.spy_return[0], idx)
+                assert env_reset_spy.call_count == n_resets[idx] and engine_reset_spies[idx].call_count == n_resets[idx]
+
+        vec_env.close()
+
+        print("COMPLETED SUCCESSFULLY!")
+        return 0
+    except Exception as e:
+        print(e)
+        print("ERROR, ABORTED.")
+        return 1
+
+wrappers_settings_list = [WrappersSettings(),
+                          WrappersSettings(stack_frames=4, add_last_action=True, stack_actions=6, scale=True)]
+
+@pytest.mark.parametrize("n_players", [1, 2])
+@pytest.mark.parametrize("action_space", [SpaceTypes.DISCRETE, SpaceTypes.MULTI_DISCRETE])
+@pytest.mark.parametrize("wrappers_settings", wrappers_settings_list)
+@pytest.mark.parametrize("num_envs", [1, 3])
+def test_vec_env_mock(n_players, action_space, wrappers_settings, num_envs, mocker):
+    assert func(n_players, action_space, wrappers_settings, num_envs, mocker) == 0
+
+def func_env_addresses(mocker):
+    try:
+        load_vectorized_mocker(mocker, n_envs=2)
+        settings = EnvironmentSettings()
+        settings.splash_screen = False
+        mocker.patch.dict(os.environ)
+        os.environ.pop("DIAMBRA_ENVS", None)
+
+        # More environments than addresses
+        for kwargs in [dict(num_envs=2), dict(num_envs=2, start_index=1, env_addresses=["localhost:50051", "localhost:50052"])]:
+            try:
+                DiambraVecEnv("doapp", settings, **kwargs)
+                raise RuntimeError("Missing engine addresses not detected")
+            except Exception as e:
+                assert "engine addresses" in str(e), e
+
+        # Number of environments from the available addresses
+        env_addresses = ["localhost:{}".format(50051 + idx) for idx in range(3)]
+        vec_env = DiambraVecEnv("doapp", settings, start_index=1, env_addresses=env_addresses)
+        assert vec_env.num_envs == 2
+        assert [env.unwrapped.env_settings.env_address for env in vec_env.envs] == env_addresses[1:]
+        vec_env.close()
+
+        # DIAMBRA_ENVS addresses take precedence over env_addresses
+        os.environ["DIAMBRA_ENVS"] = "localhost:50051"
+        try:
+            DiambraVecEnv("doapp", settings, num_envs=2, env_addresses=env_addresses)
+            raise RuntimeError("Missing engine addresses not detected")
+        except Exception as e:
+            assert "DIAMBRA_ENVS" in str(e), e
+
+        print("COMPLETED SUCCESSFULLY!")
+        return 0
+    except Exception as e:
+        print(e)
+        print("ERROR, ABORTED.")
+        return 1
+
+def test_vec_env_addresses_mock(mocker):
+    assert func_env_addresses(mocker) == 0
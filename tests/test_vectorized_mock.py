@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+import pytest
+import numpy as np
+from copy import deepcopy
+import diambra.arena
+from diambra.arena import DiambraVecEnv, EnvironmentSettings, EnvironmentSettingsMultiAgent, WrappersSettings
+from diambra.arena.engine.interface import step_many
+from diambra.arena.utils.engine_mock import load_vectorized_mocker
+from diambra.arena.utils.gym_utils import available_games
+
+# Example Usage:
+# pytest
+# (optional)
+#    module.py (Run specific module)
+#    -s (show output)
+#    -k "expression" (filter tests using case-insensitive with parts of the test name and/or parameters values combined with boolean operators, e.g. "wrappers and doapp")
+
+def make_settings(n_players):
+    if n_players == 1:
+        settings = EnvironmentSettings()
+    else:
+        settings = EnvironmentSettingsMultiAgent()
+    settings.splash_screen = False
+    settings.step_ratio = 6
+    settings.frame_shape = (64, 64, 1)
+    return settings
+
+def func_vec_env(n_players, num_envs, mocker):
+    try:
+        engine_mock = load_vectorized_mocker(mocker, n_envs=num_envs)
+        vec_env = DiambraVecEnv("doapp", make_settings(n_players), WrappersSettings(), num_envs=num_envs,
+                                env_addresses=["localhost:{}".format(50051 + idx) for idx in range(num_envs)])
+        rounds_per_stage = available_games(False)["doapp"]["rounds_per_stage"]
+
+        observations, infos = vec_env.reset(seed=42)
+        n_episodes = 0
+        for _ in range(1500):
+            observations, rewards, terminations, truncations, infos = vec_env.step(vec_env.action_space.sample())
+            assert vec_env.observation_space.contains(observations)
+            for idx in range(num_envs):
+                observation = infos["final_observation"][idx] if terminations[idx] or truncations[idx] else \
+                              {k: observations[k][idx] for k in ["frame", "stage", "timer"]}
+                # Mock frames are filled with (stage * rounds_per_stage + timer) % 255
+                expected_value = np.array((observation["stage"][0] * rounds_per_stage + observation["timer"][0]) % 255, dtype=np.int8).view(np.uint8)
+                assert np.all(observation["frame"] == expected_value)
+            n_episodes += int(np.sum(terminations))
+        assert n_episodes > 0
+        assert engine_mock.n_connected_envs == num_envs
+        vec_env.close()
+
+        print("COMPLETED SUCCESSFULLY!")
+        return 0
+    except Exception as e:
+        print(e)
+        print("ERROR, ABORTED.")
+        return 1
+
+def func_step_many(n_players, num_envs, mocker):
+    try:
+        engine_mock = load_vectorized_mocker(mocker, n_envs=num_envs)
+        envs = [diambra.arena.make("doapp", make_settings(n_players)) for _ in range(num_envs)]
+        for env in envs:
+            env.reset(seed=42)
+        engines = [env.unwrapped.arena_engine for env in envs]
+        assert [engine.mock_env_idx for engine in engines] == list(range(num_envs))
+
+        # Envs are stepped only through the batched step
+        spy = mocker.spy(engine_mock, "step_envs")
+        for _ in range(20):
+            responses = step_many(engines, [[[0, 1]] * n_players for _ in engines])
+            assert len(responses) == num_envs
+            for idx, response in enumerate(responses):
+                assert response.observation.ram_states_categories[1].ram_states[diambra.arena.model.RamStates.Value("stage")] == engine_mock.stage[idx]
+        assert spy.call_count == 20
+
+        try:
+            diambra.arena.make("doapp", make_settings(n_players))
+            raise RuntimeError("Environment created with no free mock slot")
+        except Exception as e:
+            assert "already in use" in str(e)
+
+        for env in envs:
+            env.close()
+
+        print("COMPLETED SUCCESSFULLY!")
+        return 0
+    except Exception as e:
+        print(e)
+        print("ERROR, ABORTED.")
+        return 1
+
+def run_env_trajectory(n_players, batched, mocker):
+    load_vectorized_mocker(mocker, n_envs=2)
+    # Same environment init settings in all runs (seeded from time otherwise)
+    settings = make_settings(n_players)
+    settings.seed = 42
+    envs = [diambra.arena.make("doapp", settings) for _ in range(2)]
+    for env in envs:
+        env.reset(seed=42)
+    engines = [env.unwrapped.arena_engine for env in envs]
+    action_list = [[0, 1]] * n_players
+
+    # Engine level resets, environment ones sample random episode settings from the shared random module
+    def reset_engine(env_idx, seed):
+        episode_settings = deepcopy(envs[env_idx].unwrapped.env_settings.pb_model.episode_settings)
+        episode_settings.random_seed = seed
+        engines[env_idx].reset(episode_settings)
+
+    trajectory = []
+    for step in range(200):
+        if batched is True:
+            # Second environment stepped together with the first one
+            response = step_many(engines, [action_list, action_list])[0]
+        else:
+            # Second environment reset in between the first environment steps
+            response = engines[0].step(action_list)
+            if step % 7 == 0:
+                reset_engine(1, step)
+        trajectory.append(response.SerializeToString())
+        if response.info.game_states[diambra.arena.model.GameStates.Value("episode_done")]:
+            reset_engine(0, step)
+
+    for env in envs:
+        env.close()
+    return trajectory
+
+def func_independent_envs(n_players, mocker):
+    try:
+        # Each environment draws from its own generator: the first environment trajectory
+        # does not depend on what happens to the second one
+        assert run_env_trajectory(n_players, True, mocker) == run_env_trajectory(n_players, False, mocker)
+
+        print("COMPLETED SUCCESSFULLY!")
+        return 0
+    except Exception as e:
+        print(e)
+        print("ERROR, ABORTED.")
+        return 1
+
+@pytest.mark.parametrize("n_players", [1, 2])
+@pytest.mark.parametrize("num_envs", [1, 4])
+def test_vectorized_mock_vec_env(n_players, num_envs, mocker):
+    assert func_vec_env(n_players, num_envs, mocker) == 0
+
+@pytest.mark.parametrize("n_players", [1, 2])
+def test_vectorized_mock_step_many(n_players, mocker):
+    assert func_step_many(n_players, 3, mocker) == 0
+
+@pytest.mark.parametrize("n_players", [1, 2])
+def test_vectorized_mock_independent_envs(n_players, mocker):
+    assert func_independent_envs(n_players, mocker) == 0
@@ -27,9 +27,9 @@ def func(settings, wrappers_settings, mocker):
         return 1
 
 wrappers_settings_var_order = ["no_op_max", "repeat_action", "normalize_reward", "normalization_factor",
-                               "clip_reward", "no_attack_buttons_combinations", "frame_shape", "stack_frames", "dilation",
-                               "add_last_action", "stack_actions", "scale", "role_relative",
-                               "flatten", "filter_keys", "wrappers"]
+                               "clip_reward", "no_attack_buttons_combinations", "frame_shape", "frame_interpolation", "stack_frames",
+                               "dilation", "exclude_frame", "add_last_action", "stack_actions", "scale", "role_relative",
+                               "flatten", "filter_keys", "compiled", "wrappers"]
 games_dict = available_games(False)
 
 
@@ -41,14 +41,17 @@ ok_test_parameters = {
     "clip_reward": [True, False],
     "no_attack_buttons_combinations": [True, False],
     "frame_shape": [(0, 0, 0), (84, 84, 1), (84, 84, 0)],
+    "frame_interpolation": [None, "area"],
     "stack_frames": [1, 5],
     "dilation": [1, 3],
+    "exclude_frame": [False, True],
     "add_last_action": [True, False],
     "stack_actions": [1, 6],
     "scale": [True, False],
     "role_relative": [True, False],
     "flatten": [True, False],
     "filter_keys": [[], ["stage", "own_side"]],
+    "compiled": [False, True],
     "wrappers": [[]],
 }
 
@@ -60,14 +63,17 @@ ko_test_parameters = {
     "clip_reward": [0.5],
     "no_attack_buttons_combinations": [-1],
     "frame_shape": [(0, 84, 3), (128, 0, 1)],
+    "frame_interpolation": ["bicubic"],
     "stack_frames": [0],
     "dilation": [0],
+    "exclude_frame": [None],
     "add_last_action": [10],
     "stack_actions": [-2],
     "scale": [10],
     "role_relative": [24],
     "flatten": [None],
     "filter_keys": [12],
+    "compiled": ["yes"],
     "wrappers": ["test"],
 }
 
@@ -82,9 +88,9 @@ def pytest_generate_tests(metafunc):
 @pytest.mark.parametrize("action_space", [SpaceTypes.DISCRETE, SpaceTypes.MULTI_DISCRETE])
 def test_wrappers_settings(game_id, step_ratio, n_players, action_space, no_op_max, repeat_action,
                            normalize_reward, normalization_factor, clip_reward,
-                           no_attack_buttons_combinations, frame_shape, stack_frames, dilation,
-                           add_last_action, stack_actions, scale, role_relative,
-                           flatten, filter_keys, wrappers, expected, mocker):
+                           no_attack_buttons_combinations, frame_shape, frame_interpolation, stack_frames,
+                           dilation, exclude_frame, add_last_action, stack_actions, scale, role_relative,
+                           flatten, filter_keys, compiled, wrappers, expected, mocker):
 
     # Env settings
     if (n_players == 1):
@@ -107,14 +113,17 @@ def test_wrappers_settings(game_id, step_ratio, n_players, action_space, no_op_m
     wrappers_settings.clip_reward = clip_reward
     wrappers_settings.no_attack_buttons_combinations = no_attack_buttons_combinations
     wrappers_settings.frame_shape = frame_shape
+    wrappers_settings.frame_interpolation = frame_interpolation
     wrappers_settings.stack_frames = stack_frames
     wrappers_settings.dilation = dilation
+    wrappers_settings.exclude_frame = exclude_frame
     wrappers_settings.add_last_action = add_last_action
     wrappers_settings.stack_actions = 1 if add_last_action is False and expected == 0 else stack_actions
     wrappers_settings.scale = scale
     wrappers_settings.role_relative = role_relative
     wrappers_settings.flatten = flatten
     wrappers_settings.filter_keys = filter_keys
+    wrappers_settings.compiled = compiled
     wrappers_settings.wrappers = wrappers
 
     assert func(settings, wrappers_settings, mocker) == expected